@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк HTTP-сессии CryptoPayAPI
+Сравнивает задержку вызова get_exchange_rates с новой сессией на каждый
+запрос (старое поведение) и с общей keep-alive сессией
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+from typing import Awaitable, Callable, List
+
+import aiohttp
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "bot"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from crypto_pay import CryptoPayAPI
+from fake_crypto_pay import start_fake_crypto_pay
+
+
+async def per_call_session_request(api: CryptoPayAPI) -> None:
+    """Старое поведение: новая ClientSession (и соединение) на каждый вызов"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{api.base_url}/getExchangeRates", headers=api.headers) as response:
+            await response.json()
+
+
+async def measure(call: Callable[[], Awaitable[None]], iterations: int, warmup: int) -> List[float]:
+    """Возвращает задержки вызовов в миллисекундах"""
+    for _ in range(warmup):
+        await call()
+    
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await call()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def report(name: str, latencies: List[float]) -> float:
+    ordered = sorted(latencies)
+    p50 = ordered[len(ordered) // 2]
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    mean = statistics.fmean(ordered)
+    print(f"{name:<22} mean {mean:7.3f} ms   p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+    return mean
+
+
+async def run(iterations: int, warmup: int) -> None:
+    _, runner, base_url = await start_fake_crypto_pay()
+    api = CryptoPayAPI("bench-token", base_url=base_url)
+    
+    try:
+        before = await measure(lambda: per_call_session_request(api), iterations, warmup)
+        
+        await api.start()
+        after = await measure(api.get_exchange_rates, iterations, warmup)
+    finally:
+        await api.close()
+        await runner.cleanup()
+    
+    print(f"get_exchange_rates x{iterations} против {base_url}")
+    before_mean = report("сессия на каждый вызов", before)
+    after_mean = report("общая сессия", after)
+    print(f"ускорение: x{before_mean / after_mean:.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations, args.warmup))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Бенчмарки горячих путей бота: проверка initData (новых и уже проверенных,
+включая отказ при повторе), парсинг суммы,
+расчет комиссии и USDT (по снимку цен), конвертация через CurrencyConverter
+и его таблицу котировок (одна сумма и пакет из 100),
+рендер сообщений одного заказа по шаблонам, отсев флуда UpdateThrottler,
+учет заказа в OrderStats и сводка для /stats.
+
+    python benchmarks/bench_hot_paths.py --save baseline.json
+    python benchmarks/bench_hot_paths.py --compare baseline.json
+
+Конвертер получает курсы от локальной заглушки Crypto Pay.
+"""
+
+import os
+import sys
+import hmac
+import time
+import asyncio
+import hashlib
+import argparse
+import itertools
+from dataclasses import replace
+from decimal import Decimal
+from pathlib import Path
+from urllib.parse import urlencode
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "benchmarks"))
+sys.path.insert(0, str(ROOT / "bot"))
+
+# bot.py читает конфигурацию при импорте
+os.environ.setdefault("BOT_TOKEN", "123456:BENCH-TOKEN")
+os.environ.setdefault("ADMIN_CHAT_ID", "1000")
+os.environ.setdefault("ORDERS_DB_PATH", ":memory:")
+
+import bot
+from crypto_pay import CryptoPayAPI, CurrencyConverter
+from fake_crypto_pay import start_fake_crypto_pay
+from harness import Benchmark, add_arguments, main_with
+from order_stats import OrderStats
+from order_store import ORDER_ACCEPTED, ORDER_NEW, Order
+from throttling import UpdateThrottler
+
+
+def make_init_data(bot_token: str, query_id: str = "AAHdF6IQAAAAAN0XohDhrOrc") -> str:
+    """Корректно подписанная строка initData WebApp"""
+    fields = {
+        "query_id": query_id,
+        "user": '{"id":279058397,"first_name":"Vladislav","username":"vdkfrost","language_code":"ru"}',
+        "auth_date": str(int(time.time())),
+    }
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def fresh_init_data(bot_token: str, verifier: "bot.WebAppDataVerifier"):
+    """
+    Функция, возвращающая по кругу разные подписанные initData; строк на одну
+    больше, чем помнит кэш verifier, поэтому каждая проверка считает HMAC
+    """
+    pool = [make_init_data(bot_token, f"AAHdF6IQAAAAAN0XohDh{i:08d}") for i in range(verifier.max_cached + 1)]
+    return itertools.cycle(pool).__next__
+
+
+def make_order() -> Order:
+    """Заказ с логином и именем, которые требуют HTML-экранирования"""
+    quote = bot.pricing_engine.snapshot.quote(Decimal("1500.50"))
+    now = time.time()
+    return Order(
+        id=1, user_id=279058397, chat_id=279058397, username="vdkfrost", full_name="Vlad <Frost> & Co",
+        login="player<1>", base_amount=quote.base_amount, total_rub=quote.total_rub,
+        total_usdt=quote.total_usdt, commission_percent=quote.pricing.commission_percent,
+        usdt_rate=quote.pricing.usdt_rate, status=ORDER_NEW, created_at=now, updated_at=now,
+        pay_url="https://t.me/CryptoBot?start=IV123&x=1",
+    )
+
+
+def render_order_messages(order: Order) -> int:
+    """Все сообщения, которые бот отправляет и редактирует по одному заказу"""
+    render = bot.templates.render
+    values = bot.order_values(order)
+    messages = (
+        render("order_pending", **values),
+        bot.format_admin_order(order) + render("admin_order_payload", payload='{"login": "player<1>"}'),
+        render("order_accepted_pay", pay_url=order.pay_url, **values),
+        bot.format_admin_order(order) + render("admin_status_accepted"),
+        bot.format_completion_message(order),
+        bot.format_admin_order(order) + render("admin_status_paid"),
+    )
+    return len(messages)
+
+
+async def run(args: argparse.Namespace) -> int:
+    _, runner, base_url = await start_fake_crypto_pay()
+    crypto_pay = CryptoPayAPI("bench-token", base_url=base_url)
+    cached_converter = CurrencyConverter(crypto_pay, cache_ttl=3600)
+    uncached_converter = CurrencyConverter(crypto_pay, cache_ttl=0)
+    quote_table = await cached_converter.get_quote_table()
+    batch_amounts = [Decimal(100 + 37 * i) / 4 for i in range(100)]
+
+    init_data = make_init_data(bot.BOT_TOKEN)
+    next_init_data = fresh_init_data(bot.BOT_TOKEN, bot.webapp_verifier)
+    verifier = bot.WebAppDataVerifier(bot.BOT_TOKEN)
+    verifier.verify(init_data, consume=True)
+    uncached_verifier = bot.WebAppDataVerifier(bot.BOT_TOKEN, max_cached=0)
+    amount = Decimal("1500.50")
+    total = bot.calculate_total_with_commission(amount)
+    order = make_order()
+    # Пропускает все (лимиты очень большие) / отбрасывает все (корзина пуста)
+    open_throttler = UpdateThrottler(user_rate=1e9, user_burst=1e9, global_rate=0)
+    flooded_throttler = UpdateThrottler(user_rate=1e-9, user_burst=1, global_rate=0)
+    flooded_throttler.allow(42)
+    callback_data = bot.callback_codec.encode("accept", order)
+    # Та же длина, но другая подпись
+    forged_callback_data = callback_data[:-4] + ("AAAA" if not callback_data.endswith("AAAA") else "BBBB")
+    # Сводка по окнам, в которых заполнены все ведра за неделю
+    order_stats = OrderStats()
+    accepted_order = replace(order, status=ORDER_ACCEPTED, updated_at=order.created_at + 90)
+    for hour in range(7 * 24, 0, -1):
+        past = replace(order, created_at=order.created_at - hour * 3600)
+        order_stats.record_created(past)
+        order_stats.record_status(replace(past, status=ORDER_ACCEPTED, updated_at=past.created_at + 90))
+
+    benchmarks = [
+        Benchmark("verify_webapp_data", lambda: bot.verify_webapp_data(next_init_data(), bot.BOT_TOKEN)),
+        Benchmark("verify_webapp_data[cached]", lambda: bot.verify_webapp_data(init_data, bot.BOT_TOKEN)),
+        Benchmark("WebAppDataVerifier.verify[cached]", lambda: verifier.verify(init_data)),
+        Benchmark("WebAppDataVerifier.verify[uncached]", lambda: uncached_verifier.verify(init_data)),
+        Benchmark("WebAppDataVerifier.verify[replay]", lambda: verifier.verify(init_data, consume=True)),
+        Benchmark("parse_amount", lambda: bot.parse_amount("1500,50")),
+        Benchmark("calculate_total_with_commission", lambda: bot.calculate_total_with_commission(amount)),
+        Benchmark("calculate_usdt_amount", lambda: bot.calculate_usdt_amount(total)),
+        Benchmark("PricingSnapshot.quote", lambda: bot.pricing_engine.snapshot.quote(amount)),
+        Benchmark("render[order messages]", lambda: render_order_messages(order)),
+        Benchmark("CallbackCodec.encode", lambda: bot.callback_codec.encode("accept", order)),
+        Benchmark("CallbackCodec.decode", lambda: bot.callback_codec.decode(callback_data)),
+        Benchmark("CallbackCodec.decode[forged]", lambda: bot.callback_codec.decode(forged_callback_data)),
+        Benchmark("OrderStats.record_created", lambda: order_stats.record_created(order)),
+        Benchmark("OrderStats.record_status", lambda: order_stats.record_status(accepted_order)),
+        Benchmark("OrderStats.summary", lambda: order_stats.summary()),
+        Benchmark("UpdateThrottler.allow[allowed]", lambda: open_throttler.allow(42)),
+        Benchmark("UpdateThrottler.allow[dropped]", lambda: flooded_throttler.allow(42)),
+        Benchmark("QuoteTable.quote", lambda: quote_table.quote(amount)),
+        Benchmark("QuoteTable.quote_batch[100]", lambda: quote_table.quote_batch(batch_amounts)),
+        Benchmark("convert_rub_to_crypto[cached]", coro=lambda: cached_converter.convert_rub_to_crypto(amount)),
+        Benchmark("convert_rub_to_crypto[fetch]", coro=lambda: uncached_converter.convert_rub_to_crypto(amount)),
+    ]
+
+    try:
+        return await main_with(benchmarks, args)
+    finally:
+        await crypto_pay.close()
+        await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарки горячих путей бота")
+    add_arguments(parser)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк логирования: стоимость logger.info для вызывающего кода при
+синхронном StreamHandler и при очереди с фоновым потоком (bot/log_setup.py).
+
+    python benchmarks/bench_logging.py --write-delay 0.001
+
+Поток вывода искусственно медленный (--write-delay на каждую запись),
+как при зависшем диске или медленном драйвере логов Docker.
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "benchmarks"))
+sys.path.insert(0, str(ROOT / "bot"))
+
+import log_setup
+from harness import Benchmark, add_arguments, main_with
+
+
+class SlowStream:
+    """Поток, каждая запись в который занимает delay секунд"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Стоимость logger.info для вызывающего кода")
+    add_arguments(parser)
+    parser.add_argument("--write-delay", type=float, default=0.0005, help="задержка записи, секунды")
+    args = parser.parse_args()
+
+    stream = SlowStream(args.write_delay)
+    order = {"login": "steam_user", "amount": 1000}
+
+    sync_logger = logging.getLogger("bench.sync")
+    sync_logger.propagate = False
+    sync_logger.addHandler(logging.StreamHandler(stream))
+    sync_logger.setLevel(logging.INFO)
+
+    # Очередь без потребителя-заглушки: фоновый поток пишет в тот же медленный поток
+    sys.stderr, real_stderr = stream, sys.stderr
+    log_setup.setup_logging("INFO")
+    sys.stderr = real_stderr
+    queued_logger = logging.getLogger("bench.queued")
+
+    benchmarks = [
+        Benchmark("info[sync handler]", lambda: sync_logger.info("Создан заказ #%s: %s", 42, order)),
+        Benchmark("info[queue handler]", lambda: queued_logger.info("Создан заказ #%s: %s", 42, order)),
+        Benchmark("debug[disabled]", lambda: queued_logger.debug("Сырые данные: %s", order)),
+    ]
+    try:
+        sys.exit(asyncio.run(main_with(benchmarks, args)))
+    finally:
+        log_setup.stop_logging()
+
+
+if __name__ == "__main__":
+    main()
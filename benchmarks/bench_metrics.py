@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк накладных расходов метрик: observe гистограммы, inc счетчика
+и обертка instrument вокруг пустого обработчика.
+
+    python benchmarks/bench_metrics.py
+
+Корутины выполняются без event loop (send(None)), поэтому разница между
+"handler[bare]" и "handler[instrumented]" - чистая стоимость обертки.
+"""
+
+import sys
+import asyncio
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "benchmarks"))
+sys.path.insert(0, str(ROOT / "bot"))
+
+from harness import Benchmark, add_arguments, main_with
+from metrics import MetricsRegistry, instrument
+
+
+def drive(coro_func):
+    """Выполняет корутину без await до конца"""
+    def run():
+        coro = coro_func(None, None)
+        try:
+            coro.send(None)
+        except StopIteration:
+            pass
+    return run
+
+
+async def handler(update, context) -> None:
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Накладные расходы метрик")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    latency = registry.histogram("bench_latency_seconds", "bench", ("handler",))
+    errors = registry.counter("bench_errors_total", "bench", ("handler",))
+    labels = ("handler",)
+    instrumented = instrument(handler, latency, errors)
+
+    benchmarks = [
+        Benchmark("histogram.observe", lambda: latency.observe(0.0042, labels)),
+        Benchmark("counter.inc", lambda: errors.inc(labels)),
+        Benchmark("handler[bare]", drive(handler)),
+        Benchmark("handler[instrumented]", drive(instrumented)),
+        Benchmark("registry.render", registry.render),
+    ]
+    sys.exit(asyncio.run(main_with(benchmarks, args)))
+
+
+if __name__ == "__main__":
+    main()
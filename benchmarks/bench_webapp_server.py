@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк статического сервера WebApp (start_webapp_server.py)
+Сервер запускается отдельным процессом; клиенты держат keep-alive
+соединения и запрашивают index.html сжатым, повторно с If-None-Match
+и версионированный config.js.
+
+    python benchmarks/bench_webapp_server.py --clients 50 --requests 20000
+"""
+
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aiohttp
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_server(url: str, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    return
+            except aiohttp.ClientConnectionError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+
+async def run_scenario(url: str, headers: Dict[str, str], clients: int, requests: int,
+                       expected_status: int) -> Dict[str, float]:
+    """requests запросов от clients параллельных клиентов; у каждого свое keep-alive соединение"""
+    latencies: List[float] = []
+    remaining = requests
+
+    async def client() -> None:
+        nonlocal remaining
+        connector = aiohttp.TCPConnector(limit=1)
+        async with aiohttp.ClientSession(connector=connector, auto_decompress=False) as session:
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                async with session.get(url, headers=headers) as response:
+                    await response.read()
+                    if response.status != expected_status:
+                        raise RuntimeError(f"{url}: статус {response.status}, ожидался {expected_status}")
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    ordered = sorted(latencies)
+    return {
+        "rps": len(ordered) / elapsed,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, str(ROOT / "start_webapp_server.py"), "--host", "127.0.0.1", "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        await wait_for_server(base_url + "/")
+        async with aiohttp.ClientSession(auto_decompress=False) as session:
+            async with session.get(base_url + "/", headers={"Accept-Encoding": "gzip, deflate, br"}) as response:
+                index = await response.read()
+                etag: Optional[str] = response.headers.get("ETag")
+                print(f"index.html: {response.headers.get('Content-Encoding', 'identity')}, "
+                      f"{len(index)} B, ETag {etag}")
+        config_url = base_url + "/config.js"
+        marker = b"config.js?v="
+        if marker in index:
+            # Версия есть только в несжатом HTML
+            async with aiohttp.ClientSession() as session:
+                async with session.get(base_url + "/") as response:
+                    html = await response.read()
+            start = html.index(marker) + len(marker)
+            config_url += "?v=" + html[start:html.index(b'"', start)].decode()
+
+        scenarios = [
+            ("index.html [gzip/br]", base_url + "/", {"Accept-Encoding": "gzip, deflate, br"}, 200),
+            ("index.html [304]", base_url + "/", {"Accept-Encoding": "gzip, deflate, br", "If-None-Match": etag or ""}, 304),
+            ("config.js [immutable]", config_url, {"Accept-Encoding": "gzip, deflate, br"}, 200),
+        ]
+        print(f"{args.clients} клиентов, {args.requests} запросов на сценарий")
+        print(f"{'сценарий':<24}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, url, headers, status in scenarios:
+            result = await run_scenario(url, headers, args.clients, args.requests, status)
+            print(f"{name:<24}{result['rps']:>10,.0f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк статического сервера WebApp")
+    parser.add_argument("--clients", type=int, default=50, help="параллельные keep-alive клиенты")
+    parser.add_argument("--requests", type=int, default=10000, help="запросов на сценарий")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Fake Crypto Pay API
+Локальная заглушка Crypto Pay API для бенчмарков и ручных проверок
+"""
+
+import asyncio
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+# Курсы в формате ответа getExchangeRates
+DEFAULT_RATES: List[Dict] = [
+    {"is_valid": True, "is_crypto": True, "is_fiat": False, "source": "USDT", "target": "RUB", "rate": "95.12"},
+    {"is_valid": True, "is_crypto": True, "is_fiat": False, "source": "TON", "target": "RUB", "rate": "512.40"},
+    {"is_valid": True, "is_crypto": True, "is_fiat": False, "source": "BTC", "target": "RUB", "rate": "6120345.77"},
+    {"is_valid": True, "is_crypto": True, "is_fiat": False, "source": "ETH", "target": "RUB", "rate": "241876.05"},
+    {"is_valid": True, "is_crypto": True, "is_fiat": False, "source": "LTC", "target": "RUB", "rate": "7850.3"},
+    {"is_valid": True, "is_crypto": True, "is_fiat": False, "source": "USDC", "target": "RUB", "rate": "95.08"},
+    {"is_valid": True, "is_crypto": True, "is_fiat": False, "source": "USDT", "target": "USD", "rate": "1.0001"},
+    {"is_valid": True, "is_crypto": True, "is_fiat": False, "source": "TON", "target": "USD", "rate": "5.39"},
+]
+
+# Валюты в формате ответа getCurrencies
+DEFAULT_CURRENCIES: List[Dict] = [
+    {"is_blockchain": False, "is_stablecoin": True, "is_fiat": False, "name": "Tether", "code": "USDT", "decimals": 18},
+    {"is_blockchain": True, "is_stablecoin": False, "is_fiat": False, "name": "Toncoin", "code": "TON", "decimals": 9},
+    {"is_blockchain": True, "is_stablecoin": False, "is_fiat": False, "name": "Bitcoin", "code": "BTC", "decimals": 8},
+    {"is_blockchain": False, "is_stablecoin": False, "is_fiat": False, "name": "Ethereum", "code": "ETH", "decimals": 18},
+    {"is_blockchain": True, "is_stablecoin": False, "is_fiat": False, "name": "Litecoin", "code": "LTC", "decimals": 8},
+    {"is_blockchain": False, "is_stablecoin": True, "is_fiat": False, "name": "USD Coin", "code": "USDC", "decimals": 18},
+    {"is_blockchain": False, "is_stablecoin": False, "is_fiat": True, "name": "Russian ruble", "code": "RUB", "decimals": 8},
+    {"is_blockchain": False, "is_stablecoin": False, "is_fiat": True, "name": "United States dollar", "code": "USD", "decimals": 8},
+]
+
+
+class FakeCryptoPay:
+    """Заглушка Crypto Pay API с инвойсами в памяти"""
+    
+    def __init__(self, latency: float = 0.0):
+        # Искусственная задержка ответа (секунды)
+        self.latency = latency
+        self.rates = list(DEFAULT_RATES)
+        self.currencies = list(DEFAULT_CURRENCIES)
+        self.invoices: Dict[int, Dict] = {}
+        self.requests = 0
+        self._next_invoice_id = 1
+    
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/api/{method}", self.handle)
+        return app
+    
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        
+        if request.method == "POST" and request.can_read_body:
+            params = await request.json()
+        else:
+            params = dict(request.query)
+        
+        method = request.match_info["method"]
+        handler = getattr(self, f"api_{method}", None)
+        if handler is None:
+            return web.json_response({"ok": False, "error": {"code": 405, "name": "METHOD_NOT_FOUND"}})
+        return web.json_response({"ok": True, "result": handler(params)})
+    
+    def api_getMe(self, params: Dict) -> Dict:
+        return {"app_id": 1, "name": "Fake App", "payment_processing_bot_username": "CryptoTestnetBot"}
+    
+    def api_getExchangeRates(self, params: Dict) -> List[Dict]:
+        return self.rates
+    
+    def api_getCurrencies(self, params: Dict) -> List[Dict]:
+        return self.currencies
+    
+    def api_createInvoice(self, params: Dict) -> Dict:
+        invoice_id = self._next_invoice_id
+        self._next_invoice_id += 1
+        invoice = {
+            "invoice_id": invoice_id,
+            "hash": f"IV{invoice_id:08d}",
+            "currency_type": params.get("currency_type", "crypto"),
+            "fiat": params.get("fiat"),
+            "amount": str(params.get("amount")),
+            "status": "active",
+            "payload": params.get("payload", ""),
+            "bot_invoice_url": f"https://t.me/CryptoTestnetBot?start=IV{invoice_id:08d}",
+        }
+        self.invoices[invoice_id] = invoice
+        return invoice
+    
+    def api_getInvoices(self, params: Dict) -> Dict:
+        ids = params.get("invoice_ids")
+        if ids:
+            items = [self.invoices[int(i)] for i in str(ids).split(",") if int(i) in self.invoices]
+        else:
+            items = list(self.invoices.values())
+        if params.get("status"):
+            items = [invoice for invoice in items if invoice["status"] == params["status"]]
+        # Как в настоящем API: count по умолчанию 100, максимум 1000
+        offset = int(params.get("offset", 0))
+        count = min(int(params.get("count", 100)), 1000)
+        return {"items": items[offset:offset + count]}
+    
+    def set_invoice_status(self, invoice_id: int, status: str) -> Dict:
+        """Меняет статус инвойса (paid/expired), как будто это сделал Crypto Pay"""
+        invoice = self.invoices[invoice_id]
+        invoice["status"] = status
+        if status == "paid":
+            invoice.update(paid_asset="USDT", paid_amount="12.09")
+        return invoice
+    
+    def api_setWebhook(self, params: Dict) -> Dict:
+        return {}
+
+
+async def start_fake_crypto_pay(host: str = "127.0.0.1", port: int = 0,
+                                latency: float = 0.0) -> Tuple[FakeCryptoPay, web.AppRunner, str]:
+    """Запускает заглушку и возвращает (заглушка, runner, base_url)"""
+    fake = FakeCryptoPay(latency=latency)
+    runner = web.AppRunner(fake.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = runner.addresses[0][1]
+    return fake, runner, f"http://{host}:{bound_port}/api"
+
+
+async def _serve_forever(host: str, port: int, latency: float) -> None:
+    _, runner, base_url = await start_fake_crypto_pay(host, port, latency)
+    print(f"Fake Crypto Pay API: {base_url}")
+    try:
+        await asyncio.Future()
+    finally:
+        await runner.cleanup()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Локальная заглушка Crypto Pay API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, секунды")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve_forever(args.host, args.port, args.latency))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Benchmark Harness
+Замер ops/sec и p50/p99, сохранение baseline в JSON и сравнение с ним
+"""
+
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+# Сколько времени собирать замеры одного бенчмарка (секунды)
+DEFAULT_MIN_TIME = 0.5
+# Сколько замеров (пачек вызовов) брать для перцентилей
+SAMPLES = 200
+
+
+@dataclass
+class BenchResult:
+    """Результат одного бенчмарка; времена в микросекундах на операцию"""
+    name: str
+    ops_per_sec: float
+    p50_us: float
+    p99_us: float
+    mean_us: float
+    samples: int
+    batch: int
+
+
+@dataclass
+class Benchmark:
+    """Описание бенчмарка: синхронная функция или корутина без аргументов"""
+    name: str
+    func: Optional[Callable[[], object]] = None
+    coro: Optional[Callable[[], Awaitable[object]]] = None
+
+
+def _percentile(ordered: Sequence[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _result(name: str, per_op: List[float], batch: int) -> BenchResult:
+    ordered = sorted(per_op)
+    mean = sum(ordered) / len(ordered)
+    return BenchResult(
+        name=name,
+        ops_per_sec=1 / mean if mean else 0.0,
+        p50_us=_percentile(ordered, 0.50) * 1e6,
+        p99_us=_percentile(ordered, 0.99) * 1e6,
+        mean_us=mean * 1e6,
+        samples=len(ordered),
+        batch=batch,
+    )
+
+
+def _calibrate(run_batch: Callable[[int], float], min_time: float) -> int:
+    """Подбирает размер пачки так, чтобы SAMPLES пачек заняли около min_time"""
+    batch = 1
+    while True:
+        elapsed = run_batch(batch)
+        if elapsed * SAMPLES >= min_time or batch >= 1 << 20:
+            return batch
+        batch *= 2
+
+
+def bench_sync(name: str, func: Callable[[], object], min_time: float = DEFAULT_MIN_TIME) -> BenchResult:
+    """Замер синхронной функции пачками вызовов"""
+    perf_counter = time.perf_counter
+
+    def run_batch(batch: int) -> float:
+        started = perf_counter()
+        for _ in range(batch):
+            func()
+        return perf_counter() - started
+
+    batch = _calibrate(run_batch, min_time)
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        per_op = [run_batch(batch) / batch for _ in range(SAMPLES)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return _result(name, per_op, batch)
+
+
+async def bench_async(name: str, coro: Callable[[], Awaitable[object]],
+                      min_time: float = DEFAULT_MIN_TIME) -> BenchResult:
+    """Замер корутины: каждый вызов - отдельный замер"""
+    perf_counter = time.perf_counter
+    for _ in range(10):
+        await coro()
+
+    per_op: List[float] = []
+    deadline = perf_counter() + min_time
+    while len(per_op) < SAMPLES or perf_counter() < deadline:
+        started = perf_counter()
+        await coro()
+        per_op.append(perf_counter() - started)
+    return _result(name, per_op, 1)
+
+
+async def run_benchmarks(benchmarks: Sequence[Benchmark], min_time: float,
+                         name_filter: Optional[str] = None) -> List[BenchResult]:
+    results = []
+    for benchmark in benchmarks:
+        if name_filter and name_filter not in benchmark.name:
+            continue
+        if benchmark.coro is not None:
+            result = await bench_async(benchmark.name, benchmark.coro, min_time)
+        else:
+            result = bench_sync(benchmark.name, benchmark.func, min_time)
+        print_result(result)
+        results.append(result)
+    return results
+
+
+def print_header() -> None:
+    print(f"{'benchmark':<40} {'ops/sec':>12} {'p50 µs':>10} {'p99 µs':>10}")
+    print("-" * 75)
+
+
+def print_result(result: BenchResult) -> None:
+    print(f"{result.name:<40} {result.ops_per_sec:>12,.0f} {result.p50_us:>10.2f} {result.p99_us:>10.2f}")
+
+
+def save_baseline(results: Sequence[BenchResult], path: str) -> None:
+    data = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": {result.name: asdict(result) for result in results},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"\nBaseline сохранен: {path}")
+
+
+def compare_with_baseline(results: Sequence[BenchResult], path: str, threshold: float) -> List[str]:
+    """Сравнивает p50 с baseline; возвращает имена бенчмарков с регрессией"""
+    with open(path, encoding="utf-8") as f:
+        baseline: Dict[str, Dict] = json.load(f)["results"]
+
+    regressions = []
+    print(f"\nСравнение с {path} (порог {threshold:.0%}):")
+    for result in results:
+        previous = baseline.get(result.name)
+        if previous is None:
+            print(f"  {result.name:<40} нет в baseline")
+            continue
+        change = result.p50_us / previous["p50_us"] - 1 if previous["p50_us"] else 0.0
+        mark = "ok"
+        if change > threshold:
+            mark = "РЕГРЕССИЯ"
+            regressions.append(result.name)
+        elif change < -threshold:
+            mark = "быстрее"
+        print(f"  {result.name:<40} p50 {previous['p50_us']:>9.2f} -> {result.p50_us:>9.2f} µs ({change:+.1%}) {mark}")
+    return regressions
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME,
+                        help="время замера одного бенчмарка, секунды")
+    parser.add_argument("--filter", help="запускать только бенчмарки, содержащие подстроку")
+    parser.add_argument("--save", metavar="PATH", help="сохранить результаты как baseline (JSON)")
+    parser.add_argument("--compare", metavar="PATH", help="сравнить с сохраненным baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="допустимое замедление p50 относительно baseline (0.10 = 10%%)")
+
+
+async def main_with(benchmarks: Sequence[Benchmark], args: argparse.Namespace) -> int:
+    """Запускает бенчмарки по аргументам командной строки; код возврата 1 при регрессии"""
+    print_header()
+    results = await run_benchmarks(benchmarks, args.min_time, args.filter)
+    if args.save:
+        save_baseline(results, args.save)
+    if args.compare:
+        regressions = compare_with_baseline(results, args.compare, args.threshold)
+        if regressions:
+            print(f"\n❌ Регрессии: {', '.join(regressions)}")
+            return 1
+        print("\n✅ Регрессий нет")
+    return 0
@@ -8,26 +8,68 @@ import os
 import json
 import logging
 import hashlib
-import hmac
 import asyncio
-import base64
+import signal
 from datetime import datetime
-from decimal import Decimal, ROUND_HALF_UP
-from urllib.parse import parse_qsl
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 
 from telegram import Update, WebAppInfo, KeyboardButton, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 from dotenv import load_dotenv
 
+from callback_codec import CallbackCodec
+from crypto_pay import init_crypto_pay
+from crypto_pay_webhook import CRYPTO_PAY_WEBHOOK_PATH, CryptoPayWebhook
+from invoice_poller import InvoicePoller
+from log_setup import PAYLOAD_LOGGER, setup_logging
+from message_dispatcher import PRIORITY_ADMIN, MessageDispatcher
+from metrics import (
+    MetricsRegistry,
+    add_metrics_route,
+    create_http_metrics,
+    instrument,
+    metrics_middleware,
+    stats_gauge,
+    upstream_observer,
+)
+from messages import DEFAULT_LOCALE, MESSAGES
+from pricing import PricingEngine, PricingSnapshot
+from order_machine import (
+    ACTION_ACCEPT,
+    ACTION_INVOICE_EXPIRED,
+    ACTION_INVOICE_PAID,
+    ACTION_PAID,
+    ACTION_REJECT,
+    OrderStateMachine,
+)
+from order_stats import OrderStats
+from order_store import OrderStore
+from state_backend import PRICING_STATE_KEY, StateEntry, create_state_backend
+from templates import TemplateRenderer
+from throttling import THROTTLE_HANDLER_GROUP, UpdateThrottler, create_throttle_handler
+from update_processor import PerChatUpdateProcessor, chat_key
+from webapp_auth import AUTH_OK, WebAppDataVerifier
+from webhook_server import (
+    TELEGRAM_WEBHOOK_PATH,
+    add_telegram_webhook_route,
+    build_webhook_url,
+    create_web_app,
+    start_web_server,
+)
+
 # Загружаем переменные окружения
 load_dotenv()
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+# Настройка логирования: запись в лог идет в фоновом потоке
+# LOG_FORMAT=json - одна JSON-строка на запись; LOG_PAYLOAD_SAMPLE - доля
+# сырых данных WebApp, которая попадает в лог (0 - только при LOG_LEVEL=DEBUG)
+log_handler = setup_logging(
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    log_format=os.getenv('LOG_FORMAT', 'text').lower(),
+    payload_sample_rate=float(os.getenv('LOG_PAYLOAD_SAMPLE', '0'))
 )
 logger = logging.getLogger(__name__)
+payload_logger = logging.getLogger(PAYLOAD_LOGGER)
 
 # Конфигурация из переменных окружения
 BOT_TOKEN = os.getenv('BOT_TOKEN')
@@ -35,15 +77,71 @@ ADMIN_CHAT_ID = os.getenv('ADMIN_CHAT_ID')
 FORWARD_CHAT_ID = os.getenv('FORWARD_CHAT_ID')
 WEBAPP_URL = os.getenv('WEBAPP_URL')
 
-# Курс USDT к рублю (можно обновлять вручную)
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+
+# Публичный адрес webhook сервера бота и адрес, на котором он слушает
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8003'))
+
+# Секрет для заголовка X-Telegram-Bot-Api-Secret-Token
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET')
+
+# Курс USDT к рублю (начальное значение, если его нет в общем состоянии)
 USDT_RATE = float(os.getenv('USDT_RATE', '95.0'))  # 1 USDT = 95 RUB по умолчанию
 
 # Комиссия в процентах
 COMMISSION_PERCENT = float(os.getenv('COMMISSION_PERCENT', '15.0'))  # 15% по умолчанию
 
-# Хранилища для значений (можно изменять через команды)
-current_usdt_rate = USDT_RATE
-current_commission_percent = COMMISSION_PERCENT
+# Общее состояние процессов бота: memory (один процесс) или sqlite:путь_к_файлу
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory')
+
+# Текущие курс и комиссия (меняются командами /setrate и /setcommission
+# в общем состоянии и приходят из него во все процессы)
+pricing_engine = PricingEngine(USDT_RATE, COMMISSION_PERCENT)
+state_backend = create_state_backend(STATE_BACKEND)
+
+# Язык сообщений бота (ru, en); недостающие тексты берутся из ru
+BOT_LOCALE = os.getenv('BOT_LOCALE', DEFAULT_LOCALE).lower()
+
+# Шаблоны сообщений компилируются один раз при запуске
+templates = TemplateRenderer(MESSAGES, BOT_LOCALE, DEFAULT_LOCALE)
+
+# Crypto Pay: инвойсы для оплаты принятых заказов и webhook об оплате
+CRYPTO_PAY_API_TOKEN = os.getenv('CRYPTO_PAY_API_TOKEN')
+CRYPTO_PAY_TESTNET = os.getenv('CRYPTO_PAY_TESTNET', 'true').lower() == 'true'
+
+# Опрос статусов инвойсов: true, false или auto (включен, если не задан WEBHOOK_URL)
+CRYPTO_PAY_POLLING = os.getenv('CRYPTO_PAY_POLLING', 'auto').lower()
+
+# Сколько секунд initData WebApp считаются свежими после auth_date (0 - без проверки)
+WEBAPP_AUTH_MAX_AGE = int(os.getenv('WEBAPP_AUTH_MAX_AGE', str(24 * 60 * 60)))
+
+# Максимальная сумма заказа в рублях (без комиссии)
+MAX_ORDER_AMOUNT = Decimal(os.getenv('MAX_ORDER_AMOUNT', '1000000'))
+
+# Лимиты входящих обновлений: на пользователя и общий (в секунду, 0 - без лимита)
+THROTTLE_USER_RATE = float(os.getenv('THROTTLE_USER_RATE', '1.0'))
+THROTTLE_USER_BURST = float(os.getenv('THROTTLE_USER_BURST', '5'))
+THROTTLE_GLOBAL_RATE = float(os.getenv('THROTTLE_GLOBAL_RATE', '100'))
+THROTTLE_GLOBAL_BURST = float(os.getenv('THROTTLE_GLOBAL_BURST', '200'))
+
+# Пользователи, которых лимиты не касаются (ID через запятую). Без списка -
+# ADMIN_CHAT_ID и FORWARD_CHAT_ID, если это личные чаты: их ID совпадает с ID
+# пользователя. ID группы - не ID пользователя, для групп список нужен явно
+ADMIN_USER_IDS = [int(user_id) for user_id in os.getenv('ADMIN_USER_IDS', '').split(',') if user_id.strip()]
+
+# Сколько обновлений обрабатывается одновременно (1 - по одному); обновления
+# одного чата и нажатия кнопок одного заказа всегда идут по порядку
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '32'))
+
+# Путь к базе заказов (SQLite)
+ORDERS_DB_PATH = os.getenv('ORDERS_DB_PATH', 'orders.db')
+
+# Локальный HTTP сервер с метриками Prometheus (METRICS_PORT=0 - выключен)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9101'))
 
 # Проверка обязательных переменных
 if not BOT_TOKEN:
@@ -57,27 +155,139 @@ if not ADMIN_CHAT_ID:
 if not WEBAPP_URL:
     logger.warning("WEBAPP_URL не установлен - WebApp кнопка будет скрыта")
 
+if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+    logger.warning("BOT_MODE=webhook, но WEBHOOK_URL не установлен - используется polling")
+    BOT_MODE = 'polling'
+
+if not TELEGRAM_WEBHOOK_SECRET:
+    # Детерминированный секрет: одинаковый для всех процессов с одним токеном
+    TELEGRAM_WEBHOOK_SECRET = hashlib.sha256(f"telegram-webhook:{BOT_TOKEN}".encode()).hexdigest()
+
+if not ADMIN_USER_IDS:
+    ADMIN_USER_IDS = [
+        int(chat_id) for chat_id in (ADMIN_CHAT_ID, FORWARD_CHAT_ID)
+        if chat_id and chat_id.isdigit()
+    ]
+
+if CRYPTO_PAY_POLLING == 'auto':
+    # Без публичного адреса webhook Crypto Pay до бота не дойдет
+    CRYPTO_PAY_POLLING = 'false' if WEBHOOK_URL else 'true'
+
+# Подпись callback_data кнопок заказа; ключ выводится из токена
+callback_codec = CallbackCodec(BOT_TOKEN.encode())
+
+# Проверка initData WebApp: секрет выводится из токена один раз
+webapp_verifier = WebAppDataVerifier(BOT_TOKEN, WEBAPP_AUTH_MAX_AGE)
+
+# Отсев флуда до обработчиков; администраторы не ограничиваются
+update_throttler = UpdateThrottler(
+    user_rate=THROTTLE_USER_RATE,
+    user_burst=THROTTLE_USER_BURST,
+    global_rate=THROTTLE_GLOBAL_RATE,
+    global_burst=THROTTLE_GLOBAL_BURST,
+    exempt_user_ids=ADMIN_USER_IDS
+)
+
+# Хранилище заказов и переходы между их статусами
+order_store = OrderStore(ORDERS_DB_PATH)
+order_machine = OrderStateMachine(order_store)
 
-def verify_webapp_data(init_data: str, bot_token: str) -> bool:
+# Сводка для /stats: счетчики обновляются при создании заказа и каждом переходе
+order_stats = OrderStats()
+order_machine.transition_observer = order_stats.record_status
+
+# Очередь исходящих сообщений и обработчик входящих обновлений (создаются вместе с приложением)
+message_dispatcher: MessageDispatcher = None
+update_processor: PerChatUpdateProcessor = None
+
+# Crypto Pay API и прием его webhook (если задан токен)
+crypto_pay_api = init_crypto_pay(CRYPTO_PAY_API_TOKEN, CRYPTO_PAY_TESTNET) if CRYPTO_PAY_API_TOKEN else None
+crypto_pay_webhook: CryptoPayWebhook = None
+invoice_poller: InvoicePoller = None
+
+# Метрики: задержки обработчиков, HTTP маршрутов и запросов к Crypto Pay
+metrics_registry = MetricsRegistry()
+handler_latency = metrics_registry.histogram(
+    "bot_handler_duration_seconds", "Время работы обработчика обновления", ("handler",)
+)
+handler_errors = metrics_registry.counter(
+    "bot_handler_errors_total", "Исключения, вышедшие из обработчика", ("handler",)
+)
+http_latency, http_responses = create_http_metrics(metrics_registry, "bot")
+crypto_pay_latency = metrics_registry.histogram(
+    "bot_crypto_pay_request_duration_seconds", "Время запроса к Crypto Pay API", ("method",)
+)
+crypto_pay_errors = metrics_registry.counter(
+    "bot_crypto_pay_request_errors_total", "Неудачные запросы к Crypto Pay API", ("method",)
+)
+stats_gauge(metrics_registry, "bot_dispatcher", "Очередь исходящих сообщений",
+            lambda: message_dispatcher.stats() if message_dispatcher else None)
+stats_gauge(metrics_registry, "bot_invoice_poller", "Опрос инвойсов Crypto Pay",
+            lambda: invoice_poller.stats() if invoice_poller else None)
+stats_gauge(metrics_registry, "bot_update_processor", "Входящие обновления: в работе и в очереди своего чата или заказа",
+            lambda: update_processor.stats() if update_processor else None)
+stats_gauge(metrics_registry, "bot_order_transitions", "Действия с заказами: примененные, повторные и отклоненные",
+            order_machine.stats)
+stats_gauge(metrics_registry, "bot_orders", "Заказы с момента запуска по событиям",
+            order_stats.stats)
+stats_gauge(metrics_registry, "bot_throttle", "Входящие обновления: пропущенные и отброшенные лимитами",
+            update_throttler.stats)
+stats_gauge(metrics_registry, "bot_webapp_auth", "Проверки initData WebApp по результату",
+            webapp_verifier.stats)
+metrics_registry.gauge("bot_log_records_dropped", "Записи лога, отброшенные при переполненной очереди",
+                       lambda: log_handler.dropped)
+
+if crypto_pay_api:
+    crypto_pay_api.request_observer = upstream_observer(crypto_pay_latency, crypto_pay_errors)
+
+
+def observed(callback):
+    """Обработчик с замером задержки и ошибок"""
+    return instrument(callback, handler_latency, handler_errors)
+
+
+def admin_chat_ids() -> list:
+    """Чаты, в которые отправляются уведомления о заказах"""
+    return [chat_id for chat_id in (ADMIN_CHAT_ID, FORWARD_CHAT_ID) if chat_id]
+
+
+def verify_webapp_data(init_data: str, bot_token: str = None, consume: bool = False) -> bool:
     """
-    Проверяет подлинность данных WebApp согласно документации Telegram
+    Проверяет подлинность и свежесть данных WebApp согласно документации Telegram;
+    consume=True отклоняет повторное использование тех же initData
     """
-    try:
-        parsed_data = dict(parse_qsl(init_data))
-        data_check_string_parts = []
-        
-        for key, value in sorted(parsed_data.items()):
-            if key != 'hash':
-                data_check_string_parts.append(f"{key}={value}")
-        
-        data_check_string = '\n'.join(data_check_string_parts)
-        secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
-        calculated_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
-        
-        return calculated_hash == parsed_data.get('hash')
-    except Exception as e:
-        logger.error(f"Ошибка при проверке WebApp данных: {e}")
-        return False
+    verifier = webapp_verifier if bot_token in (None, BOT_TOKEN) else WebAppDataVerifier(bot_token, WEBAPP_AUTH_MAX_AGE)
+    result, _ = verifier.check(init_data, consume)
+    if result != AUTH_OK:
+        logger.debug(f"initData WebApp отклонены: {result}")
+    return result == AUTH_OK
+
+
+def apply_pricing_state(entry: StateEntry) -> None:
+    """Публикует снимок цен из общего состояния (в том числе измененного другим процессом)"""
+    if entry.key != PRICING_STATE_KEY:
+        return
+    pricing = pricing_engine.apply(entry.version, entry.value["usdt_rate"], entry.value["commission_percent"])
+    logger.info(f"Цены v{pricing.version}: 1 USDT = {pricing.usdt_rate} РУБ, комиссия {pricing.commission_percent}%")
+
+
+state_backend.subscribe(apply_pricing_state)
+
+
+async def load_pricing_state() -> PricingSnapshot:
+    """Берет цены из общего состояния; при первом запуске записывает туда USDT_RATE и COMMISSION_PERCENT"""
+    entry = await state_backend.setdefault(PRICING_STATE_KEY, {
+        "usdt_rate": str(USDT_RATE),
+        "commission_percent": str(COMMISSION_PERCENT),
+    })
+    return pricing_engine.apply(entry.version, entry.value["usdt_rate"], entry.value["commission_percent"])
+
+
+async def update_pricing(**changes) -> PricingSnapshot:
+    """Меняет курс и/или комиссию в общем состоянии; возвращает новый снимок"""
+    await load_pricing_state()
+    entry = await state_backend.update(PRICING_STATE_KEY, {key: str(value) for key, value in changes.items()})
+    return PricingSnapshot.create(entry.version, entry.value["usdt_rate"], entry.value["commission_percent"])
 
 
 def parse_amount(amount_str: str) -> Decimal:
@@ -89,84 +299,66 @@ def parse_amount(amount_str: str) -> Decimal:
         amount_str = amount_str.replace(',', '.')
         amount = Decimal(amount_str)
         
+        if not amount.is_finite():
+            raise ValueError("не число")
+        
         if amount < 100:
             raise ValueError("Минимальная сумма: 100 РУБ")
         
+        if amount > MAX_ORDER_AMOUNT:
+            raise ValueError(f"Максимальная сумма: {MAX_ORDER_AMOUNT} РУБ")
+        
         # Округляем до 2 знаков после запятой
         return amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError("Некорректная сумма: не число")
     except (ValueError, TypeError) as e:
         raise ValueError(f"Некорректная сумма: {e}")
 
 
-def calculate_total_with_commission(base_amount: Decimal) -> Decimal:
+def calculate_total_with_commission(base_amount: Decimal, pricing: PricingSnapshot = None) -> Decimal:
     """
     Вычисляет итоговую сумму к оплате с комиссией
     """
-    commission_multiplier = Decimal('1') + (Decimal(str(current_commission_percent)) / Decimal('100'))
-    total = base_amount * commission_multiplier
-    return total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return (pricing or pricing_engine.snapshot).total_with_commission(base_amount)
 
 
-def calculate_usdt_amount(rub_amount: Decimal) -> Decimal:
+def calculate_usdt_amount(rub_amount: Decimal, pricing: PricingSnapshot = None) -> Decimal:
     """
     Конвертирует рубли в USDT по текущему курсу
     """
-    global current_usdt_rate
-    usdt_amount = rub_amount / Decimal(str(current_usdt_rate))
-    return usdt_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return (pricing or pricing_engine.snapshot).usdt_amount(rub_amount)
 
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /start"""
     user = update.effective_user
     
-    welcome_message = (
-        f"Привет, {user.first_name}! 👋\n\n"
-        f"💰 Быстрое пополнение через криптовалюту!\n\n"
-        f"📝 Просто укажи сумму - мы конвертируем в USDT\n"
-        f"🔐 Способ оплаты: Криптовалюта\n"
-        f"⚡ После заявки с тобой свяжется оператор\n\n"
-        f"👇 Нажми кнопку для оформления:"
-    )
+    welcome_message = templates.render("welcome", first_name=user.first_name)
     
     # Создаем клавиатуру с WebApp кнопкой если URL настроен
     if WEBAPP_URL:
         keyboard = [
             [KeyboardButton(
-                "💰 Оформить пополнение", 
+                templates.render("webapp_button"), 
                 web_app=WebAppInfo(url=WEBAPP_URL)
             )]
         ]
         reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     else:
-        welcome_message += "\n⚠️ WebApp не настроен, обратитесь к администратору."
+        welcome_message += templates.render("welcome_no_webapp")
         reply_markup = None
     
-    await update.message.reply_text(welcome_message, reply_markup=reply_markup)
+    await update.message.reply_text(welcome_message, parse_mode='HTML', reply_markup=reply_markup)
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /help"""
-    help_text = (
-        "🤖 <b>Команды бота:</b>\n\n"
-        "/start - Начать работу с ботом\n"
-        "/help - Показать эту справку\n"
-        "/cancel - Отменить текущую операцию\n"
-        "/admin - Информация для администратора\n"
-        "/setrate - Изменить курс USDT (только админ)\n"
-        "/setcommission - Изменить комиссию (только админ)\n\n"
-        f"💡 <b>Как оформить заказ:</b>\n"
-        f"1. Нажми кнопку 'Оформить пополнение'\n"
-        f"2. Укажи логин и сумму в рублях\n"
-        f"3. Система покажет сумму к оплате с комиссией {current_commission_percent}%\n"
-        f"4. Подтверди заказ\n"
-        f"5. Ожидай принятия заказа оператором\n"
-        f"6. После принятия - получишь реквизиты для оплаты\n"
-        f"7. После оплаты заказ будет завершен\n\n"
-        f"💰 <b>Способ оплаты:</b> Криптовалюта (USDT)\n"
-        f"💱 <b>Текущий курс:</b> 1 USDT = {current_usdt_rate} РУБ\n"
-        f"📈 <b>Комиссия:</b> {current_commission_percent}%\n"
-        f"💵 <b>Минимальная сумма:</b> 100 РУБ"
+    pricing = pricing_engine.snapshot
+    help_text = templates.render(
+        "help",
+        usdt_rate=pricing.usdt_rate,
+        commission_percent=pricing.commission_percent
     )
     
     await update.message.reply_text(help_text, parse_mode='HTML')
@@ -174,10 +366,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
 async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /cancel"""
-    await update.message.reply_text(
-        "❌ Операция отменена.\n"
-        "Для создания новой заявки используй команду /start"
-    )
+    await update.message.reply_text(templates.render("cancel"), parse_mode='HTML')
 
 
 async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -185,14 +374,13 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     user = update.effective_user
     chat = update.effective_chat
     
-    admin_info = (
-        f"👤 <b>Информация о пользователе:</b>\n"
-        f"User ID: <code>{user.id}</code>\n"
-        f"Username: @{user.username or 'не указан'}\n"
-        f"Имя: {user.full_name}\n\n"
-        f"💬 <b>Информация о чате:</b>\n"
-        f"Chat ID: <code>{chat.id}</code>\n"
-        f"Тип чата: {chat.type}"
+    admin_info = templates.render(
+        "admin_info",
+        user_id=user.id,
+        username=user.username or templates.render("username_missing"),
+        full_name=user.full_name,
+        chat_id=chat.id,
+        chat_type=chat.type
     )
     
     await update.message.reply_text(admin_info, parse_mode='HTML')
@@ -200,19 +388,20 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
 async def set_rate_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /setrate для изменения курса USDT"""
-    global current_usdt_rate
     
     # Проверяем что это администратор
     if str(update.effective_user.id) != ADMIN_CHAT_ID.lstrip('-'):
-        await update.message.reply_text("❌ Эта команда доступна только администратору.")
+        await update.message.reply_text(templates.render("admin_only"), parse_mode='HTML')
         return
     
     if not context.args:
+        pricing = pricing_engine.snapshot
         await update.message.reply_text(
-            f"💱 <b>Текущий курс USDT:</b> 1 USDT = {current_usdt_rate} РУБ\n"
-            f"📈 <b>Комиссия:</b> {current_commission_percent}%\n\n"
-            f"Для изменения курса используйте:\n"
-            f"<code>/setrate 95.5</code>",
+            templates.render(
+                "rate_current",
+                usdt_rate=pricing.usdt_rate,
+                commission_percent=pricing.commission_percent
+            ),
             parse_mode='HTML'
         )
         return
@@ -222,43 +411,36 @@ async def set_rate_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         if new_rate <= 0:
             raise ValueError("Курс должен быть больше 0")
         
-        old_rate = current_usdt_rate
-        current_usdt_rate = new_rate
+        old_rate = pricing_engine.snapshot.usdt_rate
+        pricing = await update_pricing(usdt_rate=new_rate)
         
         await update.message.reply_text(
-            f"✅ <b>Курс USDT обновлен!</b>\n\n"
-            f"📉 Старый курс: 1 USDT = {old_rate} РУБ\n"
-            f"📈 Новый курс: 1 USDT = {current_usdt_rate} РУБ\n\n"
-            f"💡 Изменения применятся для новых заявок.",
+            templates.render("rate_updated", old_rate=old_rate, usdt_rate=pricing.usdt_rate),
             parse_mode='HTML'
         )
         
-        logger.info(f"Администратор {update.effective_user.id} изменил курс USDT с {old_rate} на {current_usdt_rate}")
+        logger.info(f"Администратор {update.effective_user.id} изменил курс USDT с {old_rate} на {pricing.usdt_rate} (цены v{pricing.version})")
         
     except (ValueError, IndexError):
-        await update.message.reply_text(
-            "❌ Неверный формат курса.\n"
-            "Используйте: <code>/setrate 95.5</code>",
-            parse_mode='HTML'
-        )
+        await update.message.reply_text(templates.render("rate_invalid"), parse_mode='HTML')
 
 
 async def set_commission_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /setcommission для изменения комиссии"""
-    global current_commission_percent
     
     # Проверяем что это администратор
     if str(update.effective_user.id) != ADMIN_CHAT_ID.lstrip('-'):
-        await update.message.reply_text("❌ Эта команда доступна только администратору.")
+        await update.message.reply_text(templates.render("admin_only"), parse_mode='HTML')
         return
     
     if not context.args:
+        pricing = pricing_engine.snapshot
         await update.message.reply_text(
-            f"💰 <b>Текущая комиссия:</b> {current_commission_percent}%\n"
-            f"💱 <b>Курс USDT:</b> 1 USDT = {current_usdt_rate} РУБ\n\n"
-            f"Для изменения комиссии используйте:\n"
-            f"<code>/setcommission 15</code>\n"
-            f"<code>/setcommission 12.5</code>",
+            templates.render(
+                "commission_current",
+                usdt_rate=pricing.usdt_rate,
+                commission_percent=pricing.commission_percent
+            ),
             parse_mode='HTML'
         )
         return
@@ -268,25 +450,98 @@ async def set_commission_command(update: Update, context: ContextTypes.DEFAULT_T
         if new_commission < 0 or new_commission > 100:
             raise ValueError("Комиссия должна быть от 0 до 100%")
         
-        old_commission = current_commission_percent
-        current_commission_percent = new_commission
+        old_commission = pricing_engine.snapshot.commission_percent
+        pricing = await update_pricing(commission_percent=new_commission)
         
         await update.message.reply_text(
-            f"✅ <b>Комиссия обновлена!</b>\n\n"
-            f"📉 Старая комиссия: {old_commission}%\n"
-            f"📈 Новая комиссия: {new_commission}%\n\n"
-            f"🔄 Изменения применяются ко всем новым заказам",
+            templates.render(
+                "commission_updated",
+                old_commission=old_commission,
+                commission_percent=pricing.commission_percent
+            ),
             parse_mode='HTML'
         )
         
-        logger.info(f"Администратор {update.effective_user.id} изменил комиссию с {old_commission}% на {new_commission}%")
+        logger.info(f"Администратор {update.effective_user.id} изменил комиссию с {old_commission}% на {pricing.commission_percent}% (цены v{pricing.version})")
         
     except (ValueError, IndexError):
-        await update.message.reply_text(
-            "❌ Неверный формат комиссии.\n"
-            "Используйте числа от 0 до 100: <code>/setcommission 15</code>",
-            parse_mode='HTML'
+        await update.message.reply_text(templates.render("commission_invalid"), parse_mode='HTML')
+
+
+def format_duration(seconds: float) -> str:
+    """Длительность как Ч:ММ:СС или М:СС"""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик команды /stats: сводка по заказам из счетчиков в памяти"""
+    
+    # Проверяем что это администратор: по ID пользователя, а не чата -
+    # команда работает и в админ-группе
+    if update.effective_user.id not in ADMIN_USER_IDS:
+        await update.message.reply_text(templates.render("admin_only"), parse_mode='HTML')
+        return
+    
+    no_value = templates.render("stats_no_value")
+    sections = [
+        templates.render(
+            "stats_header",
+            started_at=datetime.fromtimestamp(order_stats.started_at).strftime("%Y-%m-%d %H:%M:%S")
         )
+    ]
+    for window, summary in order_stats.summary().items():
+        sections.append(templates.render(
+            "stats_window",
+            window=templates.render(f"stats_window_{window}"),
+            created=summary.created,
+            created_rub=summary.created_rub,
+            created_usdt=summary.created_usdt,
+            accepted=summary.accepted,
+            rejected=summary.rejected,
+            acceptance_rate=(
+                f"{summary.acceptance_rate * 100:.1f}%" if summary.acceptance_rate is not None else no_value
+            ),
+            avg_accept=(
+                format_duration(summary.avg_accept_seconds) if summary.avg_accept_seconds is not None else no_value
+            ),
+            paid=summary.paid,
+            paid_rub=summary.paid_rub,
+            paid_usdt=summary.paid_usdt,
+            expired=summary.expired
+        ))
+    
+    await update.message.reply_text("".join(sections), parse_mode='HTML')
+
+
+def order_values(order) -> dict:
+    """Поля заказа для шаблонов сообщений"""
+    return {
+        "order_id": order.id,
+        "login": order.login,
+        "base_amount": order.base_amount,
+        "total_rub": order.total_rub,
+        "total_usdt": order.total_usdt,
+        "commission_percent": order.commission_percent,
+        "usdt_rate": order.usdt_rate,
+    }
+
+
+def format_admin_order(order) -> str:
+    """
+    Карточка заказа для админов. Собирается из сохраненного заказа, поэтому
+    при смене статуса не нужно разбирать текст исходного сообщения
+    """
+    return templates.render(
+        "admin_order",
+        created_at=datetime.fromtimestamp(order.created_at).strftime("%Y-%m-%d %H:%M:%S"),
+        full_name=order.full_name,
+        username=order.username or templates.render("admin_order_no_username"),
+        user_id=order.user_id,
+        chat_id=order.chat_id,
+        **order_values(order)
+    )
 
 
 async def handle_webapp_data(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -295,305 +550,396 @@ async def handle_webapp_data(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # Получаем информацию о пользователе сразу в начале
         user = update.effective_user
         
-        # Логируем сырые данные для отладки
+        # Сырые данные пишутся только на уровне DEBUG или выборочно
         raw_data = update.message.web_app_data.data
-        logger.info(f"Получены сырые WebApp данные от пользователя {user.id}: {raw_data}")
+        payload_logger.debug("WebApp данные от пользователя %s: %s", user.id, raw_data)
         
         # Парсим JSON данные
-        data = json.loads(update.message.web_app_data.data)
-        logger.info(f"Получены WebApp данные от {user.full_name}: {data}")
+        data = json.loads(raw_data)
         
         # Валидируем данные
         login = data.get('login', '').strip()
         if not login:
-            await update.message.reply_text("❌ Логин не может быть пустым. Попробуйте еще раз.")
+            await update.message.reply_text(templates.render("login_empty"), parse_mode='HTML')
             return
 
-        # Валидируем и пересчитываем сумму на сервере
+        # Валидируем и пересчитываем сумму на сервере по одному снимку цен
+        pricing = pricing_engine.snapshot
         try:
             base_amount = parse_amount(str(data.get('amount', 0)))
-            total_rub = calculate_total_with_commission(base_amount)
-            total_usdt = calculate_usdt_amount(total_rub)
+            quote = pricing.quote(base_amount)
+            total_rub = quote.total_rub
+            total_usdt = quote.total_usdt
         except ValueError as e:
-            await update.message.reply_text(f"❌ {e}")
+            await update.message.reply_text(templates.render("amount_invalid", error=e), parse_mode='HTML')
             return
+
+        shown_version = data.get('pricing_version')
+        if shown_version is not None and shown_version != pricing.version:
+            logger.info(f"WebApp показал пользователю {user.id} цены v{shown_version}, заказ посчитан по v{pricing.version}")
         
-        # Формируем сообщение о том что заявка в обработке
-        user_message = (
-            f"🔄 <b>Заявка в обработке</b>\n\n"
-            f"👤 Логин: <code>{login}</code>\n"
-            f"💰 Сумма: {base_amount} РУБ\n"
-            f"💳 К оплате: <b>{total_rub} РУБ</b> (с комиссией {current_commission_percent}%)\n"
-            f"💎 Эквивалент: <b>{total_usdt} USDT</b>\n\n"
-            f"⏳ <b>Ваша заявка рассматривается</b>\n"
-            f"📱 Ожидайте подтверждения от оператора\n\n"
-            f"🕐 Время обработки: до 30 минут"
-        )
-        
-        await update.message.reply_text(
-            user_message, 
-            parse_mode='HTML'
+        # Сохраняем заказ; кнопки подписывают его ID, сумму и логин
+        order = await order_store.create_order(
+            user_id=user.id,
+            chat_id=update.effective_chat.id,
+            login=login,
+            base_amount=base_amount,
+            total_rub=total_rub,
+            total_usdt=total_usdt,
+            commission_percent=pricing.commission_percent,
+            usdt_rate=pricing.usdt_rate,
+            username=user.username or '',
+            full_name=user.full_name,
+            pricing_version=pricing.version
         )
         
-        # Формируем сообщение для админа
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Создаем кнопки для управления заявкой  
-        # Используем base64 для кодирования логина чтобы избежать проблем с символами
-        encoded_login = base64.b64encode(login.encode()).decode()
-        
+        # Создаем кнопки для управления заявкой до уведомлений: если данные
+        # заказа не помещаются в callback_data, пользователь не получит
+        # подтверждение заказа, который никто не сможет принять
         keyboard = [
             [
                 InlineKeyboardButton(
-                    "✅ Принять заказ", 
-                    callback_data=f"accept_{user.id}_{update.effective_chat.id}_{total_rub}_{encoded_login}"
+                    templates.render("button_accept"), 
+                    callback_data=callback_codec.encode(ACTION_ACCEPT, order)
                 )
             ],
             [
                 InlineKeyboardButton(
-                    "❌ Отклонить", 
-                    callback_data=f"reject_{user.id}_{update.effective_chat.id}_{total_rub}_{encoded_login}"
+                    templates.render("button_reject"), 
+                    callback_data=callback_codec.encode(ACTION_REJECT, order)
                 )
             ]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        admin_message = (
-            f"🔔 <b>НОВЫЙ ЗАКАЗ НА ПОПОЛНЕНИЕ</b>\n\n"
-            f"⏰ Время: {timestamp}\n"
-            f"👤 Пользователь: {user.full_name} (@{user.username or 'без username'})\n"
-            f"🆔 User ID: <code>{user.id}</code>\n"
-            f"💬 Chat ID: <code>{update.effective_chat.id}</code>\n\n"
-            f"📋 <b>Данные заказа:</b>\n"
-            f"👤 Логин: <code>{login}</code>\n"
-            f"💰 Исходная сумма: {base_amount} РУБ\n"
-            f"💳 К оплате: <b>{total_rub} РУБ</b> (комиссия {current_commission_percent}%)\n"
-            f"💎 Эквивалент: <b>{total_usdt} USDT</b>\n"
-            f"💱 Курс: 1 USDT = {current_usdt_rate} РУБ\n\n"
-            f"📊 <b>Техническая информация:</b>\n"
-            f"<code>{json.dumps(data, ensure_ascii=False, indent=2)}</code>"
+        order_stats.record_created(order)
+        
+        # Сообщение о том что заявка в обработке
+        message_dispatcher.send(
+            update.effective_chat.id,
+            templates.render("order_pending", **order_values(order)),
+            parse_mode='HTML'
         )
         
-        # Отправляем в админ чат
-        if ADMIN_CHAT_ID:
-            try:
-                await context.bot.send_message(
-                    chat_id=ADMIN_CHAT_ID,
-                    text=admin_message,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup
-                )
-            except Exception as e:
-                logger.error(f"Ошибка отправки в админ чат: {e}")
+        admin_message = format_admin_order(order) + templates.render("admin_order_payload", payload=raw_data)
         
-        # Отправляем в дополнительный чат если настроен
-        if FORWARD_CHAT_ID:
-            try:
-                await context.bot.send_message(
-                    chat_id=FORWARD_CHAT_ID,
-                    text=admin_message,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup
-                )
-            except Exception as e:
-                logger.error(f"Ошибка отправки в дополнительный чат: {e}")
+        # Отправляем во все админ чаты параллельно; ошибки логирует диспетчер
+        message_dispatcher.fan_out(
+            admin_chat_ids(),
+            admin_message,
+            priority=PRIORITY_ADMIN,
+            parse_mode='HTML',
+            reply_markup=reply_markup
+        )
         
-        logger.info(f"Создан новый заказ от пользователя {user.id} (логин: {login}): {base_amount} РУБ -> {total_rub} РУБ ({current_commission_percent}%) = {total_usdt} USDT")
+        logger.info(f"Создан новый заказ #{order.id} от пользователя {user.id} (логин: {login}): {base_amount} РУБ -> {total_rub} РУБ ({pricing.commission_percent}%) = {total_usdt} USDT, цены v{pricing.version}")
         
     except json.JSONDecodeError:
         logger.error("Ошибка парсинга JSON данных от WebApp")
-        await update.message.reply_text(
-            "❌ Ошибка обработки данных. Попробуйте еще раз."
-        )
+        await update.message.reply_text(templates.render("webapp_parse_error"), parse_mode='HTML')
     except Exception as e:
         logger.error(f"Неожиданная ошибка при обработке WebApp данных: {e}")
-        await update.message.reply_text(
-            "❌ Упс, что-то пошло не так. Попробуйте еще раз или обратитесь к администратору."
-        )
+        await update.message.reply_text(templates.render("unexpected_error"), parse_mode='HTML')
 
 
-async def handle_accept_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Обработчик кнопки 'Принять заказ'"""
-    query = update.callback_query
-    await query.answer()
+def format_completion_message(order) -> str:
+    """Сообщение пользователю об оплаченном заказе"""
+    return templates.render("order_completed", **order_values(order))
+
+
+async def create_invoice_for_order(order):
+    """Создает инвойс Crypto Pay для принятого заказа; без Crypto Pay возвращает заказ как есть"""
+    if not crypto_pay_api:
+        return order
     
     try:
-        # Парсим данные из callback_data
-        parts = query.data.split('_')
-        if len(parts) >= 5:
-            _, user_id, chat_id, amount, encoded_login = parts[0], parts[1], parts[2], parts[3], parts[4]
-            
-            # Декодируем логин
-            try:
-                login = base64.b64decode(encoded_login.encode()).decode()
-            except:
-                login = "неизвестен"
-        else:
-            # Старый формат без логина
-            _, user_id, chat_id, amount = query.data.split('_', 3)
-            login = "неизвестен"
-        
-        # Отправляем уведомление пользователю о принятии заказа
-        accept_message = (
-            f"✅ <b>Заказ принят!</b>\n\n"
-            f"👤 Логин: <code>{login}</code>\n"
-            f"💳 К оплате: {amount} РУБ\n\n"
-            f"🔐 <b>С вами свяжется оператор</b>\n"
-            f"💎 Он предоставит реквизиты для оплаты через криптовалюту\n\n"
-            f"⏳ Ожидайте связи в ближайшее время"
-        )
-        
-        await context.bot.send_message(
-            chat_id=int(chat_id),
-            text=accept_message,
-            parse_mode='HTML'
+        invoice = await crypto_pay_api.create_invoice(
+            amount=str(order.total_rub),
+            description=templates.render("invoice_description", order_id=order.id),
+            payload=str(order.id)
         )
-        
-        # Создаем кнопку "Оплачено" для админа
-        paid_keyboard = [
-            [
-                InlineKeyboardButton(
-                    "💰 Оплачено", 
-                    callback_data=f"paid_{user_id}_{chat_id}_{amount}_{encoded_login}"
-                )
-            ]
-        ]
-        paid_reply_markup = InlineKeyboardMarkup(paid_keyboard)
-        
-        # Обновляем сообщение админа
-        await query.edit_message_text(
-            text=f"{query.message.text}\n\n✅ <b>СТАТУС: ЗАКАЗ ПРИНЯТ</b>\n💡 Ожидается оплата",
-            parse_mode='HTML',
-            reply_markup=paid_reply_markup
-        )
-        
-        logger.info(f"Заказ принят для пользователя {user_id} (логин: {login})")
-        
+        pay_url = invoice.get('bot_invoice_url') or invoice.get('pay_url', '')
+        order = await order_store.set_invoice(order.id, int(invoice['invoice_id']), pay_url)
+        if invoice_poller:
+            invoice_poller.track(order.invoice_id)
+        return order
     except Exception as e:
-        logger.error(f"Ошибка при принятии заказа: {e}")
-        await query.edit_message_text(
-            text=f"{query.message.text}\n\n❌ <b>ОШИБКА при принятии заказа</b>",
-            parse_mode='HTML'
-        )
+        logger.error(f"Не удалось создать инвойс для заказа #{order.id}: {e}")
+        return order
 
 
-async def handle_paid_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Обработчик кнопки 'Оплачено'"""
-    query = update.callback_query
-    await query.answer()
+async def find_invoice_order(invoice: dict):
+    """Находит заказ инвойса по invoice_id или по payload"""
+    order = None
+    if invoice.get('invoice_id'):
+        order = await order_store.get_order_by_invoice(int(invoice['invoice_id']))
+    if order is None and str(invoice.get('payload', '')).isdigit():
+        order = await order_store.get_order(int(invoice['payload']))
+    return order
+
+
+async def handle_invoice_paid(invoice: dict) -> None:
+    """Завершает заказ по событию invoice_paid от Crypto Pay"""
+    if invoice_poller and invoice.get('invoice_id'):
+        # Оплата пришла через webhook - опрашивать инвойс больше не нужно
+        invoice_poller.forget(int(invoice['invoice_id']))
     
-    try:
-        # Парсим данные из callback_data
-        parts = query.data.split('_')
-        if len(parts) >= 5:
-            _, user_id, chat_id, amount, encoded_login = parts[0], parts[1], parts[2], parts[3], parts[4]
-            
-            # Декодируем логин
-            try:
-                login = base64.b64decode(encoded_login.encode()).decode()
-            except:
-                login = "неизвестен"
-        else:
-            # Старый формат без логина
-            _, user_id, chat_id, amount = query.data.split('_', 3)
-            login = "неизвестен"
+    order = await find_invoice_order(invoice)
+    if order is None:
+        logger.warning(f"Оплачен инвойс {invoice.get('invoice_id')} без заказа")
+        return
+    
+    async with order_machine.lock(order.id):
+        # Webhook и опрос могут сообщить об одной оплате дважды: применится одна
+        result = await order_machine.apply(order.id, ACTION_INVOICE_PAID)
+        if not result.applied:
+            logger.info(f"Заказ #{order.id}: оплата не применена ({result.outcome})")
+            return
+        paid_order = result.order
         
-        # Отправляем уведомление пользователю о завершении
-        completion_message = (
-            f"🎉 <b>Платеж подтвержден!</b>\n\n"
-            f"👤 Логин: <code>{login}</code>\n"
-            f"💳 Оплачено: {amount} РУБ\n\n"
-            f"✅ <b>Заказ выполнен успешно!</b>\n"
-            f"💡 Спасибо за использование нашего сервиса!\n"
-            f"❓ Если возникли вопросы, обращайтесь к администратору."
+        message_dispatcher.send(
+            paid_order.chat_id,
+            format_completion_message(paid_order),
+            parse_mode='HTML'
         )
-        
-        await context.bot.send_message(
-            chat_id=int(chat_id),
-            text=completion_message,
+        message_dispatcher.fan_out(
+            admin_chat_ids(),
+            templates.render(
+                "admin_invoice_paid",
+                paid_amount=invoice.get('paid_amount', '?'),
+                paid_asset=invoice.get('paid_asset', ''),
+                **order_values(paid_order)
+            ),
+            priority=PRIORITY_ADMIN,
             parse_mode='HTML'
         )
+    
+    logger.info(f"Заказ #{paid_order.id} оплачен через Crypto Pay (инвойс {invoice.get('invoice_id')})")
+
+
+async def handle_invoice_expired(invoice: dict) -> None:
+    """Помечает заказ истекшим, если его инвойс Crypto Pay не оплатили вовремя"""
+    order = await find_invoice_order(invoice)
+    if order is None:
+        logger.warning(f"Истек инвойс {invoice.get('invoice_id')} без заказа")
+        return
+    
+    async with order_machine.lock(order.id):
+        result = await order_machine.apply(order.id, ACTION_INVOICE_EXPIRED)
+        if not result.applied:
+            logger.info(f"Заказ #{order.id}: истечение инвойса не применено ({result.outcome})")
+            return
+        expired_order = result.order
         
-        # Обновляем сообщение админа (убираем кнопки)
-        await query.edit_message_text(
-            text=f"{query.message.text}\n\n💰 <b>СТАТУС: ОПЛАЧЕНО И ВЫПОЛНЕНО</b>",
+        message_dispatcher.send(
+            expired_order.chat_id,
+            templates.render("order_expired", **order_values(expired_order)),
             parse_mode='HTML'
         )
-        
-        logger.info(f"Заказ завершен для пользователя {user_id} (логин: {login})")
-        
-    except Exception as e:
-        logger.error(f"Ошибка при завершении заказа: {e}")
-        await query.edit_message_text(
-            text=f"{query.message.text}\n\n❌ <b>ОШИБКА при завершении заказа</b>",
+        message_dispatcher.fan_out(
+            admin_chat_ids(),
+            templates.render("admin_invoice_expired", **order_values(expired_order)),
+            priority=PRIORITY_ADMIN,
             parse_mode='HTML'
         )
+    
+    logger.info(f"Заказ #{expired_order.id}: инвойс {invoice.get('invoice_id')} истек")
+
+
+def parse_order_callback(callback_data: str):
+    """Проверяет подпись callback_data кнопки заказа; None - данные чужие или поддельные"""
+    payload = callback_codec.decode(callback_data)
+    if payload is None or payload.action not in ORDER_CALLBACK_EFFECTS:
+        return None
+    return payload
+
 
+def update_key(update: object):
+    """
+    Ключ порядка обработки: нажатия кнопок - по заказу (разные заказы в
+    одном админ-чате обрабатываются параллельно), остальное - по чату
+    """
+    if isinstance(update, Update) and update.callback_query and update.callback_query.data:
+        payload = parse_order_callback(update.callback_query.data)
+        if payload is not None:
+            return ("order", payload.order_id)
+    return chat_key(update)
+
+
+async def accept_order(query, order) -> None:
+    """Заказ принят: счет Crypto Pay, уведомление пользователю, кнопка "Оплачено" админу"""
+    order = await create_invoice_for_order(order)
+    
+    # Отправляем уведомление пользователю о принятии заказа
+    if order.pay_url:
+        accept_message = templates.render("order_accepted_pay", pay_url=order.pay_url, **order_values(order))
+    else:
+        accept_message = templates.render("order_accepted_manual", **order_values(order))
+    
+    message_dispatcher.send(
+        order.chat_id,
+        accept_message,
+        parse_mode='HTML'
+    )
+    
+    # Создаем кнопку "Оплачено" для админа
+    paid_keyboard = [
+        [
+            InlineKeyboardButton(
+                templates.render("button_paid"), 
+                callback_data=callback_codec.encode(ACTION_PAID, order)
+            )
+        ]
+    ]
+    paid_reply_markup = InlineKeyboardMarkup(paid_keyboard)
+    
+    # Обновляем сообщение админа
+    await query.edit_message_text(
+        text=format_admin_order(order) + templates.render("admin_status_accepted"),
+        parse_mode='HTML',
+        reply_markup=paid_reply_markup
+    )
+    
+    logger.info(f"Заказ #{order.id} принят для пользователя {order.user_id} (логин: {order.login})")
 
 
+async def complete_order(query, order) -> None:
+    """Заказ оплачен: уведомление пользователю, карточка админа без кнопок"""
+    message_dispatcher.send(
+        order.chat_id,
+        format_completion_message(order),
+        parse_mode='HTML'
+    )
+    
+    await query.edit_message_text(
+        text=format_admin_order(order) + templates.render("admin_status_paid"),
+        parse_mode='HTML'
+    )
+    
+    logger.info(f"Заказ #{order.id} завершен для пользователя {order.user_id} (логин: {order.login})")
 
 
-async def handle_reject_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Обработчик кнопки 'Отклонить'"""
+async def reject_order(query, order) -> None:
+    """Заказ отклонен: уведомление пользователю, карточка админа без кнопок"""
+    message_dispatcher.send(
+        order.chat_id,
+        templates.render("order_rejected", **order_values(order)),
+        parse_mode='HTML'
+    )
+    
+    await query.edit_message_text(
+        text=format_admin_order(order) + templates.render("admin_status_rejected"),
+        parse_mode='HTML'
+    )
+    
+    logger.info(f"Заказ #{order.id} пользователя {order.user_id} (логин: {order.login}) отклонен")
+
+
+# Кнопки под карточкой заказа: действие -> (последствия перехода, текст ошибки для админа)
+ORDER_CALLBACK_EFFECTS = {
+    ACTION_ACCEPT: (accept_order, "admin_error_accept"),
+    ACTION_PAID: (complete_order, "admin_error_paid"),
+    ACTION_REJECT: (reject_order, "admin_error_reject"),
+}
+
+
+async def handle_order_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик кнопок 'Принять заказ', 'Оплачено' и 'Отклонить'"""
     query = update.callback_query
-    await query.answer()
+    payload = parse_order_callback(query.data)
+    if payload is None:
+        logger.warning(f"Отклонены неподписанные callback_data от пользователя {query.from_user.id}")
+        await query.answer()
+        return
+    action, order_id = payload.action, payload.order_id
+    effect, error_template = ORDER_CALLBACK_EFFECTS[action]
     
-    try:
-        # Парсим данные из callback_data
-        parts = query.data.split('_')
-        if len(parts) >= 5:
-            _, user_id, chat_id, amount, encoded_login = parts[0], parts[1], parts[2], parts[3], parts[4]
-            
-            # Декодируем логин
-            try:
-                login = base64.b64decode(encoded_login.encode()).decode()
-            except:
-                login = "неизвестен"
-        else:
-            # Старый формат без логина
-            _, user_id, chat_id, amount = query.data.split('_', 3)
-            login = "неизвестен"
-        
-        # Отправляем уведомление пользователю
-        reject_message = (
-            f"❌ <b>Заказ отклонен</b>\n\n"
-            f"👤 Логин: <code>{login}</code>\n"
-            f"💳 Сумма: {amount} РУБ\n\n"
-            f"😔 К сожалению, ваш заказ не может быть обработан.\n"
-            f"📞 Если у вас есть вопросы, обратитесь к администратору.\n\n"
-            f"🔄 Вы можете попробовать создать новый заказ через /start"
-        )
-        
-        await context.bot.send_message(
-            chat_id=int(chat_id),
-            text=reject_message,
-            parse_mode='HTML'
-        )
-        
-        # Обновляем сообщение админа
-        await query.edit_message_text(
-            text=f"{query.message.text}\n\n❌ <b>СТАТУС: ЗАКАЗ ОТКЛОНЕН</b>",
-            parse_mode='HTML'
-        )
-        
-        logger.info(f"Заказ пользователя {user_id} (логин: {login}) отклонен")
+    async with order_machine.lock(order_id):
+        try:
+            # Кнопка должна относиться именно к этому заказу: сумма и логин
+            # из подписанных данных сверяются с базой перед переходом
+            result = await order_machine.apply(order_id, action, guard=payload.matches)
+            if not result.applied:
+                # Повторное нажатие, действие из другого админ-чата или не по
+                # порядку: только ответ на callback, без сообщений и правок
+                await query.answer(templates.render("order_already_processed"))
+                return
+            await query.answer()
+            await effect(query, result.order)
         
-    except Exception as e:
-        logger.error(f"Ошибка при отклонении заказа: {e}")
-        await query.edit_message_text(
-            text=f"{query.message.text}\n\n❌ <b>ОШИБКА при отклонении заказа</b>",
-            parse_mode='HTML'
-        )
+        except Exception as e:
+            logger.error(f"Ошибка действия {action} с заказом #{order_id}: {e}")
+            await query.edit_message_text(
+                text=query.message.text_html + templates.render(error_template),
+                parse_mode='HTML'
+            )
 
 
 async def handle_unknown_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик неизвестных сообщений"""
-    await update.message.reply_text(
-        "🤔 Я не понимаю это сообщение.\n"
-        "Воспользуйтесь командой /help для получения справки."
-    )
+    await update.message.reply_text(templates.render("unknown_message"), parse_mode='HTML')
+
+
+def build_application(builder=None) -> Application:
+    """Создает приложение и регистрирует обработчики"""
+    if builder is None:
+        builder = Application.builder().token(BOT_TOKEN)
+    
+    global message_dispatcher, update_processor, crypto_pay_webhook, invoice_poller
+    if UPDATE_CONCURRENCY > 1:
+        update_processor = PerChatUpdateProcessor(UPDATE_CONCURRENCY, update_key)
+        builder = builder.concurrent_updates(update_processor)
+    application = builder.build()
+    
+    message_dispatcher = MessageDispatcher(application.bot)
+    if crypto_pay_api:
+        crypto_pay_webhook = CryptoPayWebhook(crypto_pay_api, observed(handle_invoice_paid))
+        if CRYPTO_PAY_POLLING == 'true':
+            invoice_poller = InvoicePoller(
+                crypto_pay_api, observed(handle_invoice_paid), observed(handle_invoice_expired)
+            )
+    
+    # Лимиты частоты проверяются раньше всех обработчиков
+    application.add_handler(create_throttle_handler(update_throttler, templates.render("throttled")), group=THROTTLE_HANDLER_GROUP)
+    
+    # Регистрируем обработчики команд
+    application.add_handler(CommandHandler("start", observed(start_command)))
+    application.add_handler(CommandHandler("help", observed(help_command)))
+    application.add_handler(CommandHandler("cancel", observed(cancel_command)))
+    application.add_handler(CommandHandler("admin", observed(admin_command)))
+    application.add_handler(CommandHandler("setrate", observed(set_rate_command)))
+    application.add_handler(CommandHandler("setcommission", observed(set_commission_command)))
+    application.add_handler(CommandHandler("stats", observed(stats_command)))
+    
+    # Обработчик WebApp данных
+    application.add_handler(MessageHandler(filters.StatusUpdate.WEB_APP_DATA, observed(handle_webapp_data)))
+    
+    # Обработчики кнопок управления заявками
+    application.add_handler(CallbackQueryHandler(observed(handle_order_callback)))
+    
+    # Обработчик всех остальных сообщений
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, observed(handle_unknown_message)))
+    
+    return application
+
+
+def install_stop_signals(stop_event: asyncio.Event) -> None:
+    """Останавливает бота по SIGINT/SIGTERM (на Windows остается KeyboardInterrupt)"""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
 
 
+async def start_invoice_poller() -> None:
+    """Загружает неоплаченные инвойсы из базы и запускает их опрос"""
+    for order in await order_store.list_awaiting_payment():
+        # Инвойс привязывается к заказу в момент создания
+        invoice_poller.track(order.invoice_id, order.updated_at)
+    invoice_poller.start()
+    logger.info(f"Опрос инвойсов Crypto Pay запущен, отслеживается: {invoice_poller.tracked}")
 
 
 async def main_async():
@@ -601,44 +947,78 @@ async def main_async():
     logger.info("Запуск Crypto Top-Up Bot...")
     
     # Создаем приложение
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = build_application()
     
-    # Регистрируем обработчики команд
-    application.add_handler(CommandHandler("start", start_command))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("cancel", cancel_command))
-    application.add_handler(CommandHandler("admin", admin_command))
-    application.add_handler(CommandHandler("setrate", set_rate_command))
-    application.add_handler(CommandHandler("setcommission", set_commission_command))
+    stop_event = asyncio.Event()
+    install_stop_signals(stop_event)
     
-    # Обработчик WebApp данных
-    application.add_handler(MessageHandler(filters.StatusUpdate.WEB_APP_DATA, handle_webapp_data))
+    web_runner = None
+    metrics_runner = None
     
-    # Обработчики кнопок управления заявками
-    application.add_handler(CallbackQueryHandler(handle_accept_callback, pattern="^accept_"))
-    application.add_handler(CallbackQueryHandler(handle_paid_callback, pattern="^paid_"))
-    application.add_handler(CallbackQueryHandler(handle_reject_callback, pattern="^reject_"))
-    
-    # Обработчик всех остальных сообщений
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_unknown_message))
+    await order_store.open()
+    pricing = await load_pricing_state()
+    await state_backend.start()
     
     logger.info("Бот запущен и готов к работе!")
-    logger.info(f"Текущий курс USDT: 1 USDT = {current_usdt_rate} РУБ")
-    logger.info(f"Комиссия: {current_commission_percent}%")
+    logger.info(f"Текущий курс USDT: 1 USDT = {pricing.usdt_rate} РУБ")
+    logger.info(f"Комиссия: {pricing.commission_percent}%")
     
     # Запускаем бота
     async with application:
         await application.start()
-        await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
-        
+        message_dispatcher.start()
         try:
-            while True:
-                await asyncio.sleep(1)
-        except KeyboardInterrupt:
+            if METRICS_PORT:
+                metrics_app = create_web_app()
+                add_metrics_route(metrics_app, metrics_registry)
+                metrics_runner = await start_web_server(metrics_app, METRICS_HOST, METRICS_PORT)
+            
+            web_app = create_web_app([metrics_middleware(http_latency, http_responses)])
+            if BOT_MODE == 'webhook':
+                # Обновления приходят POST-запросами от Telegram
+                add_telegram_webhook_route(web_app, application, TELEGRAM_WEBHOOK_SECRET)
+            if crypto_pay_webhook:
+                crypto_pay_webhook.add_routes(web_app)
+                crypto_pay_webhook.start()
+                logger.info(
+                    f"Crypto Pay webhook: {build_webhook_url(WEBHOOK_URL, CRYPTO_PAY_WEBHOOK_PATH) or CRYPTO_PAY_WEBHOOK_PATH}"
+                )
+            if BOT_MODE == 'webhook' or crypto_pay_webhook:
+                web_runner = await start_web_server(web_app, WEBHOOK_HOST, WEBHOOK_PORT)
+            if invoice_poller:
+                await start_invoice_poller()
+            
+            if BOT_MODE == 'webhook':
+                webhook_url = build_webhook_url(WEBHOOK_URL, TELEGRAM_WEBHOOK_PATH)
+                await application.bot.set_webhook(
+                    url=webhook_url,
+                    allowed_updates=Update.ALL_TYPES,
+                    secret_token=TELEGRAM_WEBHOOK_SECRET
+                )
+                logger.info(f"Telegram webhook установлен: {webhook_url}")
+            else:
+                await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+                logger.info("Получение обновлений через long polling")
+            
+            await stop_event.wait()
             logger.info("Получен сигнал остановки")
-        
-        await application.updater.stop()
-        await application.stop()
+        finally:
+            if web_runner:
+                await web_runner.cleanup()
+            if metrics_runner:
+                await metrics_runner.cleanup()
+            if invoice_poller:
+                await invoice_poller.stop()
+            if crypto_pay_webhook:
+                await crypto_pay_webhook.stop()
+            await message_dispatcher.stop()
+            if application.updater.running:
+                await application.updater.stop()
+            await application.stop()
+            await state_backend.stop()
+            await order_store.close()
+            if crypto_pay_api:
+                await crypto_pay_api.close()
 
 def main() -> None:
     """Основная функция запуска бота"""
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Callback Codec
+callback_data кнопок заказа в фиксированном бинарном формате с подписью:
+действие, ID заказа и пользователя, сумма в копейках, хеш логина и
+усеченный HMAC, в base64url. Разбор не обращается к хранилищу; поддельные
+и испорченные данные отбрасываются по длине и подписи. Модуль не зависит
+от остального бота
+"""
+
+import hmac
+import base64
+import struct
+import hashlib
+import binascii
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Optional
+
+# Версия формата: первый байт, чтобы формат можно было сменить
+CALLBACK_VERSION = 1
+
+# Коды действий в одном байте
+ACTION_CODES: Dict[str, int] = {"accept": 1, "paid": 2, "reject": 3}
+ACTION_NAMES: Dict[int, str] = {code: name for name, code in ACTION_CODES.items()}
+
+# версия, действие, ID заказа, ID пользователя, сумма в копейках, хеш логина
+_LAYOUT = struct.Struct(">BBIQQ4s")
+# Пределы полей формата
+MAX_ORDER_ID = 2 ** 32 - 1
+MAX_UINT64 = 2 ** 64 - 1
+
+# 80 бит подписи; вместе с полями 36 байт - ровно 48 символов base64url без "="
+TAG_SIZE = 10
+PACKED_SIZE = _LAYOUT.size + TAG_SIZE
+ENCODED_SIZE = PACKED_SIZE * 4 // 3
+
+HUNDRED = Decimal(100)
+
+
+def login_digest(login: str) -> bytes:
+    """4 байта хеша логина: достаточно, чтобы отличить заказы, не раскрывая логин"""
+    return hashlib.blake2s(login.encode("utf-8"), digest_size=4).digest()
+
+
+@dataclass(frozen=True)
+class CallbackPayload:
+    """Разобранные callback_data"""
+    action: str
+    order_id: int
+    user_id: int
+    amount_kopecks: int
+    login_digest: bytes
+
+    def matches(self, order) -> bool:
+        """Относится ли кнопка к этому заказу (а не к заказу с тем же ID из другой базы)"""
+        return (
+            order.user_id == self.user_id
+            and int(order.total_rub * HUNDRED) == self.amount_kopecks
+            and login_digest(order.login) == self.login_digest
+        )
+
+
+class CallbackCodec:
+    """
+    Кодирует и проверяет callback_data. Ключ подписи выводится из secret
+    (токена бота), поэтому одинаков во всех процессах бота
+    """
+
+    def __init__(self, secret: bytes):
+        self._key = hmac.new(b"callback-data", secret, hashlib.sha256).digest()
+
+    def _tag(self, body: bytes) -> bytes:
+        return hmac.digest(self._key, body, "sha256")[:TAG_SIZE]
+
+    def encode(self, action: str, order) -> str:
+        """
+        callback_data для кнопки действия с заказом (ENCODED_SIZE символов).
+        ValueError - ID или сумма заказа не помещаются в формат
+        """
+        amount_kopecks = int(order.total_rub * HUNDRED)
+        if not 0 <= order.id <= MAX_ORDER_ID:
+            raise ValueError(f"ID заказа {order.id} не помещается в callback_data")
+        if not 0 <= order.user_id <= MAX_UINT64:
+            raise ValueError(f"ID пользователя {order.user_id} не помещается в callback_data")
+        if not 0 <= amount_kopecks <= MAX_UINT64:
+            raise ValueError(f"Сумма заказа #{order.id} не помещается в callback_data")
+        body = _LAYOUT.pack(
+            CALLBACK_VERSION,
+            ACTION_CODES[action],
+            order.id,
+            order.user_id,
+            amount_kopecks,
+            login_digest(order.login),
+        )
+        return base64.urlsafe_b64encode(body + self._tag(body)).decode("ascii")
+
+    def decode(self, data: str) -> Optional[CallbackPayload]:
+        """Поля callback_data или None, если данные чужие, испорчены или подделаны"""
+        if len(data) != ENCODED_SIZE:
+            return None
+        try:
+            packed = base64.urlsafe_b64decode(data)
+        except (binascii.Error, ValueError):
+            return None
+        body = packed[:_LAYOUT.size]
+        if not hmac.compare_digest(self._tag(body), packed[_LAYOUT.size:]):
+            return None
+        version, action_code, order_id, user_id, amount_kopecks, digest = _LAYOUT.unpack(body)
+        action = ACTION_NAMES.get(action_code)
+        if version != CALLBACK_VERSION or action is None:
+            return None
+        return CallbackPayload(action, order_id, user_id, amount_kopecks, digest)
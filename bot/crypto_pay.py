@@ -4,50 +4,115 @@ Crypto Pay API Integration
 Интеграция с Crypto Pay API для автоматических криптоплатежей
 """
 
-import os
-import json
+import time
+import asyncio
 import logging
 import hashlib
 import hmac
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple, Union
 import aiohttp
 from decimal import Decimal, ROUND_HALF_UP
 
 logger = logging.getLogger(__name__)
 
+# Максимум инвойсов в одном ответе getInvoices
+MAX_INVOICES_PER_REQUEST = 1000
+
 class CryptoPayAPI:
     """Класс для работы с Crypto Pay API"""
     
-    def __init__(self, api_token: str, testnet: bool = False):
+    def __init__(self,
+                 api_token: str,
+                 testnet: bool = False,
+                 base_url: Optional[str] = None,
+                 timeout: float = 10.0,
+                 pool_size: int = 20,
+                 keepalive_timeout: float = 30.0):
         self.api_token = api_token
-        self.base_url = "https://testnet-pay.crypt.bot/api" if testnet else "https://pay.crypt.bot/api"
+        if base_url:
+            self.base_url = base_url.rstrip("/")
+        else:
+            self.base_url = "https://testnet-pay.crypt.bot/api" if testnet else "https://pay.crypt.bot/api"
         self.headers = {
             "Crypto-Pay-API-Token": api_token,
             "Content-Type": "application/json"
         }
+        # Таймаут по умолчанию для одного запроса (секунды)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        # Ключ для проверки подписи webhook вычисляется один раз
+        self._webhook_secret = hashlib.sha256(api_token.encode()).digest()
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Вызывается после каждого запроса: (метод API, секунды, успех)
+        self.request_observer: Optional[Callable[[str, float, bool], None]] = None
+    
+    async def start(self) -> "CryptoPayAPI":
+        """Открывает общую сессию с пулом keep-alive соединений"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size,
+                ttl_dns_cache=300,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self
+    
+    async def close(self) -> None:
+        """Закрывает общую сессию и все соединения пула"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def __aenter__(self) -> "CryptoPayAPI":
+        return await self.start()
     
-    async def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+    
+    async def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None,
+                            timeout: Optional[float] = None) -> Dict:
         """Выполняет HTTP запрос к API"""
         url = f"{self.base_url}/{endpoint}"
         
-        async with aiohttp.ClientSession() as session:
-            try:
-                if method.upper() == "GET":
-                    async with session.get(url, headers=self.headers, params=data) as response:
-                        result = await response.json()
-                else:
-                    async with session.post(url, headers=self.headers, json=data) as response:
-                        result = await response.json()
+        # Сессия открывается лениво, если start() не был вызван явно
+        if self._session is None or self._session.closed:
+            await self.start()
+        
+        # Без явного таймаута действует таймаут сессии
+        options = {}
+        if timeout is not None:
+            options["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        
+        started = time.perf_counter()
+        ok = False
+        try:
+            if method.upper() == "GET":
+                request = self._session.get(url, params=data, **options)
+            else:
+                request = self._session.post(url, json=data, **options)
+            
+            async with request as response:
+                result = await response.json()
+            
+            if result.get("ok"):
+                ok = True
+                return result.get("result", {})
+            else:
+                logger.error(f"Crypto Pay API error: {result.get('error')}")
+                raise Exception(f"API Error: {result.get('error')}")
                 
-                if result.get("ok"):
-                    return result.get("result", {})
-                else:
-                    logger.error(f"Crypto Pay API error: {result.get('error')}")
-                    raise Exception(f"API Error: {result.get('error')}")
-                    
-            except Exception as e:
-                logger.error(f"Request to {url} failed: {e}")
-                raise
+        except Exception as e:
+            logger.error(f"Request to {url} failed: {e}")
+            raise
+        finally:
+            if self.request_observer is not None:
+                self.request_observer(endpoint, time.perf_counter() - started, ok)
     
     async def get_me(self) -> Dict:
         """Получает информацию о приложении"""
@@ -85,13 +150,27 @@ class CryptoPayAPI:
             
         return await self._make_request("POST", "createInvoice", data)
     
-    async def get_invoices(self, invoice_ids: Optional[List[int]] = None) -> List[Dict]:
-        """Получает список инвойсов"""
+    async def get_invoices(self,
+                           invoice_ids: Optional[List[int]] = None,
+                           status: Optional[str] = None,
+                           count: Optional[int] = None) -> List[Dict]:
+        """Получает список инвойсов (не больше MAX_INVOICES_PER_REQUEST за запрос)"""
         data = {}
         if invoice_ids:
             data["invoice_ids"] = ",".join(map(str, invoice_ids))
+        if status:
+            data["status"] = status
+        if count is None and invoice_ids:
+            # По умолчанию API возвращает только 100 инвойсов
+            count = len(invoice_ids)
+        if count:
+            data["count"] = min(count, MAX_INVOICES_PER_REQUEST)
         
-        return await self._make_request("GET", "getInvoices", data)
+        result = await self._make_request("GET", "getInvoices", data)
+        # API отдает {"items": [...]}, хотя документация обещает массив
+        if isinstance(result, dict):
+            return result.get("items", [])
+        return result
     
     async def set_webhook(self, webhook_url: str) -> Dict:
         """Устанавливает webhook URL"""
@@ -101,74 +180,212 @@ class CryptoPayAPI:
         
         return await self._make_request("POST", "setWebhook", data)
     
-    def verify_webhook_signature(self, body: str, signature: str) -> bool:
-        """Проверяет подпись webhook"""
+    def verify_webhook_signature(self, body: Union[str, bytes], signature: str) -> bool:
+        """Проверяет подпись webhook (тело запроса - как пришло, без разбора)"""
         try:
-            secret = hashlib.sha256(self.api_token.encode()).digest()
-            calculated_signature = hmac.new(secret, body.encode(), hashlib.sha256).hexdigest()
-            return calculated_signature == signature
+            if isinstance(body, str):
+                body = body.encode()
+            calculated_signature = hmac.new(self._webhook_secret, body, hashlib.sha256).hexdigest()
+            return hmac.compare_digest(calculated_signature, signature or "")
         except Exception as e:
             logger.error(f"Webhook signature verification failed: {e}")
             return False
 
 
+# Шаг суммы в фиате, который котировка различает (копейка, цент)
+FIAT_STEP = Decimal("0.01")
+# Точность криптовалюты, пока getCurrencies не загружен или не знает ее
+DEFAULT_ASSET_DECIMALS = 8
+
+
+class QuoteTable:
+    """
+    Снимок курсов для котировок. Для каждой пары фиат/криптовалюта заранее
+    посчитаны обратный курс и шаг округления, поэтому пересчет суммы - одно
+    умножение и округление на валюту, без ветвлений и разбора констант
+    
+    Знаков после запятой столько, чтобы единица последнего знака стоила не
+    больше FIAT_STEP, но не больше, чем у валюты по getCurrencies
+    """
+    
+    def __init__(self, rates: Dict[str, Dict[str, Decimal]], decimals: Dict[str, int]):
+        # фиат -> криптовалюта -> сколько криптовалюты за 1 единицу фиата
+        self.rates = rates
+        # фиат -> ((криптовалюта, обратный курс, шаг округления), ...)
+        self._columns: Dict[str, Tuple[Tuple[str, Decimal, Decimal], ...]] = {}
+        for fiat, fiat_rates in rates.items():
+            columns = []
+            for asset, rate in fiat_rates.items():
+                places = min(decimals.get(asset, DEFAULT_ASSET_DECIMALS), max(0, -(FIAT_STEP * rate).adjusted()))
+                columns.append((asset, rate, Decimal(1).scaleb(-places)))
+            self._columns[fiat] = tuple(columns)
+    
+    @property
+    def fiats(self) -> List[str]:
+        return list(self._columns)
+    
+    def assets(self, fiat: str) -> List[str]:
+        """Криптовалюты, в которые пересчитывается фиат"""
+        return [asset for asset, _, _ in self._get_columns(fiat)]
+    
+    def _get_columns(self, fiat: str) -> Tuple[Tuple[str, Decimal, Decimal], ...]:
+        columns = self._columns.get(fiat)
+        if columns is None:
+            raise ValueError(f"Нет курсов для {fiat}")
+        return columns
+    
+    def quote(self, amount: Decimal, fiat: str = "RUB") -> Dict[str, str]:
+        """Сумма в фиате во всех криптовалютах"""
+        return {
+            asset: str((amount * rate).quantize(step, ROUND_HALF_UP))
+            for asset, rate, step in self._get_columns(fiat)
+        }
+    
+    def quote_batch(self, amounts: List[Decimal], fiat: str = "RUB") -> List[List[str]]:
+        """Матрица: строка на сумму, столбец на криптовалюту (порядок assets)"""
+        columns = self._get_columns(fiat)
+        return [
+            [str((amount * rate).quantize(step, ROUND_HALF_UP)) for _, rate, step in columns]
+            for amount in amounts
+        ]
+
+
 class CurrencyConverter:
     """Конвертер валют через Crypto Pay API"""
     
-    def __init__(self, crypto_pay: CryptoPayAPI):
+    def __init__(self, crypto_pay: CryptoPayAPI, cache_ttl: float = 60.0):
         self.crypto_pay = crypto_pay
-        self._rates_cache = {}
-        self._cache_timestamp = 0
+        # Время жизни кэша курсов в секундах (0 - без кэша)
+        self.cache_ttl = cache_ttl
+        self._table: Optional[QuoteTable] = None
+        self._cache_timestamp = 0.0
+        # Точность валют из getCurrencies: загружается один раз
+        self._decimals: Optional[Dict[str, int]] = None
+        # Текущий запрос курсов - все конкурентные вызовы ждут его
+        self._refresh_task: Optional[asyncio.Task] = None
     
-    async def get_rates_from_rub(self) -> Dict[str, Decimal]:
-        """Получает курсы криптовалют к рублю"""
+    @property
+    def cache_age(self) -> Optional[float]:
+        """Возраст кэша курсов в секундах (None - курсы еще не загружены)"""
+        if self._table is None:
+            return None
+        return time.monotonic() - self._cache_timestamp
+    
+    def _cache_is_fresh(self) -> bool:
+        """Проверяет, что кэш курсов еще не устарел"""
+        return self._table is not None and time.monotonic() - self._cache_timestamp < self.cache_ttl
+    
+    async def _load_decimals(self) -> None:
+        """Загружает точность валют; при ошибке попытка повторится при следующем обновлении курсов"""
         try:
-            rates = await self.crypto_pay.get_exchange_rates()
-            rub_rates = {}
-            
-            for rate in rates:
-                if rate.get("target") == "RUB" and rate.get("is_valid"):
-                    asset = rate.get("source")
-                    rate_value = Decimal(str(rate.get("rate", "0")))
-                    if rate_value > 0:
-                        # Обратный курс: 1 RUB = X crypto
-                        rub_rates[asset] = Decimal("1") / rate_value
-            
-            logger.info(f"Loaded exchange rates: {rub_rates}")
-            return rub_rates
-            
+            currencies = await self.crypto_pay.get_currencies()
+        except Exception as e:
+            logger.error(f"Failed to get currencies: {e}")
+            return
+        
+        self._decimals = {
+            currency["code"]: int(currency["decimals"])
+            for currency in currencies
+            if currency.get("code") and currency.get("decimals") is not None
+        }
+        logger.info(f"Loaded currency decimals: {self._decimals}")
+    
+    async def _fetch_rates(self) -> Dict[str, Dict[str, Decimal]]:
+        """Загружает курсы криптовалют ко всем фиатам из API"""
+        rates = await self.crypto_pay.get_exchange_rates()
+        fiat_rates: Dict[str, Dict[str, Decimal]] = {}
+        
+        for rate in rates:
+            if rate.get("is_valid"):
+                rate_value = Decimal(str(rate.get("rate", "0")))
+                if rate_value > 0:
+                    # Обратный курс: 1 единица фиата = X crypto
+                    fiat_rates.setdefault(rate.get("target"), {})[rate.get("source")] = Decimal("1") / rate_value
+        
+        logger.info(f"Loaded exchange rates: {sum(map(len, fiat_rates.values()))} pairs, fiats {', '.join(fiat_rates)}")
+        logger.debug(f"Exchange rates: {fiat_rates}")
+        return fiat_rates
+    
+    async def _refresh_table(self) -> Optional[QuoteTable]:
+        """Обновляет кэш курсов; при ошибке оставляет прежние значения"""
+        if self._decimals is None:
+            await self._load_decimals()
+        
+        try:
+            fiat_rates = await self._fetch_rates()
         except Exception as e:
             logger.error(f"Failed to get exchange rates: {e}")
+            return self._table
+        
+        if fiat_rates:
+            self._table = QuoteTable(fiat_rates, self._decimals or {})
+            self._cache_timestamp = time.monotonic()
+        return self._table
+    
+    def _start_refresh(self) -> asyncio.Task:
+        """Запускает обновление курсов, если оно еще не идет (single-flight)"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh_table())
+        return self._refresh_task
+    
+    async def refresh_rates(self) -> Dict[str, Decimal]:
+        """Принудительно обновляет курсы, не дожидаясь истечения TTL"""
+        table = await asyncio.shield(self._start_refresh())
+        return table.rates.get("RUB", {}) if table else {}
+    
+    async def get_quote_table(self) -> Optional[QuoteTable]:
+        """Актуальный снимок курсов (None - курсы недоступны)"""
+        if self.cache_ttl <= 0:
+            return await asyncio.shield(self._start_refresh())
+        
+        if self._cache_is_fresh():
+            return self._table
+        
+        if self._table is not None:
+            # Stale-while-revalidate: отдаем устаревшие курсы сразу,
+            # а обновление идет в фоне
+            self._start_refresh()
+            return self._table
+        
+        # Кэш пуст - ждем единственный общий запрос
+        return await asyncio.shield(self._start_refresh())
+    
+    async def get_rates_from_rub(self) -> Dict[str, Decimal]:
+        """Получает курсы криптовалют к рублю"""
+        table = await self.get_quote_table()
+        return table.rates.get("RUB", {}) if table else {}
+    
+    async def convert(self, amount: Decimal, fiat: str = "RUB") -> Dict[str, str]:
+        """Конвертирует сумму в фиате в криптовалюты"""
+        table = await self.get_quote_table()
+        if table is None:
             return {}
+        return table.quote(amount, fiat)
+    
+    async def convert_batch(self, amounts: List[Decimal], fiat: str = "RUB") -> Tuple[List[str], List[List[str]]]:
+        """
+        Конвертирует несколько сумм в фиате по одному снимку курсов.
+        Возвращает список валют и матрицу: строка на сумму, столбец на валюту
+        """
+        table = await self.get_quote_table()
+        if table is None:
+            return [], [[] for _ in amounts]
+        return table.assets(fiat), table.quote_batch(amounts, fiat)
     
     async def convert_rub_to_crypto(self, rub_amount: Decimal) -> Dict[str, str]:
         """Конвертирует рубли в криптовалюты"""
-        rates = await self.get_rates_from_rub()
-        conversions = {}
-        
-        for asset, rate in rates.items():
-            crypto_amount = rub_amount * rate
-            # Округляем до разумного количества знаков
-            if asset in ["BTC", "ETH"]:
-                # Для дорогих валют больше знаков после запятой
-                formatted = crypto_amount.quantize(Decimal('0.000001'), rounding=ROUND_HALF_UP)
-            elif asset in ["USDT", "USDC"]:
-                # Для стейблкоинов 2 знака
-                formatted = crypto_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            else:
-                # Для остальных 4 знака
-                formatted = crypto_amount.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
-            
-            conversions[asset] = str(formatted)
-        
-        return conversions
+        return await self.convert(rub_amount, "RUB")
+    
+    async def convert_rub_batch(self, rub_amounts: List[Decimal]) -> Tuple[List[str], List[List[str]]]:
+        """Конвертирует несколько сумм в рублях по одному снимку курсов"""
+        return await self.convert_batch(rub_amounts, "RUB")
 
 
 # Глобальные переменные для инициализации
 crypto_pay_api = None
 currency_converter = None
 
-def init_crypto_pay(api_token: str, testnet: bool = False):
+def init_crypto_pay(api_token: str, testnet: bool = False, rates_cache_ttl: float = 60.0):
     """Инициализация Crypto Pay API"""
     global crypto_pay_api, currency_converter
     
@@ -177,7 +394,7 @@ def init_crypto_pay(api_token: str, testnet: bool = False):
         return None
     
     crypto_pay_api = CryptoPayAPI(api_token, testnet)
-    currency_converter = CurrencyConverter(crypto_pay_api)
+    currency_converter = CurrencyConverter(crypto_pay_api, cache_ttl=rates_cache_ttl)
     
     logger.info("Crypto Pay API инициализирован")
     return crypto_pay_api
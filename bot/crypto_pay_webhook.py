@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Crypto Pay Webhook
+Прием webhook-уведомлений Crypto Pay: проверка подписи, дедупликация
+и обработка событий в фоне
+"""
+
+import json
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List
+
+from aiohttp import web
+
+from crypto_pay import CryptoPayAPI
+
+logger = logging.getLogger(__name__)
+
+CRYPTO_PAY_WEBHOOK_PATH = "/webhook/crypto-pay"
+SIGNATURE_HEADER = "crypto-pay-api-signature"
+
+# Тела больше этого размера проверяются в отдельном потоке
+INLINE_VERIFY_MAX_BYTES = 16 * 1024
+
+InvoiceHandler = Callable[[Dict], Awaitable[None]]
+
+
+class CryptoPayWebhook:
+    """
+    Принимает webhook Crypto Pay. Запрос подтверждается сразу после проверки
+    подписи, а события invoice_paid обрабатываются воркерами из очереди
+    """
+
+    def __init__(self,
+                 crypto_pay: CryptoPayAPI,
+                 on_invoice_paid: InvoiceHandler,
+                 dedup_size: int = 10000,
+                 workers: int = 2,
+                 max_queue: int = 10000):
+        self.crypto_pay = crypto_pay
+        self.on_invoice_paid = on_invoice_paid
+        self.dedup_size = dedup_size
+        self.workers = workers
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._tasks: List[asyncio.Task] = []
+
+    def add_routes(self, web_app: web.Application, path: str = CRYPTO_PAY_WEBHOOK_PATH) -> None:
+        """Регистрирует маршрут webhook в приложении aiohttp"""
+        web_app.router.add_post(path, self.handle)
+
+    def start(self) -> None:
+        """Запускает воркеры обработки событий"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Дообрабатывает очередь (не дольше timeout) и останавливает воркеры"""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Crypto Pay webhook: не обработано событий: {self._queue.qsize()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _verify(self, body: bytes, signature: str) -> bool:
+        if len(body) <= INLINE_VERIFY_MAX_BYTES:
+            # HMAC небольшого тела занимает микросекунды
+            return self.crypto_pay.verify_webhook_signature(body, signature)
+        return await asyncio.to_thread(self.crypto_pay.verify_webhook_signature, body, signature)
+
+    def _is_duplicate(self, update_id: int) -> bool:
+        """Проверяет и запоминает update_id в ограниченном LRU"""
+        if update_id in self._seen:
+            self._seen.move_to_end(update_id)
+            return True
+        self._seen[update_id] = None
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+        return False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        signature = request.headers.get(SIGNATURE_HEADER, "")
+
+        if not await self._verify(body, signature):
+            logger.warning(f"Crypto Pay webhook: неверная подпись от {request.remote}")
+            return web.Response(status=401)
+
+        try:
+            update = json.loads(body)
+            update_id = int(update["update_id"])
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Crypto Pay webhook: некорректное тело запроса: {e}")
+            return web.Response(status=400)
+
+        if self._is_duplicate(update_id):
+            logger.info(f"Crypto Pay webhook: повтор update_id {update_id}")
+            return web.Response(text="ok")
+
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Забываем update_id, чтобы повторная доставка Crypto Pay была принята
+            self._seen.pop(update_id, None)
+            logger.error("Crypto Pay webhook: очередь переполнена")
+            return web.Response(status=503)
+
+        self.start()
+        return web.Response(text="ok")
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self._queue.get()
+            try:
+                await self._process(update)
+            except Exception as e:
+                logger.error(f"Crypto Pay webhook: ошибка обработки {update.get('update_id')}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, update: Dict) -> None:
+        update_type = update.get("update_type")
+        if update_type == "invoice_paid":
+            await self.on_invoice_paid(update.get("payload") or {})
+        else:
+            logger.info(f"Crypto Pay webhook: пропущено событие {update_type}")
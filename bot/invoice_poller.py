@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Invoice Poller
+Опрос статусов инвойсов Crypto Pay пачками через getInvoices, когда
+webhook недоступен
+"""
+
+import time
+import heapq
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from crypto_pay import MAX_INVOICES_PER_REQUEST, CryptoPayAPI
+
+logger = logging.getLogger(__name__)
+
+# Интервал опроса в зависимости от возраста инвойса: (возраст до, интервал), секунды
+DEFAULT_SCHEDULE: Tuple[Tuple[float, float], ...] = (
+    (5 * 60, 5.0),
+    (60 * 60, 30.0),
+    (24 * 60 * 60, 300.0),
+    (float("inf"), 900.0),
+)
+
+InvoiceHandler = Callable[[Dict], Awaitable[None]]
+
+
+class InvoicePoller:
+    """
+    Следит за открытыми инвойсами и опрашивает их одним запросом на пачку
+    до MAX_INVOICES_PER_REQUEST штук. Свежие инвойсы проверяются часто,
+    старые - все реже. Оплаченные и истекшие инвойсы передаются обработчикам
+    и перестают отслеживаться
+    """
+
+    def __init__(self,
+                 crypto_pay: CryptoPayAPI,
+                 on_invoice_paid: InvoiceHandler,
+                 on_invoice_expired: InvoiceHandler,
+                 batch_size: int = MAX_INVOICES_PER_REQUEST,
+                 max_tracked: int = 50000,
+                 schedule: Sequence[Tuple[float, float]] = DEFAULT_SCHEDULE,
+                 error_retry: float = 15.0):
+        self.crypto_pay = crypto_pay
+        self.on_invoice_paid = on_invoice_paid
+        self.on_invoice_expired = on_invoice_expired
+        self.batch_size = min(batch_size, MAX_INVOICES_PER_REQUEST)
+        self.max_tracked = max_tracked
+        self.schedule = tuple(schedule)
+        self.error_retry = error_retry
+        # invoice_id -> время создания (unix); порядок вставки = порядок вытеснения
+        self._tracked: "OrderedDict[int, float]" = OrderedDict()
+        # (время следующей проверки по monotonic, invoice_id); удаленные ID пропускаются
+        self._due: List[Tuple[float, int]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Статистика для мониторинга
+        self.requests = 0
+        self.errors = 0
+        self.paid = 0
+        self.expired = 0
+        self.evicted = 0
+
+    # --- Реестр ----------------------------------------------------------------
+
+    def interval_for(self, age: float) -> float:
+        """Интервал опроса для инвойса указанного возраста"""
+        for max_age, interval in self.schedule:
+            if age < max_age:
+                return interval
+        return self.schedule[-1][1]
+
+    def track(self, invoice_id: int, created_at: Optional[float] = None) -> None:
+        """Начинает отслеживать инвойс; created_at - unix-время создания"""
+        if invoice_id in self._tracked:
+            return
+        if created_at is None:
+            created_at = time.time()
+        self._tracked[invoice_id] = created_at
+        if len(self._tracked) > self.max_tracked:
+            evicted_id, _ = self._tracked.popitem(last=False)
+            self.evicted += 1
+            if self.evicted % 1000 == 1:
+                logger.warning(
+                    f"Опрос инвойсов: превышен лимит {self.max_tracked}, самые старые инвойсы "
+                    f"больше не отслеживаются (последний {evicted_id}, всего {self.evicted})"
+                )
+
+        self._schedule(invoice_id, time.monotonic(), created_at)
+        self._compact()
+        self._wakeup.set()
+
+    def forget(self, invoice_id: int) -> None:
+        """Прекращает отслеживать инвойс (например, оплата пришла через webhook)"""
+        self._tracked.pop(invoice_id, None)
+
+    @property
+    def tracked(self) -> int:
+        return len(self._tracked)
+
+    def stats(self) -> Dict[str, int]:
+        """Показатели для мониторинга"""
+        return {
+            "tracked": len(self._tracked),
+            "requests": self.requests,
+            "errors": self.errors,
+            "paid": self.paid,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+    def _schedule(self, invoice_id: int, now: float, created_at: float, delay: Optional[float] = None) -> None:
+        if delay is None:
+            delay = self.interval_for(time.time() - created_at)
+        heapq.heappush(self._due, (now + delay, invoice_id))
+
+    def _compact(self) -> None:
+        """Убирает из расписания забытые инвойсы, чтобы куча не росла без предела"""
+        if len(self._due) > 2 * len(self._tracked) + 1024:
+            self._due = [entry for entry in self._due if entry[1] in self._tracked]
+            heapq.heapify(self._due)
+
+    def _pop_due(self, now: float) -> List[int]:
+        """Забирает из расписания до batch_size инвойсов, которые пора проверить"""
+        batch = []
+        while self._due and self._due[0][0] <= now and len(batch) < self.batch_size:
+            _, invoice_id = heapq.heappop(self._due)
+            if invoice_id in self._tracked:
+                batch.append(invoice_id)
+        return batch
+
+    # --- Опрос -----------------------------------------------------------------
+
+    def start(self) -> None:
+        """Запускает фоновый опрос (нужен работающий event loop)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает опрос; реестр сохраняется"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            batch = self._pop_due(now)
+            if batch:
+                await self.poll_batch(batch)
+                continue
+
+            # Спим до ближайшей проверки или до появления нового инвойса
+            self._wakeup.clear()
+            timeout = self._due[0][0] - now if self._due else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def poll_batch(self, invoice_ids: List[int]) -> None:
+        """Запрашивает статусы пачки инвойсов одним вызовом getInvoices"""
+        self.requests += 1
+        try:
+            invoices = await self.crypto_pay.get_invoices(invoice_ids=invoice_ids)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Опрос инвойсов: ошибка getInvoices для {len(invoice_ids)} инвойсов: {e}")
+            now = time.monotonic()
+            for invoice_id in invoice_ids:
+                if invoice_id in self._tracked:
+                    self._schedule(invoice_id, now, self._tracked[invoice_id], self.error_retry)
+            return
+
+        by_id = {int(invoice["invoice_id"]): invoice for invoice in invoices}
+        now = time.monotonic()
+        for invoice_id in invoice_ids:
+            invoice = by_id.get(invoice_id)
+            status = invoice.get("status") if invoice else None
+
+            if status == "paid":
+                self.forget(invoice_id)
+                self.paid += 1
+                await self._emit(self.on_invoice_paid, invoice)
+            elif status == "expired":
+                self.forget(invoice_id)
+                self.expired += 1
+                await self._emit(self.on_invoice_expired, invoice)
+            elif invoice is None:
+                # Инвойс удален или принадлежит другому приложению
+                logger.warning(f"Опрос инвойсов: инвойс {invoice_id} не найден, отслеживание прекращено")
+                self.forget(invoice_id)
+            elif invoice_id in self._tracked:
+                self._schedule(invoice_id, now, self._tracked[invoice_id])
+
+    async def _emit(self, handler: InvoiceHandler, invoice: Dict) -> None:
+        try:
+            await handler(invoice)
+        except Exception as e:
+            logger.error(f"Опрос инвойсов: ошибка обработки инвойса {invoice.get('invoice_id')}: {e}")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Log Setup
+Неблокирующее логирование: записи кладутся в очередь, а форматирование
+и вывод выполняет фоновый поток. Модуль не зависит от остального бота,
+его использует и currency_api_server.py
+"""
+
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Логгер для сырых данных от пользователей (WebApp payload и т.п.)
+PAYLOAD_LOGGER = "payload"
+
+# Стандартные поля LogRecord; все остальное попало в запись через extra=
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler, который никогда не ждет: если в очереди уже max_size
+    записей, новая запись отбрасывается и учитывается в dropped
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, max_size: int):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Подставляем аргументы сразу (они могут измениться позже), а дорогое
+        # форматирование строки оставляем фоновому потоку.
+        # Копия без LogRecord.__init__ - он заметно дороже
+        copied = logging.LogRecord.__new__(logging.LogRecord)
+        copied.__dict__.update(record.__dict__)
+        record = copied
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Трассировка не должна держать кадры стека до записи
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # SimpleQueue без блокировок Condition; предел проверяется приблизительно
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись; поля из extra= попадают в объект как есть"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает примерно долю rate записей"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+def setup_logging(level: str = "INFO",
+                  log_format: str = "text",
+                  payload_sample_rate: float = 0.0,
+                  queue_size: int = 10000) -> NonBlockingQueueHandler:
+    """
+    Настраивает корневой логгер: обработчик кладет записи в очередь, фоновый
+    поток пишет их в stderr. payload_sample_rate - доля сырых данных от
+    пользователей, которая попадает в лог (0 - только при level=DEBUG)
+    """
+    global _listener
+    stop_logging()
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if log_format == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = NonBlockingQueueHandler(log_queue, queue_size)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    payload_logger = logging.getLogger(PAYLOAD_LOGGER)
+    for log_filter in list(payload_logger.filters):
+        payload_logger.removeFilter(log_filter)
+    if payload_sample_rate > 0:
+        payload_logger.setLevel(logging.DEBUG)
+        payload_logger.addFilter(SamplingFilter(payload_sample_rate))
+    else:
+        payload_logger.setLevel(logging.NOTSET)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    return queue_handler
+
+
+def stop_logging() -> None:
+    """Дописывает оставшиеся записи и останавливает фоновый поток"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Message Dispatcher
+Очередь исходящих сообщений с учетом лимитов Telegram Bot API
+"""
+
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Tuple, Union
+
+from telegram import Bot
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньше - раньше
+PRIORITY_USER = 0
+PRIORITY_ADMIN = 1
+
+ChatId = Union[int, str]
+
+
+class OutboundMessage:
+    """Исходящий вызов Bot API в очереди"""
+
+    __slots__ = ("priority", "seq", "chat_id", "call", "future", "enqueued_at", "attempts")
+
+    def __init__(self, priority: int, seq: int, chat_id: ChatId,
+                 call: Callable[[], Awaitable[Any]], future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.call = call
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+    def __lt__(self, other: "OutboundMessage") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class MessageDispatcher:
+    """
+    Отправляет сообщения из приоритетной очереди несколькими воркерами.
+    Соблюдает глобальный лимит и лимиты на каждый чат, при RetryAfter
+    откладывает сообщение, не блокируя остальные чаты.
+
+    В один чат сообщения уходят строго по порядку постановки: в приоритетной
+    очереди, в ожидании лимита или повтора и в отправке находится не больше
+    одного сообщения чата, остальные ждут за ним в очереди чата
+    """
+
+    def __init__(self,
+                 bot: Bot,
+                 workers: int = 8,
+                 global_rate: float = 30.0,
+                 private_chat_rate: float = 1.0,
+                 private_chat_burst: float = 3.0,
+                 group_chat_rate: float = 20 / 60,
+                 group_chat_burst: float = 3.0,
+                 max_attempts: int = 3,
+                 cleanup_interval: float = 60.0):
+        self.bot = bot
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.cleanup_interval = cleanup_interval
+        self._private_limits = (private_chat_rate, private_chat_burst)
+        self._group_limits = (group_chat_rate, group_chat_burst)
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self._heap: List[OutboundMessage] = []
+        self._ready = asyncio.Event()
+        self._seq = itertools.count()
+        self._tasks: List[asyncio.Task] = []
+        # Очереди чатов: сообщения за головным, который в _heap, _delayed или
+        # отправляется. Ключ есть, пока у чата есть головное сообщение
+        self._chat_queues: Dict[str, Deque[OutboundMessage]] = {}
+        self._waiting = 0
+        self._delayed: Dict[int, Tuple[asyncio.TimerHandle, OutboundMessage]] = {}
+        self._in_flight = 0
+        self._last_cleanup = time.monotonic()
+
+        # Статистика для мониторинга
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.last_latency = 0.0
+        self._latency_total = 0.0
+
+    # --- Публичный интерфейс -------------------------------------------------
+
+    def start(self) -> None:
+        """Запускает воркеры (нужен работающий event loop)"""
+        if self._tasks:
+            return
+        self._ready = asyncio.Event()
+        if self._heap:
+            self._ready.set()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Дожидается отправки очереди (не дольше timeout) и останавливает воркеры"""
+        deadline = time.monotonic() + timeout
+        while (self._heap or self._delayed or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        # Отложенные сообщения остаются головными в своих чатах до следующего start()
+        for handle, message in self._delayed.values():
+            handle.cancel()
+            heapq.heappush(self._heap, message)
+        self._delayed.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self.queue_depth:
+            logger.warning(f"Остановка диспетчера: не отправлено сообщений: {self.queue_depth}")
+
+    def submit(self, chat_id: ChatId, call: Callable[[], Awaitable[Any]],
+               priority: int = PRIORITY_USER) -> asyncio.Future:
+        """Ставит произвольный вызов Bot API для чата в очередь"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        # Результат нужен не всем отправителям - не шумим "exception never retrieved"
+        future.add_done_callback(_consume_exception)
+        message = OutboundMessage(priority, next(self._seq), chat_id, call, future)
+        queue = self._chat_queues.get(str(chat_id))
+        if queue is None:
+            self._chat_queues[str(chat_id)] = deque()
+            self._push(message)
+        else:
+            queue.append(message)
+            self._waiting += 1
+        return future
+
+    def send(self, chat_id: ChatId, text: str, priority: int = PRIORITY_USER, **kwargs) -> asyncio.Future:
+        """Ставит send_message в очередь и сразу возвращает future с результатом"""
+        return self.submit(
+            chat_id,
+            lambda: self.bot.send_message(chat_id=chat_id, text=text, **kwargs),
+            priority
+        )
+
+    def fan_out(self, chat_ids: Iterable[ChatId], text: str,
+                priority: int = PRIORITY_ADMIN, **kwargs) -> List[asyncio.Future]:
+        """Рассылает одно сообщение в несколько чатов параллельно"""
+        return [self.send(chat_id, text, priority, **kwargs) for chat_id in chat_ids]
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._heap) + len(self._delayed) + self._waiting
+
+    def stats(self) -> Dict[str, float]:
+        """Показатели для мониторинга"""
+        completed = self.sent + self.failed
+        return {
+            "queue_depth": self.queue_depth,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "last_latency": self.last_latency,
+            "avg_latency": self._latency_total / completed if completed else 0.0,
+        }
+
+    # --- Очередь ---------------------------------------------------------------
+
+    def _push(self, message: OutboundMessage) -> None:
+        heapq.heappush(self._heap, message)
+        self._ready.set()
+
+    def _push_later(self, message: OutboundMessage, delay: float) -> None:
+        """Возвращает сообщение в очередь через delay секунд"""
+        def requeue():
+            self._delayed.pop(message.seq, None)
+            self._push(message)
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._delayed[message.seq] = (handle, message)
+
+    def _next_in_chat(self, message: OutboundMessage) -> None:
+        """Сообщение отправлено или отброшено: в очередь идет следующее сообщение чата"""
+        key = str(message.chat_id)
+        queue = self._chat_queues.get(key)
+        if queue:
+            self._waiting -= 1
+            self._push(queue.popleft())
+        else:
+            self._chat_queues.pop(key, None)
+
+    async def _next_message(self) -> OutboundMessage:
+        while not self._heap:
+            self._ready.clear()
+            await self._ready.wait()
+        return heapq.heappop(self._heap)
+
+    def _chat_bucket(self, chat_id: ChatId, now: float) -> TokenBucket:
+        # ID чата из .env приходит строкой, из Update - числом
+        key = str(chat_id)
+        bucket = self._chat_buckets.get(key)
+        if bucket is None:
+            rate, burst = self._group_limits if key.startswith("-") else self._private_limits
+            bucket = TokenBucket(rate, burst, now)
+            self._chat_buckets[key] = bucket
+        return bucket
+
+    def _cleanup_buckets(self, now: float) -> None:
+        """Удаляет полные корзины: они не отличаются от новых"""
+        if now - self._last_cleanup < self.cleanup_interval:
+            return
+        self._last_cleanup = now
+        idle = [key for key, bucket in self._chat_buckets.items() if bucket.is_full(now)]
+        for key in idle:
+            del self._chat_buckets[key]
+
+    # --- Отправка --------------------------------------------------------------
+
+    async def _worker(self) -> None:
+        while True:
+            message = await self._next_message()
+            self._in_flight += 1
+            try:
+                await self._process(message)
+            except asyncio.CancelledError:
+                # stop() по тайм-ауту: сообщение остается головным в своем чате
+                heapq.heappush(self._heap, message)
+                raise
+            finally:
+                self._in_flight -= 1
+
+    async def _process(self, message: OutboundMessage) -> None:
+        now = time.monotonic()
+
+        # Лимит чата: сообщение ждет отдельно и не держит воркер; остальные
+        # сообщения чата ждут за ним. Других отправителей у чата нет, поэтому
+        # токен можно брать сразу
+        chat_bucket = self._chat_bucket(message.chat_id, now)
+        if not chat_bucket.try_acquire(now):
+            self._push_later(message, chat_bucket.delay(now))
+            return
+
+        # Глобальный лимит: воркер ждет свой токен
+        while not self._global_bucket.try_acquire():
+            await asyncio.sleep(self._global_bucket.delay())
+
+        await self._deliver(message)
+        self._cleanup_buckets(time.monotonic())
+
+    async def _deliver(self, message: OutboundMessage) -> None:
+        message.attempts += 1
+        try:
+            result = await message.call()
+        except RetryAfter as e:
+            retry_after = float(e.retry_after)
+            logger.warning(f"Flood limit для чата {message.chat_id}: повтор через {retry_after} с")
+            # Останавливаем отправку в этот чат до окончания паузы
+            bucket = self._chat_bucket(message.chat_id, time.monotonic())
+            bucket.tokens = -retry_after * bucket.rate
+            self.retried += 1
+            self._push_later(message, retry_after)
+            return
+        except BadRequest as e:
+            self._fail(message, e)
+            return
+        except NetworkError as e:
+            if message.attempts < self.max_attempts:
+                self.retried += 1
+                self._push_later(message, 0.5 * 2 ** (message.attempts - 1))
+                return
+            self._fail(message, e)
+            return
+        except Exception as e:
+            self._fail(message, e)
+            return
+
+        latency = time.monotonic() - message.enqueued_at
+        self.sent += 1
+        self.last_latency = latency
+        self._latency_total += latency
+        if not message.future.done():
+            message.future.set_result(result)
+        self._next_in_chat(message)
+
+    def _fail(self, message: OutboundMessage, error: Exception) -> None:
+        logger.error(f"Не удалось отправить сообщение в чат {message.chat_id}: {error}")
+        self.failed += 1
+        self._latency_total += time.monotonic() - message.enqueued_at
+        if not message.future.done():
+            message.future.set_exception(error)
+        self._next_in_chat(message)
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
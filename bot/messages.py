@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Messages
+Тексты сообщений бота по локалям (HTML, поля - {name})
+"""
+
+DEFAULT_LOCALE = "ru"
+
+MESSAGES = {
+    "ru": {
+        # --- Команды ---------------------------------------------------------
+        "welcome": (
+            "Привет, {first_name}! 👋\n\n"
+            "💰 Быстрое пополнение через криптовалюту!\n\n"
+            "📝 Просто укажи сумму - мы конвертируем в USDT\n"
+            "🔐 Способ оплаты: Криптовалюта\n"
+            "⚡ После заявки с тобой свяжется оператор\n\n"
+            "👇 Нажми кнопку для оформления:"
+        ),
+        "welcome_no_webapp": "\n⚠️ WebApp не настроен, обратитесь к администратору.",
+        "webapp_button": "💰 Оформить пополнение",
+        "help": (
+            "🤖 <b>Команды бота:</b>\n\n"
+            "/start - Начать работу с ботом\n"
+            "/help - Показать эту справку\n"
+            "/cancel - Отменить текущую операцию\n"
+            "/admin - Информация для администратора\n"
+            "/setrate - Изменить курс USDT (только админ)\n"
+            "/setcommission - Изменить комиссию (только админ)\n"
+            "/stats - Статистика заказов (только админ)\n\n"
+            "💡 <b>Как оформить заказ:</b>\n"
+            "1. Нажми кнопку 'Оформить пополнение'\n"
+            "2. Укажи логин и сумму в рублях\n"
+            "3. Система покажет сумму к оплате с комиссией {commission_percent}%\n"
+            "4. Подтверди заказ\n"
+            "5. Ожидай принятия заказа оператором\n"
+            "6. После принятия - получишь реквизиты для оплаты\n"
+            "7. После оплаты заказ будет завершен\n\n"
+            "💰 <b>Способ оплаты:</b> Криптовалюта (USDT)\n"
+            "💱 <b>Текущий курс:</b> 1 USDT = {usdt_rate} РУБ\n"
+            "📈 <b>Комиссия:</b> {commission_percent}%\n"
+            "💵 <b>Минимальная сумма:</b> 100 РУБ"
+        ),
+        "cancel": (
+            "❌ Операция отменена.\n"
+            "Для создания новой заявки используй команду /start"
+        ),
+        "admin_info": (
+            "👤 <b>Информация о пользователе:</b>\n"
+            "User ID: <code>{user_id}</code>\n"
+            "Username: @{username}\n"
+            "Имя: {full_name}\n\n"
+            "💬 <b>Информация о чате:</b>\n"
+            "Chat ID: <code>{chat_id}</code>\n"
+            "Тип чата: {chat_type}"
+        ),
+        "username_missing": "не указан",
+        "admin_only": "❌ Эта команда доступна только администратору.",
+        "rate_current": (
+            "💱 <b>Текущий курс USDT:</b> 1 USDT = {usdt_rate} РУБ\n"
+            "📈 <b>Комиссия:</b> {commission_percent}%\n\n"
+            "Для изменения курса используйте:\n"
+            "<code>/setrate 95.5</code>"
+        ),
+        "rate_updated": (
+            "✅ <b>Курс USDT обновлен!</b>\n\n"
+            "📉 Старый курс: 1 USDT = {old_rate} РУБ\n"
+            "📈 Новый курс: 1 USDT = {usdt_rate} РУБ\n\n"
+            "💡 Изменения применятся для новых заявок."
+        ),
+        "rate_invalid": (
+            "❌ Неверный формат курса.\n"
+            "Используйте: <code>/setrate 95.5</code>"
+        ),
+        "commission_current": (
+            "💰 <b>Текущая комиссия:</b> {commission_percent}%\n"
+            "💱 <b>Курс USDT:</b> 1 USDT = {usdt_rate} РУБ\n\n"
+            "Для изменения комиссии используйте:\n"
+            "<code>/setcommission 15</code>\n"
+            "<code>/setcommission 12.5</code>"
+        ),
+        "commission_updated": (
+            "✅ <b>Комиссия обновлена!</b>\n\n"
+            "📉 Старая комиссия: {old_commission}%\n"
+            "📈 Новая комиссия: {commission_percent}%\n\n"
+            "🔄 Изменения применяются ко всем новым заказам"
+        ),
+        "commission_invalid": (
+            "❌ Неверный формат комиссии.\n"
+            "Используйте числа от 0 до 100: <code>/setcommission 15</code>"
+        ),
+        "stats_header": "📊 <b>Статистика заказов</b>\nСчетчики ведутся с {started_at}",
+        "stats_window": (
+            "\n\n<b>{window}:</b>\n"
+            "🆕 Заказов: {created} на {created_rub} РУБ ({created_usdt} USDT)\n"
+            "✅ Принято: {accepted}, ❌ отклонено: {rejected}, доля принятых: {acceptance_rate}\n"
+            "⏱ Среднее время до принятия: {avg_accept}\n"
+            "💰 Оплачено: {paid} на {paid_rub} РУБ ({paid_usdt} USDT)\n"
+            "⌛ Истекло счетов: {expired}"
+        ),
+        "stats_window_1h": "За час",
+        "stats_window_24h": "За сутки",
+        "stats_window_7d": "За неделю",
+        "stats_window_total": "С запуска",
+        "stats_no_value": "—",
+        "throttled": "⏳ Слишком много запросов, попробуйте через несколько секунд.",
+        "unknown_message": (
+            "🤔 Я не понимаю это сообщение.\n"
+            "Воспользуйтесь командой /help для получения справки."
+        ),
+
+        # --- Оформление заказа -----------------------------------------------
+        "login_empty": "❌ Логин не может быть пустым. Попробуйте еще раз.",
+        "amount_invalid": "❌ {error}",
+        "webapp_parse_error": "❌ Ошибка обработки данных. Попробуйте еще раз.",
+        "unexpected_error": "❌ Упс, что-то пошло не так. Попробуйте еще раз или обратитесь к администратору.",
+        "order_pending": (
+            "🔄 <b>Заявка в обработке</b>\n\n"
+            "👤 Логин: <code>{login}</code>\n"
+            "💰 Сумма: {base_amount} РУБ\n"
+            "💳 К оплате: <b>{total_rub} РУБ</b> (с комиссией {commission_percent}%)\n"
+            "💎 Эквивалент: <b>{total_usdt} USDT</b>\n\n"
+            "⏳ <b>Ваша заявка рассматривается</b>\n"
+            "📱 Ожидайте подтверждения от оператора\n\n"
+            "🕐 Время обработки: до 30 минут"
+        ),
+        "admin_order": (
+            "🔔 <b>НОВЫЙ ЗАКАЗ НА ПОПОЛНЕНИЕ #{order_id}</b>\n\n"
+            "⏰ Время: {created_at}\n"
+            "👤 Пользователь: {full_name} (@{username})\n"
+            "🆔 User ID: <code>{user_id}</code>\n"
+            "💬 Chat ID: <code>{chat_id}</code>\n\n"
+            "📋 <b>Данные заказа:</b>\n"
+            "👤 Логин: <code>{login}</code>\n"
+            "💰 Исходная сумма: {base_amount} РУБ\n"
+            "💳 К оплате: <b>{total_rub} РУБ</b> (комиссия {commission_percent}%)\n"
+            "💎 Эквивалент: <b>{total_usdt} USDT</b>\n"
+            "💱 Курс: 1 USDT = {usdt_rate} РУБ"
+        ),
+        "admin_order_no_username": "без username",
+        "admin_order_payload": (
+            "\n\n📊 <b>Техническая информация:</b>\n"
+            "<code>{payload}</code>"
+        ),
+        "button_accept": "✅ Принять заказ",
+        "button_reject": "❌ Отклонить",
+        "button_paid": "💰 Оплачено",
+
+        # --- Обработка заказа администратором --------------------------------
+        "order_already_processed": "Заказ уже обработан или не найден",
+        "order_accepted_pay": (
+            "✅ <b>Заказ принят!</b>\n\n"
+            "👤 Логин: <code>{login}</code>\n"
+            "💳 К оплате: {total_rub} РУБ\n\n"
+            "💎 <a href=\"{pay_url}\">Оплатить счет в Crypto Bot</a>\n\n"
+            "⏳ Заказ завершится автоматически после оплаты"
+        ),
+        "order_accepted_manual": (
+            "✅ <b>Заказ принят!</b>\n\n"
+            "👤 Логин: <code>{login}</code>\n"
+            "💳 К оплате: {total_rub} РУБ\n\n"
+            "🔐 <b>С вами свяжется оператор</b>\n"
+            "💎 Он предоставит реквизиты для оплаты через криптовалюту\n\n"
+            "⏳ Ожидайте связи в ближайшее время"
+        ),
+        "order_completed": (
+            "🎉 <b>Платеж подтвержден!</b>\n\n"
+            "👤 Логин: <code>{login}</code>\n"
+            "💳 Оплачено: {total_rub} РУБ\n\n"
+            "✅ <b>Заказ выполнен успешно!</b>\n"
+            "💡 Спасибо за использование нашего сервиса!\n"
+            "❓ Если возникли вопросы, обращайтесь к администратору."
+        ),
+        "order_rejected": (
+            "❌ <b>Заказ отклонен</b>\n\n"
+            "👤 Логин: <code>{login}</code>\n"
+            "💳 Сумма: {total_rub} РУБ\n\n"
+            "😔 К сожалению, ваш заказ не может быть обработан.\n"
+            "📞 Если у вас есть вопросы, обратитесь к администратору.\n\n"
+            "🔄 Вы можете попробовать создать новый заказ через /start"
+        ),
+        "order_expired": (
+            "⌛ <b>Срок оплаты истек</b>\n\n"
+            "👤 Логин: <code>{login}</code>\n"
+            "💳 Сумма: {total_rub} РУБ\n\n"
+            "Счет больше не действителен. Если вы уже оплатили, обратитесь к администратору.\n"
+            "🔄 Новый заказ можно создать через /start"
+        ),
+        "admin_status_accepted": "\n\n✅ <b>СТАТУС: ЗАКАЗ ПРИНЯТ</b>\n💡 Ожидается оплата",
+        "admin_status_paid": "\n\n💰 <b>СТАТУС: ОПЛАЧЕНО И ВЫПОЛНЕНО</b>",
+        "admin_status_rejected": "\n\n❌ <b>СТАТУС: ЗАКАЗ ОТКЛОНЕН</b>",
+        "admin_error_accept": "\n\n❌ <b>ОШИБКА при принятии заказа</b>",
+        "admin_error_paid": "\n\n❌ <b>ОШИБКА при завершении заказа</b>",
+        "admin_error_reject": "\n\n❌ <b>ОШИБКА при отклонении заказа</b>",
+        "admin_invoice_paid": (
+            "💰 <b>Заказ #{order_id} оплачен через Crypto Pay</b>\n\n"
+            "👤 Логин: <code>{login}</code>\n"
+            "💳 Сумма: {total_rub} РУБ\n"
+            "💎 Получено: {paid_amount} {paid_asset}"
+        ),
+        "admin_invoice_expired": (
+            "⌛ <b>Заказ #{order_id}: счет Crypto Pay истек</b>\n\n"
+            "👤 Логин: <code>{login}</code>\n"
+            "💳 Сумма: {total_rub} РУБ"
+        ),
+        "invoice_description": "Пополнение: заказ #{order_id}",
+    },
+
+    "en": {
+        # --- Commands --------------------------------------------------------
+        "welcome": (
+            "Hi, {first_name}! 👋\n\n"
+            "💰 Fast top-up with cryptocurrency!\n\n"
+            "📝 Just enter the amount - we convert it to USDT\n"
+            "🔐 Payment method: cryptocurrency\n"
+            "⚡ An operator will contact you after you submit a request\n\n"
+            "👇 Tap the button to place an order:"
+        ),
+        "welcome_no_webapp": "\n⚠️ The WebApp is not configured, please contact the administrator.",
+        "webapp_button": "💰 Top up",
+        "help": (
+            "🤖 <b>Bot commands:</b>\n\n"
+            "/start - Start working with the bot\n"
+            "/help - Show this help\n"
+            "/cancel - Cancel the current operation\n"
+            "/admin - Information for the administrator\n"
+            "/setrate - Change the USDT rate (admin only)\n"
+            "/setcommission - Change the commission (admin only)\n"
+            "/stats - Order statistics (admin only)\n\n"
+            "💡 <b>How to place an order:</b>\n"
+            "1. Tap the 'Top up' button\n"
+            "2. Enter your login and the amount in rubles\n"
+            "3. You will see the amount to pay including the {commission_percent}% commission\n"
+            "4. Confirm the order\n"
+            "5. Wait for an operator to accept the order\n"
+            "6. Once accepted, you will receive payment details\n"
+            "7. The order is completed after payment\n\n"
+            "💰 <b>Payment method:</b> cryptocurrency (USDT)\n"
+            "💱 <b>Current rate:</b> 1 USDT = {usdt_rate} RUB\n"
+            "📈 <b>Commission:</b> {commission_percent}%\n"
+            "💵 <b>Minimum amount:</b> 100 RUB"
+        ),
+        "cancel": (
+            "❌ Operation cancelled.\n"
+            "Use /start to create a new request"
+        ),
+        "admin_info": (
+            "👤 <b>User information:</b>\n"
+            "User ID: <code>{user_id}</code>\n"
+            "Username: @{username}\n"
+            "Name: {full_name}\n\n"
+            "💬 <b>Chat information:</b>\n"
+            "Chat ID: <code>{chat_id}</code>\n"
+            "Chat type: {chat_type}"
+        ),
+        "username_missing": "not set",
+        "admin_only": "❌ This command is available to the administrator only.",
+        "rate_current": (
+            "💱 <b>Current USDT rate:</b> 1 USDT = {usdt_rate} RUB\n"
+            "📈 <b>Commission:</b> {commission_percent}%\n\n"
+            "To change the rate use:\n"
+            "<code>/setrate 95.5</code>"
+        ),
+        "rate_updated": (
+            "✅ <b>USDT rate updated!</b>\n\n"
+            "📉 Old rate: 1 USDT = {old_rate} RUB\n"
+            "📈 New rate: 1 USDT = {usdt_rate} RUB\n\n"
+            "💡 The change applies to new requests."
+        ),
+        "rate_invalid": (
+            "❌ Invalid rate format.\n"
+            "Use: <code>/setrate 95.5</code>"
+        ),
+        "commission_current": (
+            "💰 <b>Current commission:</b> {commission_percent}%\n"
+            "💱 <b>USDT rate:</b> 1 USDT = {usdt_rate} RUB\n\n"
+            "To change the commission use:\n"
+            "<code>/setcommission 15</code>\n"
+            "<code>/setcommission 12.5</code>"
+        ),
+        "commission_updated": (
+            "✅ <b>Commission updated!</b>\n\n"
+            "📉 Old commission: {old_commission}%\n"
+            "📈 New commission: {commission_percent}%\n\n"
+            "🔄 The change applies to all new orders"
+        ),
+        "commission_invalid": (
+            "❌ Invalid commission format.\n"
+            "Use a number from 0 to 100: <code>/setcommission 15</code>"
+        ),
+        "stats_header": "📊 <b>Order statistics</b>\nCounting since {started_at}",
+        "stats_window": (
+            "\n\n<b>{window}:</b>\n"
+            "🆕 Orders: {created} for {created_rub} RUB ({created_usdt} USDT)\n"
+            "✅ Accepted: {accepted}, ❌ rejected: {rejected}, acceptance rate: {acceptance_rate}\n"
+            "⏱ Average time to accept: {avg_accept}\n"
+            "💰 Paid: {paid} for {paid_rub} RUB ({paid_usdt} USDT)\n"
+            "⌛ Expired invoices: {expired}"
+        ),
+        "stats_window_1h": "Last hour",
+        "stats_window_24h": "Last 24 hours",
+        "stats_window_7d": "Last 7 days",
+        "stats_window_total": "Since start",
+        "throttled": "⏳ Too many requests, please try again in a few seconds.",
+        "unknown_message": (
+            "🤔 I don't understand this message.\n"
+            "Use /help to see the available commands."
+        ),
+
+        # --- Placing an order ------------------------------------------------
+        "login_empty": "❌ Login cannot be empty. Please try again.",
+        "webapp_parse_error": "❌ Failed to process the data. Please try again.",
+        "unexpected_error": "❌ Oops, something went wrong. Please try again or contact the administrator.",
+        "order_pending": (
+            "🔄 <b>Request is being processed</b>\n\n"
+            "👤 Login: <code>{login}</code>\n"
+            "💰 Amount: {base_amount} RUB\n"
+            "💳 To pay: <b>{total_rub} RUB</b> (including {commission_percent}% commission)\n"
+            "💎 Equivalent: <b>{total_usdt} USDT</b>\n\n"
+            "⏳ <b>Your request is under review</b>\n"
+            "📱 Please wait for the operator to confirm it\n\n"
+            "🕐 Processing time: up to 30 minutes"
+        ),
+        "admin_order": (
+            "🔔 <b>NEW TOP-UP ORDER #{order_id}</b>\n\n"
+            "⏰ Time: {created_at}\n"
+            "👤 User: {full_name} (@{username})\n"
+            "🆔 User ID: <code>{user_id}</code>\n"
+            "💬 Chat ID: <code>{chat_id}</code>\n\n"
+            "📋 <b>Order details:</b>\n"
+            "👤 Login: <code>{login}</code>\n"
+            "💰 Base amount: {base_amount} RUB\n"
+            "💳 To pay: <b>{total_rub} RUB</b> (commission {commission_percent}%)\n"
+            "💎 Equivalent: <b>{total_usdt} USDT</b>\n"
+            "💱 Rate: 1 USDT = {usdt_rate} RUB"
+        ),
+        "admin_order_no_username": "no username",
+        "admin_order_payload": (
+            "\n\n📊 <b>Technical information:</b>\n"
+            "<code>{payload}</code>"
+        ),
+        "button_accept": "✅ Accept order",
+        "button_reject": "❌ Reject",
+        "button_paid": "💰 Paid",
+
+        # --- Order processing by the administrator ---------------------------
+        "order_already_processed": "The order has already been processed or was not found",
+        "order_accepted_pay": (
+            "✅ <b>Order accepted!</b>\n\n"
+            "👤 Login: <code>{login}</code>\n"
+            "💳 To pay: {total_rub} RUB\n\n"
+            "💎 <a href=\"{pay_url}\">Pay the invoice in Crypto Bot</a>\n\n"
+            "⏳ The order completes automatically after payment"
+        ),
+        "order_accepted_manual": (
+            "✅ <b>Order accepted!</b>\n\n"
+            "👤 Login: <code>{login}</code>\n"
+            "💳 To pay: {total_rub} RUB\n\n"
+            "🔐 <b>An operator will contact you</b>\n"
+            "💎 They will provide the cryptocurrency payment details\n\n"
+            "⏳ Expect to be contacted shortly"
+        ),
+        "order_completed": (
+            "🎉 <b>Payment confirmed!</b>\n\n"
+            "👤 Login: <code>{login}</code>\n"
+            "💳 Paid: {total_rub} RUB\n\n"
+            "✅ <b>Order completed successfully!</b>\n"
+            "💡 Thank you for using our service!\n"
+            "❓ If you have any questions, contact the administrator."
+        ),
+        "order_rejected": (
+            "❌ <b>Order rejected</b>\n\n"
+            "👤 Login: <code>{login}</code>\n"
+            "💳 Amount: {total_rub} RUB\n\n"
+            "😔 Unfortunately, your order cannot be processed.\n"
+            "📞 If you have any questions, contact the administrator.\n\n"
+            "🔄 You can create a new order with /start"
+        ),
+        "order_expired": (
+            "⌛ <b>Payment time has expired</b>\n\n"
+            "👤 Login: <code>{login}</code>\n"
+            "💳 Amount: {total_rub} RUB\n\n"
+            "The invoice is no longer valid. If you have already paid, contact the administrator.\n"
+            "🔄 You can create a new order with /start"
+        ),
+        "admin_status_accepted": "\n\n✅ <b>STATUS: ORDER ACCEPTED</b>\n💡 Awaiting payment",
+        "admin_status_paid": "\n\n💰 <b>STATUS: PAID AND COMPLETED</b>",
+        "admin_status_rejected": "\n\n❌ <b>STATUS: ORDER REJECTED</b>",
+        "admin_error_accept": "\n\n❌ <b>ERROR while accepting the order</b>",
+        "admin_error_paid": "\n\n❌ <b>ERROR while completing the order</b>",
+        "admin_error_reject": "\n\n❌ <b>ERROR while rejecting the order</b>",
+        "admin_invoice_paid": (
+            "💰 <b>Order #{order_id} paid via Crypto Pay</b>\n\n"
+            "👤 Login: <code>{login}</code>\n"
+            "💳 Amount: {total_rub} RUB\n"
+            "💎 Received: {paid_amount} {paid_asset}"
+        ),
+        "admin_invoice_expired": (
+            "⌛ <b>Order #{order_id}: Crypto Pay invoice expired</b>\n\n"
+            "👤 Login: <code>{login}</code>\n"
+            "💳 Amount: {total_rub} RUB"
+        ),
+        "invoice_description": "Top-up: order #{order_id}",
+    },
+}
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Metrics
+Счетчики и гистограммы в памяти процесса с выдачей в текстовом формате
+Prometheus. Модуль не зависит от остального бота, его импортирует и
+currency_api_server.py
+"""
+
+import time
+import functools
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from aiohttp import web
+
+# Границы бакетов задержки по умолчанию (секунды)
+DEFAULT_LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Монотонный счетчик; значения меток передаются кортежем"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0.0)
+
+    def collect(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self._values.items()
+        ]
+
+
+class _HistogramSeries:
+    """Счетчики одной серии гистограммы: по бакету, сумма и количество"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными бакетами. observe() только увеличивает
+    счетчик бакета, накопленные суммы считаются при выдаче метрик
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.bounds = tuple(sorted(buckets))
+        self._series: Dict[Labels, _HistogramSeries] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _HistogramSeries(len(self.bounds) + 1)
+        # Бакет le включает границу: первая граница >= value
+        series.counts[bisect_left(self.bounds, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    def count(self, labels: Labels = ()) -> int:
+        series = self._series.get(labels)
+        return series.count if series else 0
+
+    def collect(self) -> List[str]:
+        lines = []
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), series.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series.sum)}")
+            lines.append(f"{self.name}_count{label_text} {series.count}")
+        return lines
+
+
+class CallbackGauge:
+    """Gauge, значения которого вычисляются только при выдаче метрик"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Any],
+                 labelnames: Sequence[str] = ()):
+        """callback возвращает число или, при наличии меток, словарь {кортеж меток: число}"""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def collect(self) -> List[str]:
+        value = self.callback()
+        if value is None:
+            return []
+        if not self.labelnames:
+            return [f"{self.name} {_format_value(value)}"]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(item)}"
+            for labels, item in value.items()
+        ]
+
+
+class MetricsRegistry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], Any],
+              labelnames: Sequence[str] = ()) -> CallbackGauge:
+        return self.register(CallbackGauge(name, documentation, callback, labelnames))
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+# --- Инструментирование -------------------------------------------------------
+
+def instrument(callback: Callable[..., Awaitable[Any]], latency: Histogram, errors: Counter,
+               name: str = "") -> Callable[..., Awaitable[Any]]:
+    """Оборачивает корутину: задержка в latency, исключения в errors (метка - имя)"""
+    labels = (name or callback.__name__,)
+    observe = latency.observe
+    perf_counter = time.perf_counter
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        started = perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            errors.inc(labels)
+            raise
+        finally:
+            observe(perf_counter() - started, labels)
+
+    return wrapper
+
+
+def upstream_observer(latency: Histogram, errors: Counter) -> Callable[[str, float, bool], None]:
+    """Функция для CryptoPayAPI.request_observer: задержка и ошибки по методу API"""
+    observe = latency.observe
+
+    def observer(endpoint: str, elapsed: float, ok: bool) -> None:
+        labels = (endpoint,)
+        observe(elapsed, labels)
+        if not ok:
+            errors.inc(labels)
+
+    return observer
+
+
+def create_http_metrics(registry: MetricsRegistry, prefix: str) -> Tuple[Histogram, Counter]:
+    """Метрики HTTP сервера: задержка по маршруту и число ответов по статусу"""
+    latency = registry.histogram(
+        f"{prefix}_http_request_duration_seconds", "Время обработки HTTP запроса", ("route", "method")
+    )
+    responses = registry.counter(
+        f"{prefix}_http_responses_total", "HTTP ответы по статусу", ("route", "method", "status")
+    )
+    return latency, responses
+
+
+def metrics_middleware(latency: Histogram, responses: Counter):
+    """aiohttp middleware: задержка и статус ответа по шаблону маршрута"""
+    perf_counter = time.perf_counter
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        started = perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            # Шаблон маршрута, а не путь: число серий не растет от запросов
+            resource = request.match_info.route.resource
+            route = resource.canonical if resource is not None else "unmatched"
+            latency.observe(perf_counter() - started, (route, request.method))
+            responses.inc((route, request.method, str(status)))
+
+    return middleware
+
+
+def create_metrics_handler(registry: MetricsRegistry):
+    """Обработчик GET /metrics"""
+    async def metrics_handler(request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    return metrics_handler
+
+
+def add_metrics_route(web_app: web.Application, registry: MetricsRegistry, path: str = "/metrics") -> None:
+    web_app.router.add_get(path, create_metrics_handler(registry))
+
+
+def stats_gauge(registry: MetricsRegistry, name: str, documentation: str,
+                stats: Callable[[], Dict[str, float]], keys: Iterable[str] = ()) -> CallbackGauge:
+    """Gauge по словарю stats() компонента (метка key); None - компонент не создан"""
+    keys = tuple(keys)
+
+    def collect():
+        values = stats()
+        if values is None:
+            return None
+        return {(key,): value for key, value in values.items() if not keys or key in keys}
+
+    return registry.gauge(name, documentation, collect, ("key",))
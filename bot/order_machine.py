@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Order Machine
+Переходы заказа между статусами: new -> accepted -> paid, new -> rejected,
+accepted -> expired -> paid. Переход выполняется под блокировкой заказа,
+повтор того же действия (ключ идемпотентности) и действие не по порядку
+отсеиваются без запросов к базе, когда это возможно
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from order_store import (
+    ORDER_ACCEPTED,
+    ORDER_EXPIRED,
+    ORDER_NEW,
+    ORDER_PAID,
+    ORDER_REJECTED,
+    Order,
+    OrderStore,
+)
+
+logger = logging.getLogger(__name__)
+
+# Действия администратора (кнопки под карточкой заказа)
+ACTION_ACCEPT = "accept"
+ACTION_PAID = "paid"
+ACTION_REJECT = "reject"
+# Действия по событиям Crypto Pay
+ACTION_INVOICE_PAID = "invoice_paid"
+ACTION_INVOICE_EXPIRED = "invoice_expired"
+
+# Результаты перехода
+TRANSITION_APPLIED = "applied"
+TRANSITION_DUPLICATE = "duplicate"
+TRANSITION_CONFLICT = "conflict"
+TRANSITION_NOT_FOUND = "not_found"
+TRANSITION_MISMATCH = "mismatch"
+
+# Из этих статусов переходов нет
+FINAL_STATUSES = frozenset((ORDER_PAID, ORDER_REJECTED))
+
+
+@dataclass(frozen=True)
+class OrderAction:
+    """Действие: из каких статусов в какой переводит заказ"""
+    name: str
+    from_statuses: Tuple[str, ...]
+    to_status: str
+
+
+ORDER_ACTIONS: Dict[str, OrderAction] = {
+    action.name: action for action in (
+        OrderAction(ACTION_ACCEPT, (ORDER_NEW,), ORDER_ACCEPTED),
+        # Оплата вручную возможна и после истечения счета Crypto Pay
+        OrderAction(ACTION_PAID, (ORDER_ACCEPTED, ORDER_EXPIRED), ORDER_PAID),
+        OrderAction(ACTION_REJECT, (ORDER_NEW,), ORDER_REJECTED),
+        OrderAction(ACTION_INVOICE_PAID, (ORDER_ACCEPTED,), ORDER_PAID),
+        OrderAction(ACTION_INVOICE_EXPIRED, (ORDER_ACCEPTED,), ORDER_EXPIRED),
+    )
+}
+
+
+@dataclass(frozen=True)
+class TransitionResult:
+    """Итог действия; order - заказ после перехода (для APPLIED и DUPLICATE)"""
+    outcome: str
+    action: str
+    order: Optional[Order] = None
+
+    @property
+    def applied(self) -> bool:
+        return self.outcome == TRANSITION_APPLIED
+
+
+class OrderStateMachine:
+    """
+    Применяет действия к заказам из OrderStore. Сама смена статуса атомарна
+    в базе (UPDATE ... WHERE status IN), поэтому корректна и для нескольких
+    процессов. Последние max_keys ключей идемпотентности и известные
+    финальные статусы хранятся в памяти: повторное нажатие отвечается без
+    обращения к базе
+    """
+
+    def __init__(self, store: OrderStore, max_keys: int = 10000):
+        self.store = store
+        self.max_keys = max_keys
+        # order_id -> [блокировка, число ожидающих и владеющих]
+        self._locks: Dict[int, List] = {}
+        # ключ идемпотентности -> результат примененного действия
+        self._applied: "OrderedDict[str, TransitionResult]" = OrderedDict()
+        # order_id -> финальный статус
+        self._final: "OrderedDict[int, str]" = OrderedDict()
+        # Вызывается с заказом после каждого примененного перехода
+        self.transition_observer: Optional[Callable[[Order], None]] = None
+
+        # Статистика для мониторинга
+        self.results: Dict[str, int] = dict.fromkeys(
+            (TRANSITION_APPLIED, TRANSITION_DUPLICATE, TRANSITION_CONFLICT, TRANSITION_NOT_FOUND,
+             TRANSITION_MISMATCH), 0
+        )
+
+    @asynccontextmanager
+    async def lock(self, order_id: int) -> AsyncIterator[None]:
+        """
+        Блокировка заказа: действие и все его последствия (счет, уведомления,
+        правка карточки) выполняются, пока другие действия с заказом ждут
+        """
+        entry = self._locks.get(order_id)
+        if entry is None:
+            entry = self._locks[order_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[order_id]
+
+    async def apply(self, order_id: int, action_name: str, idempotency_key: Optional[str] = None,
+                    guard: Optional[Callable[[Order], bool]] = None) -> TransitionResult:
+        """
+        Применяет действие к заказу. idempotency_key по умолчанию -
+        "действие:заказ", то есть каждое действие применяется к заказу один раз.
+        guard проверяет заказ перед переходом (стоит одного чтения из базы)
+        """
+        result = await self._apply(order_id, ORDER_ACTIONS[action_name], idempotency_key, guard)
+        self.results[result.outcome] += 1
+        return result
+
+    async def _apply(self, order_id: int, action: OrderAction, idempotency_key: Optional[str],
+                     guard: Optional[Callable[[Order], bool]]) -> TransitionResult:
+        key = idempotency_key or f"{action.name}:{order_id}"
+        applied = self._applied.get(key)
+        if applied is not None:
+            self._applied.move_to_end(key)
+            return TransitionResult(TRANSITION_DUPLICATE, action.name, applied.order)
+
+        final_status = self._final.get(order_id)
+        if final_status is not None:
+            return TransitionResult(TRANSITION_CONFLICT, action.name)
+
+        if guard is not None:
+            current = await self.store.get_order(order_id)
+            if current is None:
+                return TransitionResult(TRANSITION_NOT_FOUND, action.name)
+            if not guard(current):
+                return TransitionResult(TRANSITION_MISMATCH, action.name)
+            if current.status not in action.from_statuses:
+                self._remember_status(current)
+                return TransitionResult(TRANSITION_CONFLICT, action.name)
+
+        order = await self.store.transition(order_id, action.from_statuses, action.to_status)
+        if order is None:
+            current = await self.store.get_order(order_id)
+            if current is None:
+                return TransitionResult(TRANSITION_NOT_FOUND, action.name)
+            self._remember_status(current)
+            logger.debug(f"Заказ #{order_id} в статусе {current.status}: действие {action.name} не применено")
+            return TransitionResult(TRANSITION_CONFLICT, action.name)
+
+        result = TransitionResult(TRANSITION_APPLIED, action.name, order)
+        self._applied[key] = result
+        if len(self._applied) > self.max_keys:
+            self._applied.popitem(last=False)
+        self._remember_status(order)
+        if self.transition_observer is not None:
+            try:
+                self.transition_observer(order)
+            except Exception as e:
+                logger.error(f"Ошибка наблюдателя перехода заказа #{order_id}: {e}")
+        return result
+
+    def _remember_status(self, order: Order) -> None:
+        if order.status in FINAL_STATUSES:
+            self._final[order.id] = order.status
+            if len(self._final) > self.max_keys:
+                self._final.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Показатели для мониторинга"""
+        return dict(self.results, locks=len(self._locks), keys=len(self._applied))
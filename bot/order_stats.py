@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Order Stats
+Сводка по заказам для администраторов: число и объем заказов, доля
+принятых, время до принятия, оплаты и истечения за последний час, сутки и
+неделю. Каждое событие заказа обновляет счетчики за O(1) (кольцевой буфер
+ведер на окно), сводка читается из готовых сумм без обхода истории
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from order_store import ORDER_ACCEPTED, ORDER_EXPIRED, ORDER_PAID, ORDER_REJECTED, Order
+
+# Поля счетчиков (индексы в ведре)
+CREATED = 0
+CREATED_RUB = 1
+CREATED_USDT = 2
+ACCEPTED = 3
+ACCEPT_SECONDS = 4
+REJECTED = 5
+PAID = 6
+PAID_RUB = 7
+PAID_USDT = 8
+EXPIRED = 9
+FIELDS = 10
+
+# Окна сводки: название, длина в секундах, число ведер
+DEFAULT_WINDOWS: Tuple[Tuple[str, int, int], ...] = (
+    ("1h", 60 * 60, 60),
+    ("24h", 24 * 60 * 60, 96),
+    ("7d", 7 * 24 * 60 * 60, 168),
+)
+
+
+class RollingWindow:
+    """
+    Суммы счетчиков за последние span секунд. Окно разбито на ведра по
+    span / buckets секунд; ведро, вышедшее из окна, вычитается из сумм при
+    следующем событии или чтении. Точность границы окна - одно ведро
+    """
+
+    def __init__(self, span: float, buckets: int):
+        self.span = span
+        self.width = span / buckets
+        self._buckets: List[list] = [[0] * FIELDS for _ in range(buckets)]
+        self._totals: list = [0] * FIELDS
+        # Номер последнего ведра, до которого окно продвинуто
+        self._head: Optional[int] = None
+
+    def _advance(self, now: float) -> int:
+        """Сдвигает окно к моменту now, возвращает номер текущего ведра"""
+        epoch = int(now // self.width)
+        head = self._head
+        if head is None:
+            self._head = epoch
+            return epoch
+        if epoch <= head:
+            # Часы не идут назад для окна: запоздалое событие - в текущее ведро
+            return head
+        count = len(self._buckets)
+        totals = self._totals
+        # Очищаются только ведра между head и epoch, и не больше всего кольца
+        for stale in range(max(head + 1, epoch - count + 1), epoch + 1):
+            bucket = self._buckets[stale % count]
+            for field in range(FIELDS):
+                if bucket[field]:
+                    totals[field] -= bucket[field]
+                    bucket[field] = 0
+        self._head = epoch
+        return epoch
+
+    def add(self, now: float, increments: Tuple[Tuple[int, object], ...]) -> None:
+        """Прибавляет (поле, значение) к ведру момента now"""
+        bucket = self._buckets[self._advance(now) % len(self._buckets)]
+        totals = self._totals
+        for field, value in increments:
+            bucket[field] += value
+            totals[field] += value
+
+    def totals(self, now: float) -> list:
+        """Суммы счетчиков за окно, заканчивающееся в now"""
+        self._advance(now)
+        return list(self._totals)
+
+
+@dataclass(frozen=True)
+class StatsSummary:
+    """Показатели заказов за одно окно"""
+    created: int
+    created_rub: object
+    created_usdt: object
+    accepted: int
+    rejected: int
+    paid: int
+    paid_rub: object
+    paid_usdt: object
+    expired: int
+    # Доля принятых среди принятых и отклоненных; None - решений не было
+    acceptance_rate: Optional[float]
+    # Среднее время от создания до принятия; None - принятых не было
+    avg_accept_seconds: Optional[float]
+
+    @classmethod
+    def from_totals(cls, totals: list) -> "StatsSummary":
+        decided = totals[ACCEPTED] + totals[REJECTED]
+        return cls(
+            created=totals[CREATED],
+            created_rub=totals[CREATED_RUB],
+            created_usdt=totals[CREATED_USDT],
+            accepted=totals[ACCEPTED],
+            rejected=totals[REJECTED],
+            paid=totals[PAID],
+            paid_rub=totals[PAID_RUB],
+            paid_usdt=totals[PAID_USDT],
+            expired=totals[EXPIRED],
+            acceptance_rate=totals[ACCEPTED] / decided if decided else None,
+            avg_accept_seconds=totals[ACCEPT_SECONDS] / totals[ACCEPTED] if totals[ACCEPTED] else None,
+        )
+
+
+class OrderStats:
+    """
+    Счетчики заказов с момента запуска и по окнам DEFAULT_WINDOWS. События
+    берут время из заказа (created_at, updated_at), поэтому сводка совпадает
+    с базой, пока процесс работает; после перезапуска счет начинается заново
+    """
+
+    def __init__(self, windows: Tuple[Tuple[str, int, int], ...] = DEFAULT_WINDOWS):
+        self.windows: Dict[str, RollingWindow] = {
+            name: RollingWindow(span, buckets) for name, span, buckets in windows
+        }
+        self.lifetime: list = [0] * FIELDS
+        self.started_at = time.time()
+
+    def _add(self, now: float, increments: Tuple[Tuple[int, object], ...]) -> None:
+        for window in self.windows.values():
+            window.add(now, increments)
+        lifetime = self.lifetime
+        for field, value in increments:
+            lifetime[field] += value
+
+    def record_created(self, order: Order) -> None:
+        """Новый заказ"""
+        self._add(order.created_at, ((CREATED, 1), (CREATED_RUB, order.total_rub), (CREATED_USDT, order.total_usdt)))
+
+    def record_status(self, order: Order) -> None:
+        """Заказ перешел в новый статус (order - заказ после перехода)"""
+        status = order.status
+        if status == ORDER_ACCEPTED:
+            increments = ((ACCEPTED, 1), (ACCEPT_SECONDS, max(0.0, order.updated_at - order.created_at)))
+        elif status == ORDER_PAID:
+            increments = ((PAID, 1), (PAID_RUB, order.total_rub), (PAID_USDT, order.total_usdt))
+        elif status == ORDER_REJECTED:
+            increments = ((REJECTED, 1),)
+        elif status == ORDER_EXPIRED:
+            increments = ((EXPIRED, 1),)
+        else:
+            return
+        self._add(order.updated_at, increments)
+
+    def summary(self, now: Optional[float] = None) -> Dict[str, StatsSummary]:
+        """Показатели по окнам и за все время работы ("total")"""
+        if now is None:
+            now = time.time()
+        result = {name: StatsSummary.from_totals(window.totals(now)) for name, window in self.windows.items()}
+        result["total"] = StatsSummary.from_totals(self.lifetime)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        """Показатели для мониторинга"""
+        lifetime = self.lifetime
+        return {
+            "created": lifetime[CREATED],
+            "accepted": lifetime[ACCEPTED],
+            "rejected": lifetime[REJECTED],
+            "paid": lifetime[PAID],
+            "expired": lifetime[EXPIRED],
+        }
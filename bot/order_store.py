@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Order Store
+Хранилище заказов на SQLite (WAL) с асинхронным интерфейсом
+"""
+
+import time
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Callable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Статусы заказа
+ORDER_NEW = "new"
+ORDER_ACCEPTED = "accepted"
+ORDER_PAID = "paid"
+ORDER_REJECTED = "rejected"
+ORDER_EXPIRED = "expired"
+
+# Миграции схемы; номер применённой миграции хранится в PRAGMA user_version
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        username TEXT NOT NULL DEFAULT '',
+        full_name TEXT NOT NULL DEFAULT '',
+        login TEXT NOT NULL,
+        base_amount TEXT NOT NULL,
+        total_rub TEXT NOT NULL,
+        total_usdt TEXT NOT NULL,
+        commission_percent TEXT NOT NULL,
+        usdt_rate TEXT NOT NULL,
+        status TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, created_at);
+    CREATE INDEX IF NOT EXISTS idx_orders_user ON orders (user_id, created_at);
+    """,
+    """
+    ALTER TABLE orders ADD COLUMN invoice_id INTEGER;
+    ALTER TABLE orders ADD COLUMN pay_url TEXT;
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_invoice ON orders (invoice_id);
+    """,
+    """
+    ALTER TABLE orders ADD COLUMN pricing_version INTEGER;
+    """,
+]
+
+
+@dataclass(frozen=True)
+class Order:
+    """Заказ на пополнение"""
+    id: int
+    user_id: int
+    chat_id: int
+    username: str
+    full_name: str
+    login: str
+    base_amount: Decimal
+    total_rub: Decimal
+    total_usdt: Decimal
+    commission_percent: Decimal
+    usdt_rate: Decimal
+    status: str
+    created_at: float
+    updated_at: float
+    invoice_id: Optional[int] = None
+    pay_url: Optional[str] = None
+    pricing_version: Optional[int] = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Order":
+        return cls(
+            id=row["id"],
+            user_id=row["user_id"],
+            chat_id=row["chat_id"],
+            username=row["username"],
+            full_name=row["full_name"],
+            login=row["login"],
+            base_amount=Decimal(row["base_amount"]),
+            total_rub=Decimal(row["total_rub"]),
+            total_usdt=Decimal(row["total_usdt"]),
+            commission_percent=Decimal(row["commission_percent"]),
+            usdt_rate=Decimal(row["usdt_rate"]),
+            status=row["status"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+            invoice_id=row["invoice_id"],
+            pay_url=row["pay_url"],
+            pricing_version=row["pricing_version"],
+        )
+
+
+class OrderStore:
+    """
+    Хранилище заказов. Все запросы выполняются в одном фоновом потоке
+    с единственным соединением, поэтому event loop не блокируется на диске
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="order-store")
+
+    async def _run(self, func: Callable[..., Any], *args) -> Any:
+        if self._conn is None:
+            await self.open()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def open(self) -> None:
+        """Открывает базу и применяет миграции"""
+        if self._conn is not None:
+            return
+        loop = asyncio.get_running_loop()
+        conn = await loop.run_in_executor(self._executor, self._connect)
+        if self._conn is not None:
+            # Параллельный вызов уже открыл базу
+            await loop.run_in_executor(self._executor, conn.close)
+            return
+        self._conn = conn
+        logger.info(f"Хранилище заказов открыто: {self.path}")
+
+    async def close(self) -> None:
+        """Закрывает соединение с базой"""
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, conn.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            conn.executescript(f"BEGIN; {migration}; PRAGMA user_version={number}; COMMIT;")
+        return conn
+
+    def _create_order(self, values: dict) -> Order:
+        now = time.time()
+        values = dict(values, status=ORDER_NEW, created_at=now, updated_at=now)
+        columns = ", ".join(values)
+        placeholders = ", ".join(f":{column}" for column in values)
+        cursor = self._conn.execute(f"INSERT INTO orders ({columns}) VALUES ({placeholders})", values)
+        return self._get_order(cursor.lastrowid)
+
+    def _get_order(self, order_id: int) -> Optional[Order]:
+        row = self._conn.execute("SELECT * FROM orders WHERE id = ?", (order_id,)).fetchone()
+        return Order.from_row(row) if row else None
+
+    def _transition(self, order_id: int, from_statuses: tuple, to_status: str) -> Optional[Order]:
+        placeholders = ", ".join("?" for _ in from_statuses)
+        cursor = self._conn.execute(
+            f"UPDATE orders SET status = ?, updated_at = ? WHERE id = ? AND status IN ({placeholders})",
+            (to_status, time.time(), order_id, *from_statuses)
+        )
+        if cursor.rowcount != 1:
+            return None
+        return self._get_order(order_id)
+
+    def _get_order_by_invoice(self, invoice_id: int) -> Optional[Order]:
+        row = self._conn.execute("SELECT * FROM orders WHERE invoice_id = ?", (invoice_id,)).fetchone()
+        return Order.from_row(row) if row else None
+
+    def _set_invoice(self, order_id: int, invoice_id: int, pay_url: str) -> Optional[Order]:
+        self._conn.execute(
+            "UPDATE orders SET invoice_id = ?, pay_url = ?, updated_at = ? WHERE id = ?",
+            (invoice_id, pay_url, time.time(), order_id)
+        )
+        return self._get_order(order_id)
+
+    def _list_awaiting_payment(self) -> List[Order]:
+        rows = self._conn.execute(
+            "SELECT * FROM orders WHERE status = ? AND invoice_id IS NOT NULL ORDER BY created_at",
+            (ORDER_ACCEPTED,)
+        ).fetchall()
+        return [Order.from_row(row) for row in rows]
+
+    def _list_orders(self, status: Optional[str], limit: int) -> List[Order]:
+        if status:
+            rows = self._conn.execute(
+                "SELECT * FROM orders WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)
+            ).fetchall()
+        else:
+            rows = self._conn.execute(
+                "SELECT * FROM orders ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [Order.from_row(row) for row in rows]
+
+    async def create_order(self,
+                           user_id: int,
+                           chat_id: int,
+                           login: str,
+                           base_amount: Decimal,
+                           total_rub: Decimal,
+                           total_usdt: Decimal,
+                           commission_percent: Decimal,
+                           usdt_rate: Decimal,
+                           username: str = "",
+                           full_name: str = "",
+                           pricing_version: Optional[int] = None) -> Order:
+        """Сохраняет новый заказ в статусе new; pricing_version - версия снимка цен"""
+        values = {
+            "user_id": user_id,
+            "chat_id": chat_id,
+            "username": username,
+            "full_name": full_name,
+            "login": login,
+            "base_amount": str(base_amount),
+            "total_rub": str(total_rub),
+            "total_usdt": str(total_usdt),
+            "commission_percent": str(commission_percent),
+            "usdt_rate": str(usdt_rate),
+            "pricing_version": pricing_version,
+        }
+        return await self._run(self._create_order, values)
+
+    async def get_order(self, order_id: int) -> Optional[Order]:
+        """Возвращает заказ по ID"""
+        return await self._run(self._get_order, order_id)
+
+    async def transition(self, order_id: int, from_statuses: Iterable[str], to_status: str) -> Optional[Order]:
+        """
+        Атомарно переводит заказ в новый статус, если текущий статус входит
+        в from_statuses. Возвращает обновленный заказ или None
+        """
+        return await self._run(self._transition, order_id, tuple(from_statuses), to_status)
+
+    async def get_order_by_invoice(self, invoice_id: int) -> Optional[Order]:
+        """Возвращает заказ по ID инвойса Crypto Pay"""
+        return await self._run(self._get_order_by_invoice, invoice_id)
+
+    async def set_invoice(self, order_id: int, invoice_id: int, pay_url: str) -> Optional[Order]:
+        """Привязывает к заказу инвойс Crypto Pay"""
+        return await self._run(self._set_invoice, order_id, invoice_id, pay_url)
+
+    async def list_orders(self, status: Optional[str] = None, limit: int = 50) -> List[Order]:
+        """Возвращает последние заказы, при необходимости с фильтром по статусу"""
+        return await self._run(self._list_orders, status, limit)
+
+    async def list_awaiting_payment(self) -> List[Order]:
+        """Возвращает принятые заказы с неоплаченным инвойсом Crypto Pay"""
+        return await self._run(self._list_awaiting_payment)
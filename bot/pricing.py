@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Pricing
+Неизменяемые снимки курса USDT и комиссии. Заказ считается целиком по
+одному снимку, поэтому параллельный /setrate не смешивает старые и новые
+значения
+"""
+
+import time
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Union
+
+CENT = Decimal('0.01')
+HUNDRED = Decimal('100')
+
+Number = Union[Decimal, float, int, str]
+
+
+def to_decimal(value: Number) -> Decimal:
+    """Decimal из числа; float проходит через str, чтобы не тащить двоичный хвост"""
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+
+@dataclass(frozen=True)
+class PricingSnapshot:
+    """Курс и комиссия на момент публикации; множители посчитаны заранее"""
+    version: int
+    usdt_rate: Decimal
+    commission_percent: Decimal
+    commission_multiplier: Decimal
+    created_at: float
+
+    @classmethod
+    def create(cls, version: int, usdt_rate: Number, commission_percent: Number) -> "PricingSnapshot":
+        usdt_rate = to_decimal(usdt_rate)
+        commission_percent = to_decimal(commission_percent)
+        return cls(
+            version=version,
+            usdt_rate=usdt_rate,
+            commission_percent=commission_percent,
+            commission_multiplier=Decimal('1') + commission_percent / HUNDRED,
+            created_at=time.time(),
+        )
+
+    def total_with_commission(self, base_amount: Decimal) -> Decimal:
+        """Итоговая сумма к оплате с комиссией"""
+        return (base_amount * self.commission_multiplier).quantize(CENT, rounding=ROUND_HALF_UP)
+
+    def usdt_amount(self, rub_amount: Decimal) -> Decimal:
+        """Рубли в USDT по курсу снимка"""
+        return (rub_amount / self.usdt_rate).quantize(CENT, rounding=ROUND_HALF_UP)
+
+    def quote(self, base_amount: Decimal) -> "Quote":
+        """Полный расчет заказа по этому снимку"""
+        total_rub = self.total_with_commission(base_amount)
+        return Quote(base_amount, total_rub, self.usdt_amount(total_rub), self)
+
+
+@dataclass(frozen=True)
+class Quote:
+    """Расчет одного заказа и снимок, по которому он сделан"""
+    base_amount: Decimal
+    total_rub: Decimal
+    total_usdt: Decimal
+    pricing: PricingSnapshot
+
+
+class PricingEngine:
+    """
+    Хранит текущий снимок. Новый снимок публикуется одним присваиванием;
+    читатели берут snapshot один раз и дальше работают только с ним.
+    Версии снимков задает общее хранилище состояния, поэтому у всех
+    процессов бота одна и та же версия означает одни и те же цены
+    """
+
+    def __init__(self, usdt_rate: Number, commission_percent: Number):
+        self._snapshot = PricingSnapshot.create(1, usdt_rate, commission_percent)
+
+    @property
+    def snapshot(self) -> PricingSnapshot:
+        return self._snapshot
+
+    def apply(self, version: int, usdt_rate: Number, commission_percent: Number) -> PricingSnapshot:
+        """Публикует снимок версии version; более старые версии игнорируются"""
+        if version < self._snapshot.version:
+            return self._snapshot
+        self._snapshot = PricingSnapshot.create(version, usdt_rate, commission_percent)
+        return self._snapshot
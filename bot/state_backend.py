@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+State Backend
+Общее состояние процессов бота (курс, комиссия и т.п.): значение по ключу
+с номером версии и уведомлениями об изменениях. Модуль не зависит от
+остального бота
+"""
+
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Курс и комиссия: {"usdt_rate": "95.0", "commission_percent": "15.0"}
+PRICING_STATE_KEY = "pricing"
+
+
+@dataclass(frozen=True)
+class StateEntry:
+    """Значение ключа; version растет на 1 при каждом изменении"""
+    key: str
+    value: Dict[str, Any]
+    version: int
+
+
+ChangeListener = Callable[[StateEntry], None]
+
+
+class StateBackend(ABC):
+    """
+    Базовый класс хранилища; наследник без get, setdefault или update не
+    создается. Слушатели вызываются в event loop при каждом
+    изменении ключа - сделанном этим процессом или другим
+    """
+
+    def __init__(self):
+        self._listeners: List[ChangeListener] = []
+
+    def subscribe(self, listener: ChangeListener) -> None:
+        self._listeners.append(listener)
+
+    def _notify(self, entry: StateEntry) -> None:
+        for listener in self._listeners:
+            try:
+                listener(entry)
+            except Exception as e:
+                logger.error(f"Ошибка в обработчике изменения {entry.key}: {e}")
+
+    async def start(self) -> None:
+        """Начинает следить за изменениями из других процессов"""
+
+    async def stop(self) -> None:
+        """Останавливает слежение и закрывает хранилище"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[StateEntry]:
+        """Текущее значение ключа или None"""
+
+    @abstractmethod
+    async def setdefault(self, key: str, value: Dict[str, Any]) -> StateEntry:
+        """Создает ключ со значением value, если его еще нет; возвращает текущее значение"""
+
+    @abstractmethod
+    async def update(self, key: str, changes: Dict[str, Any]) -> StateEntry:
+        """Атомарно дописывает changes в значение ключа и увеличивает версию"""
+
+
+class MemoryStateBackend(StateBackend):
+    """Состояние в памяти процесса: для одного процесса и локальной разработки"""
+
+    def __init__(self):
+        super().__init__()
+        self._entries: Dict[str, StateEntry] = {}
+
+    async def get(self, key: str) -> Optional[StateEntry]:
+        return self._entries.get(key)
+
+    async def setdefault(self, key: str, value: Dict[str, Any]) -> StateEntry:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = StateEntry(key, dict(value), 1)
+            self._notify(entry)
+        return entry
+
+    async def update(self, key: str, changes: Dict[str, Any]) -> StateEntry:
+        current = self._entries.get(key)
+        value = dict(current.value if current else {}, **changes)
+        entry = self._entries[key] = StateEntry(key, value, current.version + 1 if current else 1)
+        self._notify(entry)
+        return entry
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    Состояние в файле SQLite, общем для нескольких процессов на одной машине.
+    Изменения других процессов замечаются по PRAGMA data_version, который
+    проверяется раз в poll_interval секунд в фоновом потоке: проверка не
+    читает таблицу, пока в базе ничего не изменилось
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.02):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-backend")
+        self._data_version: Optional[int] = None
+        # Последняя известная этому процессу версия каждого ключа
+        self._versions: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self, func: Callable[..., Any], *args) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._conn is None:
+            conn = await loop.run_in_executor(self._executor, self._connect)
+            if self._conn is None:
+                self._conn = conn
+                logger.info(f"Общее состояние: {self.path}")
+            else:
+                # Параллельный вызов уже открыл базу
+                await loop.run_in_executor(self._executor, conn.close)
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, version INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        return conn
+
+    def _read(self, key: str) -> Optional[StateEntry]:
+        row = self._conn.execute("SELECT value, version FROM state WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return StateEntry(key, json.loads(row[0]), row[1])
+
+    def _write(self, key: str, value: Dict[str, Any], version: int) -> StateEntry:
+        self._conn.execute(
+            "INSERT INTO state (key, value, version, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, version = excluded.version, "
+            "updated_at = excluded.updated_at",
+            (key, json.dumps(value), version, time.time())
+        )
+        return StateEntry(key, value, version)
+
+    def _setdefault(self, key: str, value: Dict[str, Any]) -> StateEntry:
+        # BEGIN IMMEDIATE: чтение и запись под одной блокировкой записи
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            entry = self._read(key)
+            if entry is None:
+                entry = self._write(key, dict(value), 1)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return entry
+
+    def _update(self, key: str, changes: Dict[str, Any]) -> StateEntry:
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = self._read(key)
+            value = dict(current.value if current else {}, **changes)
+            entry = self._write(key, value, current.version + 1 if current else 1)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return entry
+
+    def _poll(self) -> List[StateEntry]:
+        """Изменения других процессов с прошлой проверки"""
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return []
+        self._data_version = data_version
+        changed = []
+        for key, value, version in self._conn.execute("SELECT key, value, version FROM state"):
+            if version > self._versions.get(key, 0):
+                changed.append(StateEntry(key, json.loads(value), version))
+        return changed
+
+    def _apply(self, entry: StateEntry) -> None:
+        """Уведомляет слушателей, если версия новее известной процессу"""
+        if entry.version > self._versions.get(entry.key, 0):
+            self._versions[entry.key] = entry.version
+            self._notify(entry)
+
+    async def get(self, key: str) -> Optional[StateEntry]:
+        entry = await self._run(self._read, key)
+        if entry is not None:
+            self._apply(entry)
+        return entry
+
+    async def setdefault(self, key: str, value: Dict[str, Any]) -> StateEntry:
+        entry = await self._run(self._setdefault, key, value)
+        self._apply(entry)
+        return entry
+
+    async def update(self, key: str, changes: Dict[str, Any]) -> StateEntry:
+        entry = await self._run(self._update, key, changes)
+        self._apply(entry)
+        return entry
+
+    async def start(self) -> None:
+        if self._task is None:
+            for entry in await self._run(self._poll):
+                self._apply(entry)
+            self._task = asyncio.create_task(self._watch())
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                for entry in await self._run(self._poll):
+                    self._apply(entry)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка чтения общего состояния: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._executor, conn.close)
+
+
+def create_state_backend(url: str) -> StateBackend:
+    """Хранилище по строке настройки: memory или sqlite:путь_к_файлу"""
+    if url == "memory":
+        return MemoryStateBackend()
+    if url.startswith("sqlite:"):
+        return SQLiteStateBackend(url[len("sqlite:"):])
+    raise ValueError(f"Неизвестное хранилище состояния: {url}")
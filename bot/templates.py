@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Templates
+Шаблоны сообщений бота: компилируются один раз при запуске, HTML-экранирование
+применяется только к подставляемым значениям
+"""
+
+import html
+import string
+from decimal import Decimal
+from typing import Dict, Mapping, Optional, Tuple
+
+# Значения этих типов не содержат символов HTML и не экранируются
+_SAFE_TYPES = (int, float, Decimal)
+
+# Поля с таким окончанием содержат готовый HTML и вставляются как есть
+RAW_SUFFIX = "_html"
+
+_formatter = string.Formatter()
+
+
+def _escape(value) -> str:
+    if type(value) in _SAFE_TYPES:
+        return str(value)
+    return html.escape(str(value))
+
+
+class Template:
+    """
+    Скомпилированный шаблон. В тексте используются поля {name} без формата;
+    значение экранируется, если имя поля не оканчивается на _html
+    """
+
+    __slots__ = ("name", "fields", "_format", "_slots")
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        chunks = []
+        slots = []
+        for literal, field, format_spec, conversion in _formatter.parse(source):
+            chunks.append(literal.replace("%", "%%"))
+            if field is None:
+                continue
+            if not field.isidentifier() or format_spec or conversion:
+                raise ValueError(f"Шаблон {name}: поле {{{field}}} должно быть простым именем без формата")
+            chunks.append("%s")
+            slots.append((field, str if field.endswith(RAW_SUFFIX) else _escape))
+        self.fields = tuple(dict.fromkeys(field for field, _ in slots))
+        # Разбор {полей} сделан здесь; при рендере остается одна подстановка %s
+        self._format = "".join(chunks)
+        self._slots = tuple(slots)
+
+    def render(self, values: Mapping) -> str:
+        return self._format % tuple([convert(values[field]) for field, convert in self._slots])
+
+
+class TemplateRenderer:
+    """
+    Набор шаблонов по локалям. Шаблон, которого нет в локали, берется из
+    локали по умолчанию
+    """
+
+    def __init__(self, catalog: Mapping[str, Mapping[str, str]], locale: str, default_locale: str):
+        if default_locale not in catalog:
+            raise ValueError(f"Нет шаблонов для локали по умолчанию {default_locale}")
+        self.default_locale = default_locale
+        self.locale = locale if locale in catalog else default_locale
+        self._templates: Dict[Tuple[str, str], Template] = {}
+        for catalog_locale, templates in catalog.items():
+            for name, source in templates.items():
+                self._templates[(catalog_locale, name)] = Template(name, source)
+        for catalog_locale, templates in catalog.items():
+            for name in catalog[default_locale]:
+                if name not in templates:
+                    self._templates[(catalog_locale, name)] = self._templates[(default_locale, name)]
+
+    def get(self, name: str, locale: Optional[str] = None) -> Template:
+        template = self._templates.get((locale or self.locale, name))
+        if template is None:
+            template = self._templates[(self.default_locale, name)]
+        return template
+
+    def render(self, name: str, locale: Optional[str] = None, **values) -> str:
+        """Рендерит шаблон name для locale (по умолчанию - локаль бота)"""
+        return self.get(name, locale).render(values)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Throttling
+Ограничение частоты входящих обновлений: корзина токенов на пользователя
+и общая корзина. Лишние обновления отбрасываются до обработчиков
+"""
+
+import time
+import logging
+from typing import Dict, Iterable, Optional
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes, TypeHandler
+
+from token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Группа обработчиков, которая выполняется раньше всех остальных (группа 0)
+THROTTLE_HANDLER_GROUP = -1
+
+
+class UpdateThrottler:
+    """
+    Пропускает не больше user_rate обновлений в секунду от пользователя
+    (с запасом user_burst) и не больше global_rate в сумме. Нулевой rate
+    выключает соответствующий лимит, exempt_user_ids не ограничиваются
+    совсем. Корзины, которые успели заполниться, удаляются раз в
+    cleanup_interval секунд; пользователей в памяти не больше max_users
+    """
+
+    def __init__(self,
+                 user_rate: float = 1.0,
+                 user_burst: float = 5.0,
+                 global_rate: float = 100.0,
+                 global_burst: float = 200.0,
+                 exempt_user_ids: Iterable[int] = (),
+                 max_users: int = 100000,
+                 cleanup_interval: float = 60.0):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.exempt_user_ids = frozenset(int(user_id) for user_id in exempt_user_ids)
+        self.max_users = max_users
+        self.cleanup_interval = cleanup_interval
+        self._global_bucket = TokenBucket(global_rate, global_burst) if global_rate > 0 else None
+        self._user_buckets: Dict[int, TokenBucket] = {}
+        self._last_cleanup = time.monotonic()
+
+        # Статистика для мониторинга
+        self.allowed = 0
+        self.dropped_user = 0
+        self.dropped_global = 0
+        self.evicted = 0
+
+    def allow(self, user_id: Optional[int], now: Optional[float] = None) -> bool:
+        """Забирает токен для обновления пользователя; False - обновление отбросить"""
+        if now is None:
+            now = time.monotonic()
+        if now - self._last_cleanup >= self.cleanup_interval:
+            self._cleanup(now)
+
+        if user_id in self.exempt_user_ids:
+            # Администраторы не ограничиваются ни своим, ни общим лимитом:
+            # во время флуда их кнопки должны работать
+            self.allowed += 1
+            return True
+
+        if user_id is not None and self.user_rate > 0:
+            bucket = self._user_buckets.get(user_id)
+            if bucket is None:
+                if len(self._user_buckets) >= self.max_users:
+                    # Вытесняем самого давнего пользователя: его корзина скорее всего полная
+                    del self._user_buckets[next(iter(self._user_buckets))]
+                    self.evicted += 1
+                bucket = self._user_buckets[user_id] = TokenBucket(self.user_rate, self.user_burst, now)
+            # Пользовательский лимит проверяется первым: флуд одного
+            # пользователя не должен тратить общий лимит
+            if not bucket.try_acquire(now):
+                self.dropped_user += 1
+                return False
+
+        if self._global_bucket is not None and not self._global_bucket.try_acquire(now):
+            self.dropped_global += 1
+            return False
+
+        self.allowed += 1
+        return True
+
+    def _cleanup(self, now: float) -> None:
+        """Удаляет полные корзины: они не отличаются от новых"""
+        self._last_cleanup = now
+        idle = [user_id for user_id, bucket in self._user_buckets.items() if bucket.is_full(now)]
+        for user_id in idle:
+            del self._user_buckets[user_id]
+
+    def stats(self) -> Dict[str, int]:
+        """Показатели для мониторинга"""
+        return {
+            "users": len(self._user_buckets),
+            "allowed": self.allowed,
+            "dropped_user": self.dropped_user,
+            "dropped_global": self.dropped_global,
+            "evicted": self.evicted,
+        }
+
+
+def create_throttle_handler(throttler: UpdateThrottler, callback_text: Optional[str] = None) -> TypeHandler:
+    """
+    Обработчик для группы THROTTLE_HANDLER_GROUP: отброшенное обновление
+    останавливает обработку, и обработчики группы 0 его не видят. На
+    отброшенное нажатие кнопки отвечается callback_text, иначе клиент
+    показывает загрузку до таймаута
+    """
+    async def throttle(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        user = update.effective_user
+        if not throttler.allow(user.id if user else None):
+            if update.callback_query is not None:
+                try:
+                    await update.callback_query.answer(callback_text, show_alert=bool(callback_text))
+                except Exception as e:
+                    logger.debug(f"Не удалось ответить на отброшенный callback: {e}")
+            raise ApplicationHandlerStop
+
+    return TypeHandler(Update, throttle)
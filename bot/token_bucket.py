@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Token Bucket
+Простой token bucket для ограничения частоты запросов
+"""
+
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float, now: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic() if now is None else now
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def try_acquire(self, now: Optional[float] = None, tokens: float = 1.0) -> bool:
+        """Забирает токены, если они есть"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def delay(self, now: Optional[float] = None, tokens: float = 1.0) -> float:
+        """Сколько секунд ждать, пока накопится нужное число токенов"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    def is_full(self, now: Optional[float] = None) -> bool:
+        """Корзина полная - значит давно не использовалась"""
+        self._refill(time.monotonic() if now is None else now)
+        return self.tokens >= self.capacity
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Update Processor
+Параллельная обработка входящих обновлений: обновления с разными ключами
+(чат, заказ) обрабатываются одновременно, с одним ключом - строго в порядке
+поступления
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+UpdateKey = Optional[Hashable]
+
+
+def chat_key(update: object) -> UpdateKey:
+    """Ключ по чату; обновления без чата порядок не ограничивает"""
+    if isinstance(update, Update) and update.effective_chat is not None:
+        return ("chat", update.effective_chat.id)
+    return None
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Обрабатывает не больше max_concurrent обновлений одновременно. Обновление
+    ждет, пока завершится предыдущее с тем же ключом (key_func), и только
+    потом занимает место: очередь одного чата не держит места других чатов.
+    max_pending - сколько обновлений может быть в работе и в ожидании сразу
+
+    Порядок фиксируется при входе в do_process_update. Application создает
+    задачи в порядке получения обновлений, и пока не набралось max_pending
+    обновлений, задача входит сюда без переключения, то есть в том же порядке
+    """
+
+    def __init__(self,
+                 max_concurrent: int = 32,
+                 key_func: Callable[[object], UpdateKey] = chat_key,
+                 max_pending: int = 10000):
+        # Семафор базового класса ограничивает все принятые обновления,
+        # собственный - только выполняемые
+        super().__init__(max(max_pending, max_concurrent, 2))
+        self.max_concurrent = max_concurrent
+        self.key_func = key_func
+        self._slots = asyncio.Semaphore(max_concurrent)
+        # ключ -> future последнего обновления с этим ключом
+        self._tails: Dict[Hashable, asyncio.Future] = {}
+
+        # Статистика для мониторинга
+        self.running = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.processed = 0
+
+    async def initialize(self) -> None:
+        """Ресурсов не требуется"""
+
+    async def shutdown(self) -> None:
+        """Незавершенные обновления дожидается Application.stop"""
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self.key_func(update)
+        previous = None
+        done = None
+        if key is not None:
+            previous = self._tails.get(key)
+            done = self._tails[key] = asyncio.get_running_loop().create_future()
+
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        started = False
+        try:
+            if previous is not None:
+                # wait, а не await: отмена этой задачи не должна отменять previous
+                await asyncio.wait((previous,))
+            async with self._slots:
+                self.waiting -= 1
+                started = True
+                self.running += 1
+                try:
+                    await coroutine
+                finally:
+                    self.running -= 1
+                    self.processed += 1
+        finally:
+            if not started:
+                self.waiting -= 1
+                # Обновление отменено до обработки: закрываем корутину без предупреждения
+                close = getattr(coroutine, "close", None)
+                if close is not None:
+                    close()
+            if done is not None:
+                done.set_result(None)
+                if self._tails.get(key) is done:
+                    del self._tails[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Показатели для мониторинга"""
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "keys": len(self._tails),
+            "processed": self.processed,
+        }
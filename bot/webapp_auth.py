@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+WebApp Auth
+Проверка initData Telegram WebApp: секрет считается один раз, подпись
+сравнивается за постоянное время, устаревшие и повторные initData
+отклоняются. Модуль не зависит от остального бота
+"""
+
+import hmac
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from urllib.parse import unquote_plus
+
+# Результаты проверки
+AUTH_OK = "ok"
+AUTH_MALFORMED = "malformed"
+AUTH_BAD_HASH = "bad_hash"
+AUTH_EXPIRED = "expired"
+AUTH_REPLAY = "replay"
+
+
+def _parse_init_data(init_data: str) -> Dict[str, str]:
+    """Разбор строки запроса; unquote_plus только для полей, где он нужен"""
+    fields = {}
+    for pair in init_data.split("&"):
+        if not pair:
+            continue
+        key, _, value = pair.partition("=")
+        if "%" in value or "+" in value:
+            value = unquote_plus(value)
+        if "%" in key or "+" in key:
+            key = unquote_plus(key)
+        fields[key] = value
+    return fields
+
+
+class WebAppDataVerifier:
+    """
+    Проверяет initData по документации Telegram. max_age - сколько секунд
+    после auth_date данные считаются свежими (0 - без проверки); повторно
+    использованные подписи хранятся не дольше max_age и не больше
+    max_replay_entries штук.
+
+    WebApp отправляет одни и те же initData на протяжении сессии, поэтому
+    последние max_cached проверенных строк запоминаются: повторная проверка
+    не разбирает строку и не считает HMAC, но свежесть и повтор проверяются
+    """
+
+    def __init__(self, bot_token: str, max_age: float = 24 * 60 * 60,
+                 max_replay_entries: int = 100000, clock_skew: float = 60.0,
+                 max_cached: int = 10000):
+        self._secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+        self.max_age = max_age
+        self.max_replay_entries = max_replay_entries
+        self.clock_skew = clock_skew
+        self.max_cached = max_cached
+        # init_data -> (поля, подпись, auth_date) для строк с верной подписью
+        self._verified: "OrderedDict[str, Tuple[Dict[str, str], bytes, Optional[int]]]" = OrderedDict()
+        # hash -> unix-время, после которого запись можно забыть; порядок вставки
+        # почти совпадает с порядком истечения
+        self._seen: "OrderedDict[bytes, float]" = OrderedDict()
+
+        # Статистика для мониторинга
+        self.results: Dict[str, int] = dict.fromkeys(
+            (AUTH_OK, AUTH_MALFORMED, AUTH_BAD_HASH, AUTH_EXPIRED, AUTH_REPLAY), 0
+        )
+
+    def check(self, init_data: str, consume: bool = False) -> Tuple[str, Optional[Dict[str, str]]]:
+        """
+        Возвращает (результат, поля initData). consume=True запоминает
+        подпись: повторная проверка тех же данных даст AUTH_REPLAY
+        """
+        result, fields = self._check(init_data, consume)
+        self.results[result] += 1
+        return result, fields
+
+    def verify(self, init_data: str, consume: bool = False) -> Optional[Dict[str, str]]:
+        """Поля initData, если данные подлинные и свежие, иначе None"""
+        result, fields = self.check(init_data, consume)
+        return fields if result == AUTH_OK else None
+
+    def _check(self, init_data: str, consume: bool):
+        cached = self._verified.get(init_data)
+        if cached is not None:
+            self._verified.move_to_end(init_data)
+            fields, received, auth_date = cached
+        else:
+            try:
+                fields = _parse_init_data(init_data)
+                received = bytes.fromhex(fields.pop("hash"))
+            except (KeyError, ValueError, AttributeError):
+                return AUTH_MALFORMED, None
+
+            data_check_string = "\n".join([f"{key}={fields[key]}" for key in sorted(fields)])
+            calculated = hmac.digest(self._secret_key, data_check_string.encode(), "sha256")
+            if not hmac.compare_digest(calculated, received):
+                return AUTH_BAD_HASH, None
+
+            auth_date = fields.get("auth_date")
+            auth_date = int(auth_date) if auth_date and auth_date.isdigit() else None
+            if self.max_cached:
+                self._verified[init_data] = (fields, received, auth_date)
+                if len(self._verified) > self.max_cached:
+                    self._verified.popitem(last=False)
+
+        now = time.time()
+        if self.max_age:
+            if auth_date is None:
+                return AUTH_MALFORMED, None
+            if auth_date > now + self.clock_skew or now - auth_date > self.max_age:
+                return AUTH_EXPIRED, None
+
+        if consume:
+            self._forget_expired(now)
+            if received in self._seen:
+                return AUTH_REPLAY, None
+            self._seen[received] = now + (self.max_age or 24 * 60 * 60)
+            if len(self._seen) > self.max_replay_entries:
+                self._seen.popitem(last=False)
+
+        return AUTH_OK, dict(fields)
+
+    def _forget_expired(self, now: float) -> None:
+        seen = self._seen
+        while seen:
+            signature, expires_at = next(iter(seen.items()))
+            if expires_at > now:
+                break
+            del seen[signature]
+
+    def stats(self) -> Dict[str, int]:
+        """Показатели для мониторинга"""
+        return dict(self.results, replay_cache=len(self._seen), verified_cache=len(self._verified))
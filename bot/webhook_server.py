@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Webhook Server
+HTTP сервер бота для приема webhook-запросов (Telegram и др.)
+"""
+
+import hmac
+import json
+import logging
+from typing import Iterable, Optional
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+# Заголовок, в котором Telegram передает secret_token из setWebhook
+TELEGRAM_SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+TELEGRAM_WEBHOOK_PATH = "/webhook/telegram"
+HEALTH_PATH = "/webhook/health"
+
+
+def create_telegram_webhook_handler(application: Application, secret_token: str):
+    """Создает обработчик, который передает обновления Telegram прямо в Application"""
+    expected_secret = secret_token.encode()
+
+    async def telegram_webhook(request: web.Request) -> web.Response:
+        received_secret = request.headers.get(TELEGRAM_SECRET_HEADER, "").encode()
+        if not hmac.compare_digest(received_secret, expected_secret):
+            logger.warning(f"Telegram webhook: неверный secret token от {request.remote}")
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, application.bot)
+        except (json.JSONDecodeError, ValueError, TypeError, KeyError) as e:
+            logger.error(f"Telegram webhook: некорректное обновление: {e}")
+            return web.Response(status=400)
+
+        if update is None:
+            return web.Response(status=400)
+
+        # Обработка идет в Application, Telegram получает ответ сразу
+        await application.update_queue.put(update)
+        return web.Response()
+
+    return telegram_webhook
+
+
+async def health_check(request: web.Request) -> web.Response:
+    """Проверка доступности webhook сервера"""
+    return web.json_response({"status": "ok"})
+
+
+def create_web_app(middlewares: Iterable = ()) -> web.Application:
+    """Создает aiohttp приложение для webhook-маршрутов бота"""
+    web_app = web.Application(middlewares=list(middlewares))
+    web_app.router.add_get(HEALTH_PATH, health_check)
+    return web_app
+
+
+def add_telegram_webhook_route(web_app: web.Application,
+                               application: Application,
+                               secret_token: str,
+                               path: str = TELEGRAM_WEBHOOK_PATH) -> None:
+    """Регистрирует маршрут для обновлений Telegram"""
+    web_app.router.add_post(path, create_telegram_webhook_handler(application, secret_token))
+
+
+async def start_web_server(web_app: web.Application, host: str, port: int) -> web.AppRunner:
+    """Запускает HTTP сервер и возвращает runner для остановки"""
+    runner = web.AppRunner(web_app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f"HTTP сервер запущен на {host}:{port}")
+    return runner
+
+
+def build_webhook_url(base_url: Optional[str], path: str) -> Optional[str]:
+    """Склеивает публичный URL сервера и путь маршрута"""
+    if not base_url:
+        return None
+    return f"{base_url.rstrip('/')}{path}"
@@ -5,21 +5,31 @@ Currency API Server
 """
 
 import os
+import json
 import asyncio
+import hashlib
 import logging
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from aiohttp import web, ClientSession
 from aiohttp.web import middleware
 from dotenv import load_dotenv
 from bot.crypto_pay import init_crypto_pay, crypto_pay_api, currency_converter
+from bot.log_setup import setup_logging
+from bot.metrics import (
+    MetricsRegistry,
+    add_metrics_route,
+    create_http_metrics,
+    metrics_middleware,
+    upstream_observer,
+)
 
 # Загружаем переменные окружения
 load_dotenv()
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+# Настройка логирования: запись в лог идет в фоновом потоке
+setup_logging(
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    log_format=os.getenv('LOG_FORMAT', 'text').lower()
 )
 logger = logging.getLogger(__name__)
 
@@ -27,10 +37,20 @@ logger = logging.getLogger(__name__)
 CRYPTO_PAY_API_TOKEN = os.getenv('CRYPTO_PAY_API_TOKEN')
 CRYPTO_PAY_TESTNET = os.getenv('CRYPTO_PAY_TESTNET', 'true').lower() == 'true'
 API_PORT = int(os.getenv('CURRENCY_API_PORT', '8002'))
+# Время жизни кэша курсов в секундах
+RATES_CACHE_TTL = float(os.getenv('CURRENCY_RATES_TTL', '60'))
+# Период фонового обновления курсов в секундах
+RATES_REFRESH_INTERVAL = float(os.getenv('CURRENCY_RATES_REFRESH_INTERVAL', '30'))
+# Максимум сумм в одном запросе /api/convert/batch
+MAX_BATCH_AMOUNTS = int(os.getenv('CURRENCY_MAX_BATCH_AMOUNTS', '200'))
+# Максимальная сумма конвертации: больше - ответ 400, а не переполнение точности
+MAX_CONVERT_AMOUNT = Decimal(os.getenv('CURRENCY_MAX_AMOUNT', '1000000000'))
+# Фиат /api/convert, если в запросе не указан fiat
+DEFAULT_FIAT = os.getenv('CURRENCY_DEFAULT_FIAT', 'RUB').upper()
 
 # Инициализация Crypto Pay
 if CRYPTO_PAY_API_TOKEN:
-    init_crypto_pay(CRYPTO_PAY_API_TOKEN, CRYPTO_PAY_TESTNET)
+    init_crypto_pay(CRYPTO_PAY_API_TOKEN, CRYPTO_PAY_TESTNET, RATES_CACHE_TTL)
     logger.info("Crypto Pay API инициализирован")
 else:
     logger.warning("CRYPTO_PAY_API_TOKEN не установлен")
@@ -38,6 +58,23 @@ else:
 # Получаем инициализированный конвертер
 from bot.crypto_pay import currency_converter as converter
 
+# Метрики: задержки маршрутов и запросов к Crypto Pay (GET /metrics)
+metrics_registry = MetricsRegistry()
+http_latency, http_responses = create_http_metrics(metrics_registry, "currency_api")
+crypto_pay_latency = metrics_registry.histogram(
+    "currency_api_crypto_pay_request_duration_seconds", "Время запроса к Crypto Pay API", ("method",)
+)
+crypto_pay_errors = metrics_registry.counter(
+    "currency_api_crypto_pay_request_errors_total", "Неудачные запросы к Crypto Pay API", ("method",)
+)
+metrics_registry.gauge(
+    "currency_api_rates_age_seconds", "Возраст кэша курсов",
+    lambda: converter.cache_age if converter else None
+)
+
+if converter:
+    converter.crypto_pay.request_observer = upstream_observer(crypto_pay_latency, crypto_pay_errors)
+
 # CORS middleware
 @middleware
 async def cors_handler(request, handler):
@@ -53,19 +90,20 @@ async def cors_handler(request, handler):
     })
     return response
 
-async def get_crypto_rates(request):
-    """Получает курсы криптовалют к рублю"""
-    try:
-        if not converter:
-            return web.json_response({
-                'success': False,
-                'error': 'Crypto Pay API не инициализирован'
-            }, status=500)
-        
-        # Получаем курсы
-        rates = await converter.get_rates_from_rub()
-        
-        # Форматируем ответ
+class PrebuiltRatesResponse:
+    """Заранее сериализованный ответ /api/rates с ETag"""
+    
+    def __init__(self, max_age: float):
+        self.body: bytes = b''
+        self.etag: str = ''
+        self.cache_control = f"public, max-age={int(max_age)}, stale-while-revalidate={int(max_age)}"
+    
+    @property
+    def ready(self) -> bool:
+        return bool(self.body)
+    
+    def update(self, rates: dict) -> None:
+        """Пересобирает тело ответа; ETag меняется только вместе с курсами"""
         formatted_rates = {}
         for asset, rate in rates.items():
             formatted_rates[asset] = {
@@ -74,10 +112,45 @@ async def get_crypto_rates(request):
                 'name': get_currency_name(asset)
             }
         
-        return web.json_response({
+        body = json.dumps({
             'success': True,
             'rates': formatted_rates
-        })
+        }).encode()
+        
+        if body != self.body:
+            self.body = body
+            self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    
+    def to_response(self, request) -> web.Response:
+        """Отдает готовое тело или 304, если у клиента актуальная версия"""
+        headers = {'ETag': self.etag, 'Cache-Control': self.cache_control}
+        if request.headers.get('If-None-Match') == self.etag:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=self.body, content_type='application/json', headers=headers)
+
+
+rates_response = PrebuiltRatesResponse(RATES_REFRESH_INTERVAL)
+
+async def get_crypto_rates(request):
+    """Получает курсы криптовалют к рублю"""
+    try:
+        if not converter:
+            return web.json_response({
+                'success': False,
+                'error': 'Crypto Pay API не инициализирован'
+            }, status=500)
+        
+        # Обычно ответ уже собран фоновой задачей
+        if not rates_response.ready:
+            rates = await converter.get_rates_from_rub()
+            if not rates:
+                return web.json_response({
+                    'success': False,
+                    'error': 'Курсы временно недоступны'
+                }, status=500)
+            rates_response.update(rates)
+        
+        return rates_response.to_response(request)
         
     except Exception as e:
         logger.error(f"Ошибка получения курсов: {e}")
@@ -86,17 +159,42 @@ async def get_crypto_rates(request):
             'error': str(e)
         }, status=500)
 
-async def convert_rub_to_crypto(request):
-    """Конвертирует рубли в криптовалюты"""
+async def read_json_object(request) -> dict:
+    """Тело запроса как JSON-объект; ValueError с текстом для клиента"""
     try:
         data = await request.json()
-        rub_amount = Decimal(str(data.get('amount', '0')))
-        
-        if rub_amount <= 0:
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        raise ValueError('Тело запроса должно быть JSON-объектом')
+    return data
+
+def parse_convert_amount(value) -> Decimal:
+    """Сумма из запроса; ValueError с текстом для клиента"""
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError('Некорректная сумма')
+    if not amount.is_finite():
+        raise ValueError('Некорректная сумма')
+    if amount <= 0:
+        raise ValueError('Сумма должна быть больше 0')
+    if amount > MAX_CONVERT_AMOUNT:
+        raise ValueError(f'Сумма не должна превышать {MAX_CONVERT_AMOUNT}')
+    return amount
+
+async def convert_rub_to_crypto(request):
+    """Конвертирует сумму в рублях (или в фиате fiat) в криптовалюты"""
+    try:
+        try:
+            data = await read_json_object(request)
+            rub_amount = parse_convert_amount(data.get('amount', '0'))
+        except ValueError as e:
             return web.json_response({
                 'success': False,
-                'error': 'Сумма должна быть больше 0'
+                'error': str(e)
             }, status=400)
+        fiat = str(data.get('fiat') or DEFAULT_FIAT).upper()
         
         if not converter:
             return web.json_response({
@@ -104,8 +202,14 @@ async def convert_rub_to_crypto(request):
                 'error': 'Crypto Pay API не инициализирован'
             }, status=500)
         
-        # Конвертируем
-        conversions = await converter.convert_rub_to_crypto(rub_amount)
+        # Конвертируем по готовой таблице курсов
+        try:
+            conversions = await converter.convert(rub_amount, fiat)
+        except (ValueError, InvalidOperation) as e:
+            return web.json_response({
+                'success': False,
+                'error': str(e)
+            }, status=400)
         
         # Форматируем для отображения
         formatted_conversions = {}
@@ -120,6 +224,7 @@ async def convert_rub_to_crypto(request):
         return web.json_response({
             'success': True,
             'rub_amount': str(rub_amount),
+            'fiat': fiat,
             'conversions': formatted_conversions
         })
         
@@ -130,6 +235,70 @@ async def convert_rub_to_crypto(request):
             'error': str(e)
         }, status=500)
 
+async def convert_rub_batch(request):
+    """Конвертирует список сумм в рублях во все криптовалюты за один запрос"""
+    try:
+        try:
+            data = await read_json_object(request)
+        except ValueError as e:
+            return web.json_response({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+        amounts = data.get('amounts')
+        fiat = str(data.get('fiat') or DEFAULT_FIAT).upper()
+        
+        if not isinstance(amounts, list) or not amounts:
+            return web.json_response({
+                'success': False,
+                'error': 'Передайте непустой список amounts'
+            }, status=400)
+        
+        if len(amounts) > MAX_BATCH_AMOUNTS:
+            return web.json_response({
+                'success': False,
+                'error': f'Не больше {MAX_BATCH_AMOUNTS} сумм за запрос'
+            }, status=400)
+        
+        try:
+            rub_amounts = [parse_convert_amount(amount) for amount in amounts]
+        except ValueError as e:
+            return web.json_response({
+                'success': False,
+                'error': f'Некорректная сумма в списке: {e}'
+            }, status=400)
+        
+        if not converter:
+            return web.json_response({
+                'success': False,
+                'error': 'Crypto Pay API не инициализирован'
+            }, status=500)
+        
+        # Один снимок курсов на весь список
+        try:
+            assets, matrix = await converter.convert_batch(rub_amounts, fiat)
+        except (ValueError, InvalidOperation) as e:
+            return web.json_response({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+        
+        return web.json_response({
+            'success': True,
+            'assets': assets,
+            'names': {asset: get_currency_name(asset) for asset in assets},
+            'fiat': fiat,
+            'rub_amounts': [str(rub_amount) for rub_amount in rub_amounts],
+            'matrix': matrix
+        })
+        
+    except Exception as e:
+        logger.error(f"Ошибка пакетной конвертации: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
 def get_currency_name(asset: str) -> str:
     """Возвращает человекочитаемое название криптовалюты"""
     names = {
@@ -151,14 +320,53 @@ async def health_check(request):
         'crypto_pay_enabled': converter is not None
     })
 
+async def start_crypto_pay_session(app):
+    """Открывает общую сессию Crypto Pay при старте сервера"""
+    if converter:
+        await converter.crypto_pay.start()
+
+async def close_crypto_pay_session(app):
+    """Закрывает сессию Crypto Pay при остановке сервера"""
+    if converter:
+        await converter.crypto_pay.close()
+
+async def refresh_rates_periodically():
+    """Обновляет курсы и пересобирает ответ /api/rates по расписанию"""
+    while True:
+        try:
+            rates = await converter.refresh_rates()
+            if rates:
+                rates_response.update(rates)
+        except Exception as e:
+            logger.error(f"Ошибка фонового обновления курсов: {e}")
+        await asyncio.sleep(RATES_REFRESH_INTERVAL)
+
+async def rates_refresher(app):
+    """Фоновая задача обновления курсов на время жизни сервера"""
+    task = None
+    if converter:
+        task = asyncio.create_task(refresh_rates_periodically())
+    yield
+    if task:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
 def create_app():
     """Создает приложение aiohttp"""
-    app = web.Application(middlewares=[cors_handler])
+    app = web.Application(middlewares=[metrics_middleware(http_latency, http_responses), cors_handler])
+    app.on_startup.append(start_crypto_pay_session)
+    app.on_cleanup.append(close_crypto_pay_session)
+    app.cleanup_ctx.append(rates_refresher)
     
     # Маршруты
     app.router.add_get('/api/rates', get_crypto_rates)
     app.router.add_post('/api/convert', convert_rub_to_crypto)
+    app.router.add_post('/api/convert/batch', convert_rub_batch)
     app.router.add_get('/health', health_check)
+    add_metrics_route(app, metrics_registry)
     
     return app
 
@@ -176,7 +384,9 @@ async def main():
     logger.info(f"Доступные эндпойнты:")
     logger.info(f"  GET  http://localhost:{API_PORT}/api/rates")
     logger.info(f"  POST http://localhost:{API_PORT}/api/convert")
+    logger.info(f"  POST http://localhost:{API_PORT}/api/convert/batch")
     logger.info(f"  GET  http://localhost:{API_PORT}/health")
+    logger.info(f"  GET  http://localhost:{API_PORT}/metrics")
     
     # Держим сервер запущенным
     try:
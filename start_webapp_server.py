@@ -1,14 +1,34 @@
 #!/usr/bin/env python3
 """
 Простий HTTP сервер для WebApp
-Запускає локальний сервер на порту 8000 для папки webapp
+Запускає локальний асинхронний сервер на порту 8000 для папки webapp:
+файли тримаються в пам'яті вже стиснутими (gzip, brotli - якщо встановлений),
+відповіді мають сильні ETag, версіоновані ресурси кешуються назавжди.
+Курс і комісія вбудовуються в index.html із загального стану бота
+(STATE_BACKEND=sqlite:...) і оновлюються одразу після /setrate
 """
 
-import http.server
-import socketserver
 import os
-import webbrowser
+import re
+import sys
+import gzip
+import json
+import asyncio
+import hashlib
+import argparse
+import mimetypes
 from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from bot.state_backend import PRICING_STATE_KEY, StateBackend, StateEntry, create_state_backend
+
+try:
+    import brotli
+except ImportError:  # brotli необов'язковий: без нього віддаємо gzip
+    brotli = None
 
 # Порт для сервера
 PORT = 8000
@@ -16,56 +36,308 @@ PORT = 8000
 # Шлях до папки webapp
 WEBAPP_DIR = Path(__file__).parent / "webapp"
 
-class WebAppHandler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=WEBAPP_DIR, **kwargs)
-    
-    def end_headers(self):
-        # Додаємо CORS заголовки для Telegram WebApp
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        super().end_headers()
+# Менші файли не стискаємо: заголовки gzip з'їдають виграш
+MIN_COMPRESS_SIZE = 256
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+# Кеш для ресурсів, запитаних з актуальним ?v=<версія>
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+CORS_HEADERS = {
+    # CORS заголовки для Telegram WebApp
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type',
+}
+
+# Посилання на локальні файли в HTML: src="config.js", href="style.css"
+_LOCAL_REF = re.compile(r'(\b(?:src|href)=")([^":?#]+)(")')
+
+# Конфіг сторінки вставляється перед </head>: після config.js, до скриптів сторінки
+_HEAD_END = "</head>"
+
+
+class StaticFile:
+    """Файл у пам'яті: вміст, стиснуті варіанти та їхні ETag"""
+
+    __slots__ = ("name", "content_type", "version", "mtime", "variants")
+
+    def __init__(self, name: str, body: bytes, mtime: float):
+        self.name = name
+        self.mtime = mtime
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        self.content_type = content_type
+        # Версія - хеш вмісту: змінюється разом з файлом
+        self.version = hashlib.sha256(body).hexdigest()[:16]
+        # кодування -> (тіло, ETag); для кожного кодування свій сильний ETag
+        self.variants: Dict[str, Tuple[bytes, str]] = {"identity": (body, f'"{self.version}"')}
+        if len(body) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.variants["gzip"] = (compressed, f'"{self.version}-gz"')
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.variants["br"] = (compressed, f'"{self.version}-br"')
+
+    def negotiate(self, accept_encoding: str) -> Tuple[str, bytes, str]:
+        """Найкращий варіант для Accept-Encoding: (кодування, тіло, ETag)"""
+        if len(self.variants) > 1 and accept_encoding:
+            accepted = _accepted_encodings(accept_encoding)
+            for encoding in ("br", "gzip"):
+                if encoding in self.variants and encoding in accepted:
+                    return (encoding,) + self.variants[encoding]
+        return ("identity",) + self.variants["identity"]
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for item in header.split(","):
+        encoding, _, params = item.strip().partition(";")
+        params = params.replace(" ", "")
+        if params in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class StaticSite:
+    """
+    Усі файли папки в пам'яті. У HTML посилання на локальні файли
+    переписуються на name?v=<версія>, тому такі файли можна кешувати
+    назавжди: після зміни файлу зміниться і посилання
+    """
+
+    def __init__(self, directory: Path, page_config: Optional[Dict[str, Any]] = None):
+        self.directory = Path(directory)
+        self.files: Dict[str, StaticFile] = {}
+        # Конфіг, що вбудовується в кожну HTML сторінку як window.WEBAPP_CONFIG
+        self.page_config = page_config
+        # HTML з версіонованими посиланнями, але без конфігу: (тіло, mtime)
+        self._html: Dict[str, Tuple[bytes, float]] = {}
+
+    def _scan(self) -> Dict[str, float]:
+        return {
+            path.relative_to(self.directory).as_posix(): path.stat().st_mtime
+            for path in self.directory.rglob("*")
+            if path.is_file() and not path.name.startswith(".")
+        }
+
+    def load(self) -> None:
+        """Читає та стискає всі файли; нові дані підміняються одним присвоєнням"""
+        mtimes = self._scan()
+        raw = {name: (self.directory / name).read_bytes() for name in mtimes}
+        files = {}
+        html = {}
+        # Спочатку файли без HTML: версії потрібні для посилань у HTML
+        for name in sorted(raw, key=lambda item: item.endswith(".html")):
+            body = raw[name]
+            if name.endswith(".html"):
+                html[name] = (self._version_links(body, files), mtimes[name])
+                body = self._inject_config(html[name][0])
+            files[name] = StaticFile(name, body, mtimes[name])
+        self._html = html
+        self.files = files
+
+    def set_page_config(self, page_config: Dict[str, Any]) -> None:
+        """
+        Перебудовує HTML з новим конфігом. Сторінки стискаються один раз на
+        версію конфігу; новий ETag змушує браузер забрати свіжу сторінку
+        """
+        if page_config == self.page_config:
+            return
+        self.page_config = page_config
+        files = dict(self.files)
+        for name, (body, mtime) in self._html.items():
+            files[name] = StaticFile(name, self._inject_config(body), mtime)
+        self.files = files
+
+    def _inject_config(self, body: bytes) -> bytes:
+        if self.page_config is None:
+            return body
+        # "<" екранується, щоб значення не могли закрити тег <script>
+        config = json.dumps(self.page_config, ensure_ascii=False).replace("<", "\\u003c")
+        script = (f"<script>window.WEBAPP_CONFIG = "
+                  f"Object.assign({{}}, window.WEBAPP_CONFIG, {config});</script>\n")
+        html = body.decode("utf-8")
+        position = html.find(_HEAD_END)
+        if position < 0:
+            return body
+        return (html[:position] + script + html[position:]).encode("utf-8")
+
+    def _version_links(self, body: bytes, files: Dict[str, StaticFile]) -> bytes:
+        def replace(match):
+            static_file = files.get(match.group(2).removeprefix("./"))
+            if static_file is None:
+                return match.group(0)
+            return f"{match.group(1)}{match.group(2)}?v={static_file.version}{match.group(3)}"
+
+        return _LOCAL_REF.sub(replace, body.decode("utf-8")).encode("utf-8")
+
+    def changed(self) -> bool:
+        """Чи змінився набір файлів або час їх зміни"""
+        mtimes = self._scan()
+        return mtimes != {name: static_file.mtime for name, static_file in self.files.items()}
+
+    def get(self, path: str) -> Optional[StaticFile]:
+        path = path.strip("/")
+        if not path:
+            return self.files.get("index.html")
+        return self.files.get(path) or self.files.get(f"{path}/index.html")
+
+
+def create_webapp_app(site: StaticSite) -> web.Application:
+    """aiohttp застосунок, що віддає файли site"""
+
+    async def handle(request: web.Request) -> web.StreamResponse:
+        static_file = site.get(request.path)
+        if static_file is None:
+            return web.Response(status=404, text="Not Found", headers=CORS_HEADERS)
+
+        encoding, body, etag = static_file.negotiate(request.headers.get("Accept-Encoding", ""))
+        headers = {
+            "ETag": etag,
+            "Vary": "Accept-Encoding",
+            "Cache-Control": IMMUTABLE_CACHE if request.query.get("v") == static_file.version else "no-cache",
+            **CORS_HEADERS,
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in if_none_match):
+            return web.Response(status=304, headers=headers)
+
+        headers["Content-Type"] = static_file.content_type
+        # Для HEAD aiohttp сам не відправляє тіло
+        return web.Response(body=body, headers=headers)
+
+    async def handle_options(request: web.Request) -> web.Response:
+        return web.Response(status=204, headers=CORS_HEADERS)
+
+    app = web.Application()
+    app.router.add_get("/{path:.*}", handle)
+    app.router.add_route("OPTIONS", "/{path:.*}", handle_options)
+    return app
+
+
+async def watch_files(site: StaticSite, interval: float = 1.0) -> None:
+    """Перечитує файли, коли вони змінюються на диску"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if site.changed():
+                site.load()
+                print(f"🔄 Файли WebApp перечитано ({len(site.files)})")
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"❌ Помилка перечитування: {e}")
+
+
+def pricing_config(usdt_rate: Any, commission_percent: Any, version: Optional[int] = None) -> Dict[str, Any]:
+    """Конфіг WebApp з курсу та комісії (у загальному стані вони зберігаються рядками)"""
+    config = {"usdtRate": float(usdt_rate), "commissionPercent": float(commission_percent)}
+    if version is not None:
+        config["pricingVersion"] = version
+    return config
+
+
+async def follow_pricing(site: StaticSite, state_backend: StateBackend) -> None:
+    """Підписує site на зміни цін у загальному стані бота"""
+
+    def on_change(entry: StateEntry) -> None:
+        if entry.key != PRICING_STATE_KEY:
+            return
+        site.set_page_config(pricing_config(
+            entry.value["usdt_rate"], entry.value["commission_percent"], entry.version
+        ))
+        print(f"💱 Ціни v{entry.version}: 1 USDT = {entry.value['usdt_rate']} РУБ, "
+              f"комісія {entry.value['commission_percent']}%")
+
+    state_backend.subscribe(on_change)
+    # Поки бот не записав ціни, діють USDT_RATE і COMMISSION_PERCENT
+    await state_backend.get(PRICING_STATE_KEY)
+    await state_backend.start()
+
+
+async def serve(site: StaticSite, host: str, port: int, reload: bool,
+                state_backend: Optional[StateBackend] = None) -> None:
+    if state_backend is not None:
+        await follow_pricing(site, state_backend)
+    runner = web.AppRunner(create_webapp_app(site), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    watcher = asyncio.create_task(watch_files(site)) if reload else None
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if watcher:
+            watcher.cancel()
+        await runner.cleanup()
+        if state_backend is not None:
+            await state_backend.stop()
+
 
 def main():
-    print(f"🌐 Запуск HTTP сервера для WebApp...")
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="HTTP сервер для WebApp")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--reload", action="store_true", help="перечитувати файли при зміні")
+    parser.add_argument("--state", default=os.getenv("STATE_BACKEND", "memory"),
+                        help="загальний стан бота для курсу та комісії: sqlite:шлях_до_файлу")
+    args = parser.parse_args()
+
+    print("🌐 Запуск HTTP сервера для WebApp...")
     print(f"📁 Директорія: {WEBAPP_DIR}")
-    print(f"🔗 Локальний URL: http://localhost:{PORT}")
-    print(f"📱 Для Telegram потрібен HTTPS URL від ngrok!")
-    print(f"⚡ Запусти ngrok в іншому терміналі: ngrok http {PORT}")
-    print(f"❌ Для зупинки: Ctrl+C")
+    print(f"🔗 Локальний URL: http://localhost:{args.port}")
+    print("📱 Для Telegram потрібен HTTPS URL від ngrok!")
+    print(f"⚡ Запусти ngrok в іншому терміналі: ngrok http {args.port}")
+    print("❌ Для зупинки: Ctrl+C")
     print("-" * 50)
-    
+
     # Перевіряємо чи існує папка webapp
     if not WEBAPP_DIR.exists():
         print(f"❌ Помилка: папка {WEBAPP_DIR} не знайдена!")
         return
-    
+
     # Перевіряємо чи існує index.html
     index_file = WEBAPP_DIR / "index.html"
     if not index_file.exists():
         print(f"❌ Помилка: файл {index_file} не знайдений!")
         return
-    
+
+    # Стан у пам'яті належить процесу бота, тому тут ціни лише з .env
+    state_backend = create_state_backend(args.state) if args.state != "memory" else None
+    site = StaticSite(WEBAPP_DIR, pricing_config(os.getenv("USDT_RATE", "95.0"),
+                                                 os.getenv("COMMISSION_PERCENT", "15.0")))
+    site.load()
+    print(f"✅ Сервер запущено на http://localhost:{args.port}")
+    print(f"📄 Доступні файли в {WEBAPP_DIR}:")
+    for static_file in site.files.values():
+        sizes = ", ".join(f"{encoding} {len(body)} B" for encoding, (body, _) in static_file.variants.items())
+        print(f"   - {static_file.name} ({sizes})")
+    if brotli is None:
+        print("💡 pip install brotli - для стиснення brotli")
+    if args.reload:
+        print("🔄 Файли перечитуються при зміні")
+    if state_backend is None:
+        print("💡 STATE_BACKEND=sqlite:... - курс і комісія зі стану бота, без перезапуску")
+    print()
+
     try:
-        with socketserver.TCPServer(("", PORT), WebAppHandler) as httpd:
-            print(f"✅ Сервер запущено на http://localhost:{PORT}")
-            print(f"📄 Доступні файли в {WEBAPP_DIR}:")
-            for file in WEBAPP_DIR.iterdir():
-                if file.is_file():
-                    print(f"   - {file.name}")
-            print()
-            
-            httpd.serve_forever()
-            
+        asyncio.run(serve(site, args.host, args.port, args.reload, state_backend))
     except KeyboardInterrupt:
         print("\n🛑 Сервер зупинено")
     except OSError as e:
-        if e.errno == 10048:  # Port already in use
-            print(f"❌ Порт {PORT} вже використовується!")
-            print(f"💡 Спробуй інший порт або зупини процес на порту {PORT}")
+        if e.errno in (48, 98, 10048):  # Port already in use
+            print(f"❌ Порт {args.port} вже використовується!")
+            print(f"💡 Спробуй інший порт або зупини процес на порту {args.port}")
         else:
             print(f"❌ Помилка: {e}")
+            sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Тесты проверки initData Telegram WebApp (bot/webapp_auth.py)
+
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import sys
+import hmac
+import time
+import hashlib
+import unittest
+from pathlib import Path
+from urllib.parse import urlencode
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "bot"))
+
+from webapp_auth import AUTH_BAD_HASH, AUTH_EXPIRED, AUTH_OK, AUTH_REPLAY, WebAppDataVerifier
+
+BOT_TOKEN = "123456:TEST-TOKEN"
+USER = '{"id":279058397,"first_name":"Vladislav","username":"vdkfrost","language_code":"ru"}'
+
+
+def sign(fields: dict, bot_token: str = BOT_TOKEN) -> str:
+    """Строка initData с подписью по документации Telegram"""
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    signed = dict(fields, hash=hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest())
+    return urlencode(signed)
+
+
+def make_fields(auth_date: float = None) -> dict:
+    return {
+        "query_id": "AAHdF6IQAAAAAN0XohDhrOrc",
+        "user": USER,
+        "auth_date": str(int(time.time() if auth_date is None else auth_date)),
+    }
+
+
+class WebAppDataVerifierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.verifier = WebAppDataVerifier(BOT_TOKEN, max_age=3600)
+
+    def test_valid_hash(self):
+        fields = make_fields()
+        result, verified = self.verifier.check(sign(fields))
+        self.assertEqual(result, AUTH_OK)
+        self.assertEqual(verified, fields)
+
+    def test_valid_hash_cached(self):
+        init_data = sign(make_fields())
+        self.assertIsNotNone(self.verifier.verify(init_data))
+        self.assertIsNotNone(self.verifier.verify(init_data))
+        self.assertEqual(self.verifier.stats()["verified_cache"], 1)
+
+    def test_other_token(self):
+        init_data = sign(make_fields(), bot_token="654321:OTHER-TOKEN")
+        self.assertEqual(self.verifier.check(init_data), (AUTH_BAD_HASH, None))
+
+    def test_tampered_field(self):
+        init_data = sign(make_fields())
+        tampered = init_data.replace("vdkfrost", "attacker")
+        self.assertNotEqual(tampered, init_data)
+        self.assertEqual(self.verifier.check(tampered), (AUTH_BAD_HASH, None))
+
+    def test_tampered_field_after_cached(self):
+        # Кэш проверенных строк не должен пропускать измененную копию
+        init_data = sign(make_fields())
+        self.assertIsNotNone(self.verifier.verify(init_data))
+        tampered = init_data.replace("Vladislav", "Mallory")
+        self.assertEqual(self.verifier.check(tampered), (AUTH_BAD_HASH, None))
+
+    def test_expired_auth_date(self):
+        init_data = sign(make_fields(auth_date=time.time() - 2 * 3600))
+        self.assertEqual(self.verifier.check(init_data), (AUTH_EXPIRED, None))
+
+    def test_future_auth_date(self):
+        init_data = sign(make_fields(auth_date=time.time() + 3600))
+        self.assertEqual(self.verifier.check(init_data), (AUTH_EXPIRED, None))
+
+    def test_expired_after_cached(self):
+        # Свежесть проверяется и для строк из кэша
+        auth_date = time.time() - 3000
+        init_data = sign(make_fields(auth_date=auth_date))
+        self.assertIsNotNone(self.verifier.verify(init_data))
+        self.verifier.max_age = 600
+        self.assertEqual(self.verifier.check(init_data), (AUTH_EXPIRED, None))
+
+    def test_replayed_payload(self):
+        init_data = sign(make_fields())
+        self.assertEqual(self.verifier.check(init_data, consume=True)[0], AUTH_OK)
+        self.assertEqual(self.verifier.check(init_data, consume=True), (AUTH_REPLAY, None))
+        self.assertEqual(self.verifier.stats()[AUTH_REPLAY], 1)
+
+    def test_replay_without_cache(self):
+        verifier = WebAppDataVerifier(BOT_TOKEN, max_age=3600, max_cached=0)
+        init_data = sign(make_fields())
+        self.assertEqual(verifier.check(init_data, consume=True)[0], AUTH_OK)
+        self.assertEqual(verifier.check(init_data, consume=True), (AUTH_REPLAY, None))
+
+    def test_check_without_consume_is_not_replay(self):
+        init_data = sign(make_fields())
+        self.assertEqual(self.verifier.check(init_data)[0], AUTH_OK)
+        self.assertEqual(self.verifier.check(init_data, consume=True)[0], AUTH_OK)
+
+
+if __name__ == "__main__":
+    unittest.main()
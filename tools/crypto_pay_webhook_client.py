@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Crypto Pay Webhook Client
+Отправляет подписанные webhook-запросы Crypto Pay в бота.
+
+    python tools/crypto_pay_webhook_client.py send --invoice-id 1
+        отправить invoice_paid в запущенного бота (токен из CRYPTO_PAY_API_TOKEN)
+
+    python tools/crypto_pay_webhook_client.py scenario
+        полностью локальная проверка: заглушки Telegram и Crypto Pay,
+        заказ -> принятие -> подписанный webhook, повтор и поддельная подпись;
+        код выхода 1, если хоть одна проверка не прошла
+"""
+
+import os
+import sys
+import json
+import hmac
+import time
+import asyncio
+import hashlib
+import argparse
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from aiohttp import ClientSession
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "tools"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+sys.path.insert(0, str(ROOT / "bot"))
+
+DEFAULT_URL = "http://127.0.0.1:8003/webhook/crypto-pay"
+FAKE_CRYPTO_PAY_TOKEN = "1234:FAKE-CRYPTO-PAY-TOKEN"
+
+
+def sign(body: bytes, api_token: str) -> str:
+    """Подпись Crypto Pay: HMAC-SHA256(body) с ключом SHA256(token)"""
+    secret = hashlib.sha256(api_token.encode()).digest()
+    return hmac.new(secret, body, hashlib.sha256).hexdigest()
+
+
+def invoice_paid_update(update_id: int, invoice_id: int, payload: str = "", amount: str = "1150.00") -> Dict:
+    return {
+        "update_id": update_id,
+        "update_type": "invoice_paid",
+        "request_date": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+        "payload": {
+            "invoice_id": invoice_id,
+            "status": "paid",
+            "currency_type": "fiat",
+            "fiat": "RUB",
+            "amount": amount,
+            "paid_asset": "USDT",
+            "paid_amount": "12.09",
+            "payload": payload,
+        },
+    }
+
+
+async def post_update(session: ClientSession, url: str, update: Dict, api_token: str) -> Tuple[int, str]:
+    body = json.dumps(update).encode()
+    headers = {"Content-Type": "application/json", "crypto-pay-api-signature": sign(body, api_token)}
+    async with session.post(url, data=body, headers=headers) as response:
+        return response.status, await response.text()
+
+
+async def run_send(args: argparse.Namespace) -> None:
+    api_token = args.token or os.getenv("CRYPTO_PAY_API_TOKEN", "")
+    if not api_token:
+        print("❌ Укажите --token или CRYPTO_PAY_API_TOKEN")
+        return
+    if args.bad_signature:
+        api_token += "-wrong"
+
+    update = invoice_paid_update(args.update_id or int(time.time()), args.invoice_id, args.payload)
+    async with ClientSession() as session:
+        for _ in range(args.repeat):
+            status, text = await post_update(session, args.url, update, api_token)
+            print(f"update {update['update_id']}: HTTP {status} {text}")
+
+
+class ScenarioChecks:
+    """Проверки сценария: печатает каждую и запоминает проваленные"""
+
+    def __init__(self):
+        self.failed: List[str] = []
+
+    def check(self, ok: bool, label: str, details: str = "") -> None:
+        print(f"{'✅' if ok else '❌'} {label}" + (f": {details}" if details else ""))
+        if not ok:
+            self.failed.append(label)
+
+
+async def run_scenario(port: int) -> bool:
+    """Полный сценарий против заглушек; True - все проверки прошли"""
+    os.environ["CRYPTO_PAY_API_TOKEN"] = FAKE_CRYPTO_PAY_TOKEN
+    from fake_telegram import UpdateFactory, import_bot, start_fake_bot_api
+    from fake_crypto_pay import start_fake_crypto_pay
+    from order_machine import TRANSITION_APPLIED
+    from order_store import ORDER_ACCEPTED, ORDER_PAID
+    from telegram import Update
+    from telegram.ext import Application
+
+    bot = import_bot(ORDERS_DB_PATH=":memory:")
+    fake_telegram, telegram_runner, telegram_url = await start_fake_bot_api()
+    fake_crypto_pay, crypto_pay_runner, crypto_pay_url = await start_fake_crypto_pay()
+    bot.crypto_pay_api.base_url = crypto_pay_url
+
+    application = bot.build_application(Application.builder().token(bot.BOT_TOKEN).base_url(telegram_url))
+    web_app = bot.create_web_app()
+    bot.crypto_pay_webhook.add_routes(web_app)
+    url = f"http://127.0.0.1:{port}{bot.CRYPTO_PAY_WEBHOOK_PATH}"
+
+    updates = UpdateFactory()
+    admin_message = {"message_id": 1, "date": 0, "chat": {"id": int(bot.ADMIN_CHAT_ID), "type": "private"}, "text": ""}
+
+    checks = ScenarioChecks()
+
+    async with application:
+        await application.start()
+        web_runner = await bot.start_web_server(web_app, "127.0.0.1", port)
+        try:
+            await application.process_update(Update.de_json(updates.web_app_data(42, "steam_user", "1000"), application.bot))
+            order = await bot.order_store.get_order(1)
+            # Кнопка "Принять" с подписанными callback_data, как в карточке заказа
+            accept_data = bot.callback_codec.encode(bot.ACTION_ACCEPT, order)
+            await application.process_update(Update.de_json(
+                updates.callback(int(bot.ADMIN_CHAT_ID), int(bot.ADMIN_CHAT_ID), accept_data, admin_message),
+                application.bot
+            ))
+            order = await bot.order_store.get_order(1)
+            checks.check(
+                order is not None and order.status == ORDER_ACCEPTED and order.invoice_id is not None,
+                "заказ принят, инвойс создан",
+                f"{order.status}, инвойс {order.invoice_id}" if order else "заказа нет"
+            )
+            if order is None or order.invoice_id is None:
+                return False
+
+            update = invoice_paid_update(1001, order.invoice_id, str(order.id), str(order.total_rub))
+            async with ClientSession() as session:
+                status, text = await post_update(session, url, update, FAKE_CRYPTO_PAY_TOKEN + "-wrong")
+                checks.check(status == 401, "поддельная подпись отклонена", f"HTTP {status}")
+
+                status, text = await post_update(session, url, update, FAKE_CRYPTO_PAY_TOKEN)
+                checks.check(status == 200, "invoice_paid принят", f"HTTP {status} {text}")
+                # stop() дообрабатывает очередь; следующее событие снова запустит воркеры
+                await bot.crypto_pay_webhook.stop()
+                await bot.message_dispatcher.stop()
+                paid = await bot.order_store.get_order(order.id)
+                applied = bot.order_machine.results[TRANSITION_APPLIED]
+                sent = len(fake_telegram.calls)
+
+                status, text = await post_update(session, url, update, FAKE_CRYPTO_PAY_TOKEN)
+                checks.check(status == 200, "повтор принят", f"HTTP {status} {text}")
+
+            await bot.crypto_pay_webhook.stop()
+            await bot.message_dispatcher.stop()
+            order = await bot.order_store.get_order(1)
+            checks.check(
+                bot.order_machine.results[TRANSITION_APPLIED] == applied and order.updated_at == paid.updated_at,
+                "повтор не меняет статус"
+            )
+            repeated = [method for method, _ in fake_telegram.calls[sent:]]
+            checks.check(not repeated, "повтор без уведомлений", ", ".join(repeated))
+            checks.check(order.status == ORDER_PAID, "заказ оплачен", order.status)
+        finally:
+            await web_runner.cleanup()
+            await application.stop()
+            await bot.order_store.close()
+            await bot.crypto_pay_api.close()
+            await telegram_runner.cleanup()
+            await crypto_pay_runner.cleanup()
+
+    for method, params in fake_telegram.calls:
+        if method == "sendMessage":
+            first_line = str(params.get("text", "")).splitlines()[0]
+            print(f"{method} -> {params.get('chat_id')}: {first_line}")
+
+    if checks.failed:
+        print(f"❌ Не прошли проверки: {', '.join(checks.failed)}")
+    return not checks.failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Подписанные webhook-запросы Crypto Pay")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    send = commands.add_parser("send", help="отправить invoice_paid в запущенного бота")
+    send.add_argument("--url", default=DEFAULT_URL)
+    send.add_argument("--token", help="CRYPTO_PAY_API_TOKEN бота")
+    send.add_argument("--invoice-id", type=int, required=True)
+    send.add_argument("--payload", default="", help="payload инвойса (ID заказа)")
+    send.add_argument("--update-id", type=int)
+    send.add_argument("--repeat", type=int, default=1, help="сколько раз отправить одно и то же событие")
+    send.add_argument("--bad-signature", action="store_true")
+
+    scenario = commands.add_parser("scenario", help="локальная проверка против заглушек")
+    scenario.add_argument("--port", type=int, default=8084)
+
+    args = parser.parse_args()
+    if args.command == "send":
+        asyncio.run(run_send(args))
+    else:
+        sys.exit(0 if asyncio.run(run_scenario(args.port)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Fake Telegram
+Локальная заглушка Telegram Bot API и генератор обновлений.
+Позволяет проверить бота без доступа к api.telegram.org:
+
+    python tools/fake_telegram.py
+
+запускает бота в режиме webhook против заглушки, отправляет в webhook
+несколько обновлений и печатает ответы бота.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import itertools
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import ClientSession, web
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "bot"))
+
+FAKE_BOT_TOKEN = "123456:FAKE-TOKEN"
+FAKE_ADMIN_CHAT_ID = "1000"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Fake Bot", "username": "fake_bot"}
+
+# Методы, в которых заглушка может имитировать сбой Telegram
+FAILING_METHODS = ("sendMessage", "editMessageText", "answerCallbackQuery")
+
+
+class FakeBotAPI:
+    """Заглушка Bot API: записывает вызовы и отвечает как Telegram"""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        # Искусственная задержка ответа (секунды)
+        self.latency = latency
+        # Доля вызовов FAILING_METHODS, на которые отвечаем 502 Bad Gateway
+        self.error_rate = error_rate
+        self.injected_errors: Dict[str, int] = {}
+        self._random = random.Random()
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+        self.updates: asyncio.Queue = asyncio.Queue()
+        self.webhook_url = ""
+        self.listeners: List[Any] = []
+        self._message_ids = itertools.count(1)
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await self._read_params(request)
+        if self.latency and method not in ("getUpdates", "getMe"):
+            await asyncio.sleep(self.latency)
+
+        handler = getattr(self, f"api_{method}", None)
+        if handler is None:
+            return web.json_response({"ok": False, "error_code": 404, "description": "Not Found"})
+        if self.error_rate and method in FAILING_METHODS and self._random.random() < self.error_rate:
+            self.injected_errors[method] = self.injected_errors.get(method, 0) + 1
+            return web.json_response({"ok": False, "error_code": 502, "description": "Bad Gateway"}, status=502)
+
+        result = await handler(params)
+        self.calls.append((method, params))
+        for listener in self.listeners:
+            listener(method, params, result)
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    async def _read_params(request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        params = {}
+        for key, value in (await request.post()).items():
+            # PTB передает сложные параметры строками JSON
+            try:
+                params[key] = json.loads(value)
+            except (TypeError, ValueError):
+                params[key] = value
+        return params
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = int(params.get("chat_id", 0))
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+        # Telegram возвращает в сообщении только inline-клавиатуру
+        reply_markup = params.get("reply_markup")
+        if isinstance(reply_markup, dict) and "inline_keyboard" in reply_markup:
+            message["reply_markup"] = reply_markup
+        return message
+
+    async def api_getMe(self, params: Dict) -> Dict:
+        return BOT_USER
+
+    async def api_setWebhook(self, params: Dict) -> bool:
+        self.webhook_url = params.get("url", "")
+        return True
+
+    async def api_deleteWebhook(self, params: Dict) -> bool:
+        self.webhook_url = ""
+        return True
+
+    async def api_getUpdates(self, params: Dict) -> List[Dict]:
+        timeout = float(params.get("timeout") or 0)
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self.updates.get(), timeout=max(timeout, 0.01)))
+        except asyncio.TimeoutError:
+            return []
+        while not self.updates.empty() and len(updates) < 100:
+            updates.append(self.updates.get_nowait())
+        return updates
+
+    async def api_sendMessage(self, params: Dict) -> Dict:
+        return self._message(params)
+
+    async def api_editMessageText(self, params: Dict) -> Dict:
+        # Отредактированное сообщение сохраняет свой message_id
+        message = self._message(params)
+        if "message_id" in params:
+            message["message_id"] = int(params["message_id"])
+        return message
+
+    async def api_answerCallbackQuery(self, params: Dict) -> bool:
+        return True
+
+
+class UpdateFactory:
+    """Генератор обновлений в формате Telegram"""
+
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def _user(self, user_id: int) -> Dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+    def _message(self, user_id: int, chat_id: int, **fields) -> Dict:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "from": self._user(user_id),
+        }
+        message.update(fields)
+        return message
+
+    def command(self, user_id: int, command: str, *args: str) -> Dict:
+        text = " ".join((f"/{command}",) + args)
+        return {
+            "update_id": next(self._update_ids),
+            "message": self._message(
+                user_id, user_id, text=text,
+                entities=[{"type": "bot_command", "offset": 0, "length": len(command) + 1}]
+            ),
+        }
+
+    def web_app_data(self, user_id: int, login: str, amount: str) -> Dict:
+        data = json.dumps({"login": login, "amount": amount}, ensure_ascii=False)
+        return {
+            "update_id": next(self._update_ids),
+            "message": self._message(
+                user_id, user_id,
+                web_app_data={"data": data, "button_text": "💰 Оформить пополнение"}
+            ),
+        }
+
+    def callback(self, admin_id: int, chat_id: int, data: str, message: Optional[Dict] = None) -> Dict:
+        if message is None:
+            message = self._message(admin_id, chat_id, text="")
+        return {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._update_ids)),
+                "from": self._user(admin_id),
+                "chat_instance": str(chat_id),
+                "message": message,
+                "data": data,
+            },
+        }
+
+
+async def start_fake_bot_api(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                             error_rate: float = 0.0) -> Tuple[FakeBotAPI, web.AppRunner, str]:
+    """Запускает заглушку Bot API и возвращает (заглушка, runner, base_url для PTB)"""
+    fake = FakeBotAPI(latency=latency, error_rate=error_rate)
+    runner = web.AppRunner(fake.create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = runner.addresses[0][1]
+    return fake, runner, f"http://{host}:{bound_port}/bot"
+
+
+def import_bot(**env: str):
+    """Импортирует bot.py с тестовыми переменными окружения"""
+    os.environ.setdefault("BOT_TOKEN", FAKE_BOT_TOKEN)
+    os.environ.setdefault("ADMIN_CHAT_ID", FAKE_ADMIN_CHAT_ID)
+    os.environ.setdefault("WEBAPP_URL", "https://example.com/webapp/")
+    for key, value in env.items():
+        os.environ[key] = value
+    import bot
+    return bot
+
+
+async def run_webhook_scenario(port: int) -> None:
+    """Прогоняет несколько обновлений через webhook бота"""
+    bot = import_bot()
+    from telegram.ext import Application
+    from webhook_server import TELEGRAM_SECRET_HEADER, TELEGRAM_WEBHOOK_PATH
+
+    fake, api_runner, base_url = await start_fake_bot_api()
+    application = bot.build_application(Application.builder().token(bot.BOT_TOKEN).base_url(base_url))
+
+    web_app = bot.create_web_app()
+    bot.add_telegram_webhook_route(web_app, application, bot.TELEGRAM_WEBHOOK_SECRET)
+
+    updates = UpdateFactory()
+    webhook_url = f"http://127.0.0.1:{port}{TELEGRAM_WEBHOOK_PATH}"
+
+    async with application:
+        await application.start()
+        web_runner = await bot.start_web_server(web_app, "127.0.0.1", port)
+        try:
+            async with ClientSession() as session:
+                async with session.post(webhook_url, json=updates.command(42, "start")) as response:
+                    print(f"без secret token: HTTP {response.status}")
+
+                headers = {TELEGRAM_SECRET_HEADER: bot.TELEGRAM_WEBHOOK_SECRET}
+                for update in (updates.command(42, "start"), updates.web_app_data(42, "steam_user", "1000")):
+                    async with session.post(webhook_url, json=update, headers=headers) as response:
+                        print(f"update {update['update_id']}: HTTP {response.status}")
+
+            await asyncio.sleep(0.5)
+        finally:
+            await web_runner.cleanup()
+            await application.stop()
+            await api_runner.cleanup()
+
+    for method, params in fake.calls:
+        if method == "sendMessage":
+            first_line = str(params.get("text", "")).splitlines()[0]
+            print(f"{method} -> {params.get('chat_id')}: {first_line}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Проверка webhook бота против заглушки Telegram")
+    parser.add_argument("--port", type=int, default=8083, help="порт webhook сервера бота")
+    args = parser.parse_args()
+    asyncio.run(run_webhook_scenario(args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Load Test
+Нагрузочный прогон бота целиком и без сети: бот получает обновления через
+long polling от локальной заглушки Bot API, генератор шлет заказы из WebApp
+и нажатия кнопок админа (принять / оплачено / отклонить) с заданной
+частотой. В отчете - пропускная способность, перцентили задержки от
+постановки обновления в очередь getUpdates до ответа бота и разбивка
+ошибок.
+
+    python tools/load_test.py --rate 50 --duration 30
+    python tools/load_test.py --rate 200 --api-latency 0.05 --api-error-rate 0.01 --json load.json
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from fake_telegram import FAKE_ADMIN_CHAT_ID, FakeBotAPI, UpdateFactory, import_bot, start_fake_bot_api
+
+# Пользователи WebApp: id от USER_ID_BASE
+USER_ID_BASE = 10000
+
+# Логины заказов уникальны: по ним карточка админа сопоставляется с заказом
+LOGIN_PREFIX = "load_"
+_LOGIN = re.compile(rf"\b{LOGIN_PREFIX}\d+\b")
+
+# Виды операций в отчете
+KIND_ORDER = "order"
+KIND_ACCEPT = "accept"
+KIND_PAID = "paid"
+KIND_REJECT = "reject"
+KINDS = (KIND_ORDER, KIND_ACCEPT, KIND_PAID, KIND_REJECT)
+
+# Лимиты отправки, которые не ограничивают бота (--telegram-limits их возвращает)
+UNLIMITED_RATE = 1e9
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _callback_data(message: Dict[str, Any]) -> List[str]:
+    keyboard = (message.get("reply_markup") or {}).get("inline_keyboard") or []
+    return [button.get("callback_data", "") for row in keyboard for button in row]
+
+
+ButtonAction = Callable[[str], Optional[str]]
+
+
+class LoadGenerator:
+    """
+    Кладет обновления в очередь заглушки и по вызовам Bot API понимает,
+    когда бот на них ответил. Заказ завершен, когда админ получил карточку
+    с кнопками; нажатие кнопки - когда бот отредактировал сообщение админа
+    или ответил на callback отказом. callback_data кнопок подписаны ботом,
+    поэтому отправляются как есть, а действие кнопки узнается через
+    button_action
+    """
+
+    def __init__(self, fake: FakeBotAPI, args: argparse.Namespace, admin_error_texts: Iterable[str],
+                 button_action: ButtonAction):
+        self.fake = fake
+        self.args = args
+        self.button_action = button_action
+        # Приписки бота к карточке, когда обработать нажатие не удалось
+        self.admin_error_texts = tuple(text.strip() for text in admin_error_texts)
+        self.admin_chat_id = int(FAKE_ADMIN_CHAT_ID)
+        self.factory = UpdateFactory()
+        self.random = random.Random(args.seed)
+        self._orders = 0
+
+        # login -> время отправки заказа; chat_id -> логины ожидающих заказов
+        self._pending_orders: Dict[str, float] = {}
+        self._orders_by_chat: Dict[int, Deque[str]] = {}
+        # message_id карточки -> нажатия (callback_query_id, вид, время отправки)
+        self._pending_callbacks: Dict[int, Deque[Tuple[str, str, float]]] = {}
+        self._callback_messages: Dict[str, int] = {}
+        # Нажатия, которые ждут "раздумий" админа
+        self._scheduled = 0
+
+        self.sent: Counter = Counter()
+        self.latencies: Dict[str, List[float]] = {kind: [] for kind in KINDS}
+        self.errors: Counter = Counter()
+        self.started_at = 0.0
+        self.finished_at = 0.0
+
+        fake.listeners.append(self.on_api_call)
+
+    # --- Отправка обновлений -----------------------------------------------
+
+    def _enqueue(self, update: Dict[str, Any]) -> None:
+        self.fake.updates.put_nowait(update)
+
+    def send_order(self) -> None:
+        self._orders += 1
+        user_id = USER_ID_BASE + self.random.randrange(self.args.users)
+        login = f"{LOGIN_PREFIX}{self._orders}"
+        amount = str(self.random.randrange(self.args.min_amount, self.args.max_amount + 1))
+        self._pending_orders[login] = time.perf_counter()
+        self._orders_by_chat.setdefault(user_id, deque()).append(login)
+        self.sent[KIND_ORDER] += 1
+        self._enqueue(self.factory.web_app_data(user_id, login, amount))
+
+    def _buttons(self, message: Dict[str, Any]) -> Dict[str, str]:
+        """Действие -> callback_data кнопок сообщения"""
+        buttons = {}
+        for data in _callback_data(message):
+            action = self.button_action(data)
+            if action:
+                buttons[action] = data
+        return buttons
+
+    def send_callback(self, kind: str, data: str, message: Dict[str, Any]) -> None:
+        self._scheduled -= 1
+        clicks = 2 if self.random.random() < self.args.double_click else 1
+        for _ in range(clicks):
+            update = self.factory.callback(self.admin_chat_id, self.admin_chat_id, data, message)
+            callback_id = update["callback_query"]["id"]
+            self._pending_callbacks.setdefault(message["message_id"], deque()).append(
+                (callback_id, kind, time.perf_counter())
+            )
+            self._callback_messages[callback_id] = message["message_id"]
+            self.sent[kind] += 1
+            self._enqueue(update)
+
+    def schedule_callback(self, kind: str, data: str, message: Dict[str, Any]) -> None:
+        """Нажатие кнопки после случайной паузы админа"""
+        self._scheduled += 1
+        delay = self.random.expovariate(1 / self.args.admin_delay) if self.args.admin_delay > 0 else 0
+        asyncio.get_running_loop().call_later(delay, self.send_callback, kind, data, message)
+
+    async def run(self) -> None:
+        """Заказы пуассоновским потоком с частотой rate в течение duration секунд"""
+        self.started_at = time.perf_counter()
+        deadline = self.started_at + self.args.duration
+        next_at = self.started_at
+        while True:
+            next_at += self.random.expovariate(self.args.rate)
+            if next_at >= deadline:
+                break
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.send_order()
+
+    def pending(self) -> int:
+        callbacks = sum(len(queue) for queue in self._pending_callbacks.values())
+        return len(self._pending_orders) + callbacks + self._scheduled
+
+    async def drain(self, timeout: float) -> None:
+        """Ждет ответов на все отправленное; оставшееся считается тайм-аутом"""
+        deadline = time.perf_counter() + timeout
+        while self.pending() and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        if self._pending_orders:
+            self.errors[f"{KIND_ORDER}: timeout"] += len(self._pending_orders)
+        for queue in self._pending_callbacks.values():
+            for _, kind, _ in queue:
+                self.errors[f"{kind}: timeout"] += 1
+
+    # --- Ответы бота ---------------------------------------------------------
+
+    def _complete(self, kind: str, sent_at: float) -> None:
+        now = time.perf_counter()
+        self.latencies[kind].append(now - sent_at)
+        self.finished_at = now
+
+    def on_api_call(self, method: str, params: Dict[str, Any], result: Any) -> None:
+        if method == "sendMessage":
+            self._on_send_message(int(params.get("chat_id", 0)), str(params.get("text", "")), result)
+        elif method == "editMessageText":
+            self._on_edit_message(int(params.get("message_id", 0)), str(params.get("text", "")), result)
+        elif method == "answerCallbackQuery" and params.get("text"):
+            self._on_callback_refused(str(params.get("callback_query_id")), str(params["text"]))
+
+    def _on_send_message(self, chat_id: int, text: str, message: Dict[str, Any]) -> None:
+        if chat_id == self.admin_chat_id:
+            match = _LOGIN.search(text)
+            sent_at = self._pending_orders.pop(match.group(0), None) if match else None
+            if sent_at is None:
+                return
+            for logins in self._orders_by_chat.values():
+                if match.group(0) in logins:
+                    logins.remove(match.group(0))
+                    break
+            self._complete(KIND_ORDER, sent_at)
+            buttons = self._buttons(message)
+            choice = self.random.random()
+            if choice < self.args.accept_ratio:
+                kind = KIND_ACCEPT
+            elif choice < self.args.accept_ratio + self.args.reject_ratio:
+                kind = KIND_REJECT
+            else:
+                return
+            if kind in buttons:
+                self.schedule_callback(kind, buttons[kind], message)
+        elif not _LOGIN.search(text) and self._orders_by_chat.get(chat_id):
+            # Уведомления о заказе содержат логин; ответ без логина - ошибка,
+            # и заказ до админа не дойдет
+            self._pending_orders.pop(self._orders_by_chat[chat_id].popleft(), None)
+            self.errors[f"{KIND_ORDER}: {text.splitlines()[0][:60]}"] += 1
+
+    def _on_callback_refused(self, callback_id: str, text: str) -> None:
+        """Ответ на нажатие без редактирования сообщения: заказ уже обработан"""
+        message_id = self._callback_messages.pop(callback_id, None)
+        queue = self._pending_callbacks.get(message_id)
+        for item in queue or ():
+            if item[0] == callback_id:
+                queue.remove(item)
+                self.errors[f"{item[1]}: {text}"] += 1
+                break
+
+    def _on_edit_message(self, message_id: int, text: str, message: Dict[str, Any]) -> None:
+        queue = self._pending_callbacks.get(message_id)
+        if not queue:
+            return
+        callback_id, kind, sent_at = queue.popleft()
+        self._callback_messages.pop(callback_id, None)
+        if not queue:
+            del self._pending_callbacks[message_id]
+        if any(error_text in text for error_text in self.admin_error_texts):
+            self.errors[f"{kind}: ошибка обработки"] += 1
+            return
+        self._complete(kind, sent_at)
+        if kind == KIND_ACCEPT and self.random.random() < self.args.paid_ratio:
+            data = self._buttons(message).get(KIND_PAID)
+            if data:
+                self.schedule_callback(KIND_PAID, data, message)
+
+    # --- Отчет ---------------------------------------------------------------
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = (self.finished_at or time.perf_counter()) - self.started_at
+        results = {}
+        for kind in KINDS:
+            ordered = sorted(self.latencies[kind])
+            if not ordered:
+                continue
+            results[kind] = {
+                "sent": self.sent[kind],
+                "completed": len(ordered),
+                "per_sec": len(ordered) / elapsed if elapsed > 0 else 0.0,
+                "p50_ms": _percentile(ordered, 0.50) * 1000,
+                "p90_ms": _percentile(ordered, 0.90) * 1000,
+                "p99_ms": _percentile(ordered, 0.99) * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+        return {"elapsed": elapsed, "results": results, "errors": dict(self.errors)}
+
+
+def print_report(report: Dict[str, Any], fake: FakeBotAPI, dispatcher_stats: Dict[str, float],
+                 processor_stats: Optional[Dict[str, int]]) -> None:
+    print(f"\nВремя прогона: {report['elapsed']:.1f} с")
+    print(f"{'операция':<10}{'отправлено':>12}{'готово':>10}{'/с':>10}"
+          f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind, result in report["results"].items():
+        print(f"{kind:<10}{result['sent']:>12}{result['completed']:>10}{result['per_sec']:>10,.1f}"
+              f"{result['p50_ms']:>10.1f}{result['p90_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['max_ms']:>10.1f}")
+
+    print("\nОшибки и отказы:")
+    if not report["errors"]:
+        print("  нет")
+    for name, count in sorted(report["errors"].items(), key=lambda item: -item[1]):
+        print(f"  {name:<60}{count:>8}")
+
+    calls = Counter(method for method, _ in fake.calls)
+    print("\nBot API: " + ", ".join(f"{method} {count}" for method, count in sorted(calls.items())))
+    if fake.injected_errors:
+        print("Имитированные сбои: " + ", ".join(f"{method} {count}" for method, count in fake.injected_errors.items()))
+    print("Очередь отправки: " + ", ".join(f"{key} {value:g}" for key, value in dispatcher_stats.items()))
+    if processor_stats:
+        print("Входящие обновления: " + ", ".join(f"{key} {value}" for key, value in processor_stats.items()))
+
+
+def check_limits(report: Dict[str, Any], args: argparse.Namespace) -> List[str]:
+    """Нарушенные пороги --max-p99-ms и --max-error-rate"""
+    failures = []
+    if args.max_p99_ms is not None:
+        for kind, result in report["results"].items():
+            if result["p99_ms"] > args.max_p99_ms:
+                failures.append(f"{kind}: p99 {result['p99_ms']:.1f} ms > {args.max_p99_ms:g} ms")
+    if args.max_error_rate is not None:
+        sent = sum(result["sent"] for result in report["results"].values())
+        errors = sum(report["errors"].values())
+        if sent and errors / sent > args.max_error_rate:
+            failures.append(f"ошибки {errors / sent:.2%} > {args.max_error_rate:.2%}")
+    return failures
+
+
+async def run_load_test(args: argparse.Namespace) -> int:
+    db_dir = tempfile.TemporaryDirectory()
+    bot = import_bot(
+        ORDERS_DB_PATH=args.db or str(Path(db_dir.name) / "orders.db"),
+        LOG_LEVEL=args.log_level,
+        STATE_BACKEND="memory",
+        CRYPTO_PAY_API_TOKEN="",
+        WEBHOOK_URL="",
+        BOT_MODE="polling",
+        THROTTLE_USER_RATE="1" if args.throttle else "0",
+        THROTTLE_GLOBAL_RATE="100" if args.throttle else "0",
+        UPDATE_CONCURRENCY=str(args.concurrency),
+    )
+    from telegram import Update
+    from telegram.ext import Application
+    from message_dispatcher import MessageDispatcher
+
+    fake, api_runner, base_url = await start_fake_bot_api(latency=args.api_latency, error_rate=args.api_error_rate)
+    application = bot.build_application(Application.builder().token(bot.BOT_TOKEN).base_url(base_url))
+    if not args.telegram_limits:
+        # Меряем самого бота, а не лимиты Telegram на отправку
+        bot.message_dispatcher = MessageDispatcher(
+            application.bot,
+            global_rate=UNLIMITED_RATE,
+            private_chat_rate=UNLIMITED_RATE,
+            private_chat_burst=UNLIMITED_RATE,
+            group_chat_rate=UNLIMITED_RATE,
+            group_chat_burst=UNLIMITED_RATE,
+        )
+    generator = LoadGenerator(fake, args, [
+        bot.templates.render(f"admin_error_{kind}") for kind in (KIND_ACCEPT, KIND_PAID, KIND_REJECT)
+    ], lambda data: getattr(bot.parse_order_callback(data), "action", None))
+
+    await bot.order_store.open()
+    await bot.load_pricing_state()
+    try:
+        async with application:
+            await application.start()
+            bot.message_dispatcher.start()
+            await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            try:
+                print(f"Заказы: {args.rate:g}/с в течение {args.duration:g} с от {args.users} пользователей; "
+                      f"ответ Bot API {args.api_latency * 1000:g} ms, сбои {args.api_error_rate:.1%}; "
+                      f"обновлений одновременно: {args.concurrency}")
+                await generator.run()
+                await generator.drain(args.drain)
+            finally:
+                await application.updater.stop()
+                await bot.message_dispatcher.stop()
+                await application.stop()
+    finally:
+        await bot.order_store.close()
+        await api_runner.cleanup()
+        db_dir.cleanup()
+
+    report = generator.report()
+    print_report(report, fake, bot.message_dispatcher.stats(),
+                 bot.update_processor.stats() if bot.update_processor else None)
+    if args.json:
+        report["args"] = vars(args)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nРезультаты сохранены: {args.json}")
+
+    failures = check_limits(report, args)
+    if failures:
+        print("\n❌ " + "; ".join(failures))
+        return 1
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота против заглушки Telegram")
+    parser.add_argument("--rate", type=float, default=20.0, help="заказов из WebApp в секунду")
+    parser.add_argument("--duration", type=float, default=10.0, help="сколько секунд слать заказы")
+    parser.add_argument("--users", type=int, default=1000, help="число разных пользователей")
+    parser.add_argument("--min-amount", type=int, default=100, help="минимальная сумма заказа")
+    parser.add_argument("--max-amount", type=int, default=50000, help="максимальная сумма заказа")
+    parser.add_argument("--accept-ratio", type=float, default=0.7, help="доля заказов, которые админ принимает")
+    parser.add_argument("--reject-ratio", type=float, default=0.2, help="доля заказов, которые админ отклоняет")
+    parser.add_argument("--paid-ratio", type=float, default=0.9, help="доля принятых заказов, отмеченных оплаченными")
+    parser.add_argument("--double-click", type=float, default=0.05, help="доля повторных нажатий кнопки")
+    parser.add_argument("--admin-delay", type=float, default=0.1, help="средняя пауза админа перед нажатием, с")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа Bot API, с")
+    parser.add_argument("--api-error-rate", type=float, default=0.0, help="доля ответов Bot API с ошибкой 502")
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="обновлений одновременно (UPDATE_CONCURRENCY бота, 1 - по одному)")
+    parser.add_argument("--telegram-limits", action="store_true", help="оставить лимиты отправки Telegram")
+    parser.add_argument("--throttle", action="store_true", help="включить лимиты входящих обновлений")
+    parser.add_argument("--drain", type=float, default=10.0, help="сколько ждать ответов после отправки, с")
+    parser.add_argument("--db", help="файл базы заказов (по умолчанию временный)")
+    parser.add_argument("--log-level", default="WARNING", help="уровень логов бота")
+    parser.add_argument("--seed", type=int, help="seed генератора для воспроизводимого потока")
+    parser.add_argument("--json", metavar="PATH", help="сохранить результаты в JSON")
+    parser.add_argument("--max-p99-ms", type=float, help="код возврата 1, если p99 любой операции больше")
+    parser.add_argument("--max-error-rate", type=float, help="код возврата 1, если доля ошибок больше")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run_load_test(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 // Конфігурація для Telegram WebApp
 // Цей файл буде використовуватися для налаштування webapp
 const WEBAPP_CONFIG = {
-    // Курс USDT до рублей (синхронизировано с ботом)
+    // Курс USDT до рублей (при статическом хостинге; сервер WebApp подставляет курс бота)
     usdtRate: 95.0,
     
     // Комиссия в процентах
@@ -22,6 +22,11 @@ const WEBAPP_CONFIG = {
     }
 };
 
+// Для сторінки; start_webapp_server.py доповнює його актуальними курсом і комісією бота
+if (typeof window !== 'undefined') {
+    window.WEBAPP_CONFIG = WEBAPP_CONFIG;
+}
+
 // Експортуємо конфігурацію
 if (typeof module !== 'undefined' && module.exports) {
     module.exports = WEBAPP_CONFIG;